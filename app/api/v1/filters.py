@@ -1,7 +1,18 @@
-from currency.models import ContactUs, Rate
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from currency import model_choices as choices
+from currency.models import ContactUs, Rate, RateCandle
+
+from django import forms
 
 from django_filters import rest_framework as filters
 
+# Наибольший диапазон дат свечей за один запрос, дней: список свечей не разбивается на страницы
+CANDLE_MAX_DAYS = {
+    choices.PERIOD_HOUR: 31,
+    choices.PERIOD_DAY: 3660,
+}
+
 
 class RateFilter(filters.FilterSet):
 
@@ -17,6 +28,54 @@ class RateFilter(filters.FilterSet):
         }
 
 
+class RateCandleFilterForm(forms.Form):
+
+    """
+        Form of RateCandleFilter, that bounds the date range by CANDLE_MAX_DAYS of the period
+    """
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        period = cleaned_data.get('period')
+        if date_from is None or date_to is None or period not in CANDLE_MAX_DAYS:
+            return cleaned_data
+
+        if date_from > date_to:
+            raise forms.ValidationError('date_from should not be after date_to')
+        if (date_to - date_from).days + 1 > CANDLE_MAX_DAYS[period]:
+            raise forms.ValidationError(f'{period} candles are limited to {CANDLE_MAX_DAYS[period]} days per request')
+        return cleaned_data
+
+
+class RateCandleFilter(filters.FilterSet):
+
+    """
+        Filter class for candles api page
+
+        The pair, the period and the date range are required, so the candles
+        of a request are one bounded range read of the rate_candle_bucket index
+    """
+
+    source = filters.NumberFilter(required=True)
+    currency_name = filters.ChoiceFilter(choices=choices.RATE_TYPES, required=True)
+    period = filters.ChoiceFilter(choices=choices.CANDLE_PERIODS, required=True)
+    date_from = filters.DateFilter(method='filter_date_from', required=True)
+    date_to = filters.DateFilter(method='filter_date_to', required=True)
+
+    class Meta:
+        model = RateCandle
+        fields = ('source', 'currency_name', 'period')
+        form = RateCandleFilterForm
+
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(start__gte=datetime.combine(value, time.min, tzinfo=dt_timezone.utc))
+
+    def filter_date_to(self, queryset, name, value):
+        # включительно: до начала следующего дня
+        return queryset.filter(start__lt=datetime.combine(value + timedelta(days=1), time.min, tzinfo=dt_timezone.utc))
+
+
 class ContactUsFilter(filters.FilterSet):
 
     """
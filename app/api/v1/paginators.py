@@ -1,4 +1,17 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class RatePagination(PageNumberPagination):
@@ -12,6 +25,198 @@ class RatePagination(PageNumberPagination):
     max_page_size = 100
 
 
+def estimate_count(queryset):
+
+    """
+        Number of rows of the queryset, estimated by the planner of PostgreSQL without reading them
+
+        Other databases give no cheap estimate, None
+    """
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+
+    """
+        Pagination by the position of the last row instead of the page number
+
+        The ordering of the queryset (e.g. of OrderingFilter) is completed with
+        the tiebreakers, so the position is unique, and a page is read as
+        "rows after the position": one seek of the index of the ordering,
+        without COUNT(*) and OFFSET, so deep pages cost the same as the first.
+        Next and previous links carry opaque cursors with the position. The
+        total count is not returned; ?count=estimate adds the estimate of the
+        database planner (see estimate_count).
+    """
+
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    tiebreakers = ()
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_keys(self, queryset) -> list:
+
+        """
+            Fields of the position with their direction: [(name, descending), ...]
+        """
+
+        keys = [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in queryset.query.order_by
+            if isinstance(field, str)
+        ]
+        names = {name for name, _ in keys}
+        descending = keys[0][1] if keys else False
+        return keys + [(name, descending) for name in self.tiebreakers if name not in names]
+
+    def encode_cursor(self, position, reverse) -> str:
+        payload = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = payload['p']
+            if len(values) != len(self.keys):
+                raise ValueError
+            position = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.keys, values)
+            ]
+            return position, bool(payload['r'])
+        except (binascii.Error, KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def after(self, position, reverse) -> Q:
+
+        """
+            Rows after the position in the order of the keys (before it, if reverse)
+
+            The bound on the first key lets the database seek its index, the
+            rest of the condition decides the rows with equal first key.
+        """
+
+        def lookup(descending):
+            return 'lt' if descending != reverse else 'gt'
+
+        (first, first_descending), first_value = self.keys[0], position[0]
+        bound = Q(**{f'{first}__{lookup(first_descending)}e': first_value})
+
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keys, position):
+            condition |= equal & Q(**{f'{name}__{lookup(descending)}': value})
+            equal &= Q(**{name: value})
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keys = self.get_keys(queryset)
+        page_size = self.get_page_size(request)
+
+        self.estimated_count = None
+        if request.query_params.get(self.count_query_param) == 'estimate':
+            self.estimated_count = estimate_count(queryset)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = cursor is not None and cursor[1]
+        if cursor is not None:
+            queryset = queryset.filter(self.after(*cursor))
+
+        ordering = [('-' if descending != reverse else '') + name for name, descending in self.keys]
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # назад ушли со страницы, значит следующая есть; вперед - значит есть предыдущая
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def position(self, row) -> list:
+        values = []
+        for name, _ in self.keys:
+            value = getattr(row, name)
+            if isinstance(value, Decimal):
+                value = str(value)
+            elif hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return values
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.position(row), reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.request.query_params.get(self.count_query_param) == 'estimate':
+            response['estimated_count'] = self.estimated_count
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'estimated_count': {'type': 'integer', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class RateCursorPagination(KeysetPagination):
+
+    """
+        Cursor pagination for rates api page, positions are (created, id) after the ordering field
+    """
+
+    tiebreakers = ('created', 'id')
+
+
 class SourcePagination(PageNumberPagination):
 
     """
@@ -1,4 +1,4 @@
-from currency.models import ContactUs, Rate, Source
+from currency.models import ContactUs, Rate, RateCandle, Source
 from currency.tasks import send_email
 
 from rest_framework import serializers
@@ -81,6 +81,44 @@ class RateSerializer(serializers.ModelSerializer):
         }
 
 
+class LatestRateSerializer(serializers.Serializer):
+
+    """
+        Serializer for cached latest rates (see currency.latest_cache.LatestEntry), same fields as RateSerializer
+    """
+
+    ask = serializers.CharField()
+    bid = serializers.CharField()
+    currency_name = serializers.CharField()
+    source_obj = serializers.SerializerMethodField()
+    created = serializers.DateTimeField()
+
+    def get_source_obj(self, entry):
+        return {'id': entry.source_id, 'name': entry.source_name, 'logo': entry.logo_url}
+
+
+class RateCandleSerializer(serializers.ModelSerializer):
+
+    """
+        Serializer for hour and day candles
+    """
+
+    class Meta:
+        model = RateCandle
+        fields = (
+            'start',
+            'bid_open',
+            'bid_high',
+            'bid_low',
+            'bid_close',
+            'ask_open',
+            'ask_high',
+            'ask_low',
+            'ask_close',
+            'count',
+        )
+
+
 class ContactUsSerializer(serializers.ModelSerializer):
 
     """
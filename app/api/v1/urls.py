@@ -19,6 +19,11 @@ router.register(r'contact-us', views.ContactUsViewSet, basename='contact-us')
 
 urlpatterns = [
     path('choices/', views.RateChoicesView.as_view(), name='currency_choices'),
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache_stats'),
+    path('candles/', views.CandlesView.as_view(), name='candles'),
+    path('db-stats/', views.DatabaseStatsView.as_view(), name='db_stats'),
+    path('latest-rates/', views.LatestRatesView.as_view(), name='latest_rates'),
+    path('parsing-stats/', views.ParsingStatsView.as_view(), name='parsing_stats'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
@@ -1,10 +1,24 @@
-from api.v1.filters import ContactUsFilter, RateFilter
-from api.v1.paginators import ContactUsPagination, RatePagination, SourcePagination
-from api.v1.serializer import ContactUsSerializer, RateSerializer, SourceSerializer
+import os
+
+from api.v1.filters import ContactUsFilter, RateCandleFilter, RateFilter
+from api.v1.paginators import ContactUsPagination, RateCursorPagination, RatePagination, SourcePagination
+from api.v1.serializer import (
+    ContactUsSerializer,
+    LatestRateSerializer,
+    RateCandleSerializer,
+    RateSerializer,
+    SourceSerializer,
+)
 from api.v1.throttles import AnonUserRateThrottle
 
+from currency import breaker
+from currency import cache
+from currency import db_connections
+from currency import metrics
 from currency import model_choices as choices
-from currency.models import ContactUs, Rate, Source
+from currency.models import ContactUs, Rate, RateCandle, Source
+from currency.parsers import PARSERS
+from currency.services import get_latest_rates
 
 from django_filters import rest_framework as filters
 
@@ -18,11 +32,16 @@ class RateViewSet(viewsets.ModelViewSet):
 
     """
         Viewset for rates
+
+        Lists are paginated by page number; ?pagination=cursor (or a cursor
+        of the previous page) switches to the cursor pagination, that does not
+        count the rates and reads deep pages as fast as the first one.
     """
 
     queryset = Rate.objects.all().select_related('source')
     serializer_class = RateSerializer
     pagination_class = RatePagination
+    cursor_pagination_class = RateCursorPagination
     filterset_class = RateFilter
     filter_backends = (
         filters.DjangoFilterBackend,
@@ -30,9 +49,21 @@ class RateViewSet(viewsets.ModelViewSet):
         rest_framework_filters.SearchFilter,
     )
     ordering_fields = ['id', 'created', 'ask', 'bid']
+    # как на странице курсов, по индексу rate_created_id_desc
+    ordering = ('-created',)
     throttle_classes = [AnonUserRateThrottle]
     search_fields = ['currency_name', 'source__name']
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = getattr(self.request, 'query_params', {})
+            if params.get('pagination') == 'cursor' or self.cursor_pagination_class.cursor_query_param in params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
 
 class SourceViewSet(viewsets.ModelViewSet):
 
@@ -87,3 +118,63 @@ class RateChoicesView(generics.GenericAPIView):
         return Response(
             {'rate_names': choices.RATE_TYPES}
         )
+
+
+class LatestRatesView(generics.GenericAPIView):
+
+    """
+        View for the last rate of every source and currency, served from the cache without ORM work
+    """
+
+    serializer_class = LatestRateSerializer
+
+    def get(self, request):
+        serializer = self.get_serializer(get_latest_rates(), many=True)
+        return Response(serializer.data)
+
+
+class CandlesView(generics.ListAPIView):
+
+    """
+        View for hour and day candles of a source and currency in a date range, read from the rollups
+
+        The date range is required and bounded (see filters.CANDLE_MAX_DAYS):
+        a month of hourly candles is 744 rows, so the list is not paginated
+    """
+
+    queryset = RateCandle.objects.order_by('start')
+    serializer_class = RateCandleSerializer
+    filterset_class = RateCandleFilter
+    filter_backends = (filters.DjangoFilterBackend,)
+
+
+class CacheStatsView(generics.GenericAPIView):
+
+    """
+        View for hit ratios of the local and shared cache tiers of the process, that serves the request
+    """
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'caches': cache.get_stats()})
+
+
+class DatabaseStatsView(generics.GenericAPIView):
+
+    """
+        View for database connections of the process, that serves the request: open, opened, closed and connect latency
+    """
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'databases': db_connections.get_stats()})
+
+
+class ParsingStatsView(generics.GenericAPIView):
+
+    """
+        View for parsers metrics, published by the last parsing run, and states of their circuit breakers
+    """
+
+    def get(self, request):
+        stats = metrics.get_published()
+        stats['breakers'] = breaker.get_states(PARSERS)
+        return Response(stats)
@@ -44,6 +44,20 @@ class SourceAdmin(admin.ModelAdmin):
         'id',
         'name',
         'source_url',
+        'poll_interval',
+        'next_poll',
+        'last_changed',
+        'failures',
+        'change_ratio',
+        'error_ratio',
+    )
+    readonly_fields = (
+        'poll_interval',
+        'next_poll',
+        'last_changed',
+        'failures',
+        'change_ratio',
+        'error_ratio',
     )
     list_filter = (
         'name',
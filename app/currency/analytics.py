@@ -0,0 +1,253 @@
+import hashlib
+
+from currency import const
+from currency.cache import stale_while_revalidate
+from currency.models import LatestRate, Rate
+
+from django.db.models import BigIntegerField, DecimalField, ExpressionWrapper, F, Func, Q
+from django.db.models.functions import Cast, Round
+
+import numpy as np
+
+# Цены хранятся с двумя знаками, в массивах - целыми копейками
+SCALE = 100
+ANALYTICS_TIMEOUT = 60 * 60
+# после ANALYTICS_TIMEOUT результат отдается устаревшим, пока один процесс его пересчитывает
+ANALYTICS_STALE_TIMEOUT = 60
+
+NO_BID = np.iinfo(np.int64).min
+NO_ASK = np.iinfo(np.int64).max
+
+
+class Series:
+
+    """
+        Rates of a source and currency as contiguous arrays, ordered by time
+
+        times: int64 seconds since the epoch, UTC
+        bid, ask: int64 fixed point prices in 1 / SCALE
+    """
+
+    __slots__ = ('source_id', 'currency_name', 'times', 'bid', 'ask')
+
+    def __init__(self, source_id, currency_name, times, bid, ask):
+        self.source_id = source_id
+        self.currency_name = currency_name
+        self.times = times
+        self.bid = bid
+        self.ask = ask
+
+    def __len__(self):
+        return len(self.times)
+
+    def mid(self):
+        return (self.bid + self.ask) / 2
+
+    def spread(self):
+        return self.ask - self.bid
+
+
+class Epoch(Func):
+
+    """
+        Seconds since the epoch of a datetime, computed by the database
+    """
+
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)')
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)')
+
+
+def fixed_point(field):
+    scaled = ExpressionWrapper(F(field) * SCALE, output_field=DecimalField())
+    return Cast(Round(scaled), BigIntegerField())
+
+
+def load_series(source_id, currency_name, start, end) -> Series:
+
+    """
+        Rates of the pair from start to end (not including), led by the last rate before start
+
+        The leading rate is in force at start, so the buckets before the first
+        rate of the range are not dropped by resample. Each part is one seek of
+        the (source, currency_name, created) index, the times and the prices
+        are converted to integers by the database, so neither datetime nor
+        Decimal is created for a row.
+    """
+
+    rates = Rate.objects.filter(source_id=source_id, currency_name=currency_name)
+    fields = (Epoch('created'), fixed_point('bid'), fixed_point('ask'))
+
+    leading = rates.filter(created__lt=start).order_by('-created', '-id').values_list(*fields)[:1]
+    rows = rates.filter(created__gte=start, created__lt=end).order_by('created', 'id').values_list(*fields)
+
+    columns = np.array(list(leading) + list(rows), dtype=np.int64).reshape(-1, 3)
+    return Series(
+        source_id,
+        currency_name,
+        np.ascontiguousarray(columns[:, 0]),
+        np.ascontiguousarray(columns[:, 1]),
+        np.ascontiguousarray(columns[:, 2]),
+    )
+
+
+def make_grid(start, end, seconds):
+
+    """
+        Starts of the `seconds` long buckets from start to end
+    """
+
+    first = int(start.timestamp()) // seconds * seconds
+    return np.arange(first, int(end.timestamp()), seconds, dtype=np.int64)
+
+
+def align(series, grid, seconds):
+
+    """
+        Index of the last rate of the series before the end of every bucket of the grid, -1 if there is none
+    """
+
+    return np.searchsorted(series.times, grid + seconds, side='left') - 1
+
+
+def resample(series, grid, seconds) -> Series:
+
+    """
+        Last rate of every bucket, buckets without rates take the previous rate
+
+        Buckets before the first rate are dropped
+    """
+
+    index = align(series, grid, seconds)
+    valid = index >= 0
+    index = index[valid]
+    return Series(series.source_id, series.currency_name, grid[valid], series.bid[index], series.ask[index])
+
+
+def rolling_mean(values, window):
+
+    """
+        Means of the windows of `window` values, len(values) - window + 1 of them
+
+        Integer values are summed exactly with int64 cumsum
+    """
+
+    if len(values) < window:
+        return np.empty(0)
+
+    sums = np.cumsum(np.concatenate(([0], values)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def rolling_std(values, window):
+
+    """
+        Standard deviations of the windows of `window` values
+    """
+
+    if len(values) < window:
+        return np.empty(0)
+
+    return np.lib.stride_tricks.sliding_window_view(values, window).std(axis=1)
+
+
+def volatility(series, window):
+
+    """
+        Rolling standard deviation of the log returns of the mid price
+    """
+
+    mid = series.mid()
+    if len(mid) < 2:
+        return np.empty(0)
+    return rolling_std(np.diff(np.log(mid)), window)
+
+
+def best_of_sources(series_list, grid, seconds) -> dict:
+
+    """
+        Best bid (the highest) and ask (the lowest) among the sources in every bucket
+
+        Every source takes part with its last rate before the end of the
+        bucket. Buckets, that no source has a rate for, are dropped.
+        Returns arrays: times, bid, bid_source, ask, ask_source
+    """
+
+    if not series_list:
+        nothing = np.empty(0, dtype=np.int64)
+        return {'times': nothing, 'bid': nothing, 'bid_source': nothing, 'ask': nothing, 'ask_source': nothing}
+
+    bids = np.full((len(series_list), len(grid)), NO_BID, dtype=np.int64)
+    asks = np.full((len(series_list), len(grid)), NO_ASK, dtype=np.int64)
+
+    for row, series in enumerate(series_list):
+        index = align(series, grid, seconds)
+        valid = index >= 0
+        bids[row, valid] = series.bid[index[valid]]
+        asks[row, valid] = series.ask[index[valid]]
+
+    source_ids = np.array([series.source_id for series in series_list], dtype=np.int64)
+    bid_row = bids.argmax(axis=0)
+    ask_row = asks.argmin(axis=0)
+    columns = np.arange(len(grid))
+    best_bid = bids[bid_row, columns]
+    best_ask = asks[ask_row, columns]
+    valid = best_bid != NO_BID
+
+    return {
+        'times': grid[valid],
+        'bid': best_bid[valid],
+        'bid_source': source_ids[bid_row[valid]],
+        'ask': best_ask[valid],
+        'ask_source': source_ids[ask_row[valid]],
+    }
+
+
+def series_version(pairs) -> tuple:
+
+    """
+        Version of the rates of the pairs
+
+        Every write of a rate, including edits and deletes, updates LatestRate
+        of its pair, so its rate and update time change with the history.
+    """
+
+    if not pairs:
+        return ()
+
+    query = Q()
+    for source_id, currency_name in pairs:
+        query |= Q(source_id=source_id, currency_name=currency_name)
+
+    return tuple(sorted(
+        (source_id, currency_name, rate_id, updated.isoformat())
+        for source_id, currency_name, rate_id, updated in LatestRate.objects
+        .filter(query)
+        .values_list('source_id', 'currency_name', 'rate_id', 'updated')
+    ))
+
+
+def cached(name, pairs, params, compute):
+
+    """
+        Result of compute(), cached by the version of the pairs and the params
+
+        A write of a rate changes the version, so the result is not
+        invalidated explicitly, the old one expires. The retention does not
+        change LatestRate, results over the downsampled days live until
+        ANALYTICS_TIMEOUT. A missing result is computed by one caller at a
+        time, the others wait for it (see cache.stale_while_revalidate).
+    """
+
+    version = series_version(pairs)
+    digest = hashlib.sha1(repr((params, version)).encode()).hexdigest()
+    key = f'{const.CACHE_KEY_ANALYTICS}::{name}::{digest}'
+
+    return stale_while_revalidate(key, compute, ANALYTICS_TIMEOUT, ANALYTICS_STALE_TIMEOUT)
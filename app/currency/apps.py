@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CurrencyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'currency'
+
+    def ready(self):
+        from currency import db_connections
+        from currency import receivers  # noqa
+
+        db_connections.setup()
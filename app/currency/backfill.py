@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from currency import const
+from currency import model_choices as choices
+from currency.parsers import make_session, round_currency
+
+from django.db import transaction
+from django.utils import timezone
+
+import aiohttp
+
+PRIVATBANK_ARCHIVE_URL = 'https://api.privatbank.ua/p24api/exchange_rates'
+
+
+def archive_url(base_url, day) -> str:
+    return f'{base_url}?json&date={day:%d.%m.%Y}'
+
+
+def days_range(start, end) -> list:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def parse_archive(payload) -> list:
+
+    """
+        Rates of the archive day: list of (currency, bid, ask)
+
+        Archive keeps the national bank rate for every currency, but the bank
+        rate (purchaseRate, saleRate) only for some of them, other are skipped
+    """
+
+    currencies = {currency for currency, _ in choices.RATE_TYPES}
+    rates = []
+
+    for rate in payload.get('exchangeRate', []):
+        if rate.get('currency') not in currencies:
+            continue
+        if 'purchaseRate' not in rate or 'saleRate' not in rate:
+            continue
+        rates.append((
+            rate['currency'],
+            round_currency(str(rate['purchaseRate'])),
+            round_currency(str(rate['saleRate'])),
+        ))
+
+    return rates
+
+
+async def fetch_day(session, semaphore, base_url, day, retries) -> tuple:
+
+    """
+        Archive of the day, failed requests are retried with a growing delay
+
+        Returns (day, payload, size of the response in bytes)
+    """
+
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                async with session.get(archive_url(base_url, day)) as response:
+                    body = await response.read()
+                return day, json.loads(body), len(body)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def fetch_days(days, base_url, concurrency, retries) -> list:
+
+    """
+        Fetch archives of the days, not more than `concurrency` at once
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with make_session() as session:
+        return await asyncio.gather(*[
+            fetch_day(session, semaphore, base_url, day, retries)
+            for day in days
+        ])
+
+
+def load_checkpoint(path, start, end, base_url):
+
+    """
+        Last day, that has been completely saved by a run of the same range, or None
+
+        The checkpoint keeps the range and the archive URL of its run, a
+        checkpoint of another run, as well as a last day outside of the range,
+        is ignored: the days of the range are checked by saved_days anyway.
+    """
+
+    try:
+        with open(path) as checkpoint:
+            data = json.load(checkpoint)
+    except FileNotFoundError:
+        return None
+
+    if [data.get('start'), data.get('end'), data.get('base_url')] != [start.isoformat(), end.isoformat(), base_url]:
+        return None
+
+    last_day = date.fromisoformat(data['last_day'])
+    return last_day if start <= last_day <= end else None
+
+
+def save_checkpoint(path, day, start, end, base_url):
+    # пишем во временный файл и подменяем, чтобы прерванный запуск не оставил битый файл
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as checkpoint:
+        json.dump({
+            'last_day': day.isoformat(),
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'base_url': base_url,
+        }, checkpoint)
+    os.replace(tmp_path, path)
+
+
+def get_archive_source():
+    from currency.models import Source
+
+    source, _ = Source.objects.get_or_create(
+        code_name=const.CODE_NAME_PRIVATBANK,
+        defaults={'name': 'PrivatBank'},
+    )
+    return source
+
+
+def saved_days(source, days) -> set:
+
+    """
+        Days, that already have rates of the source
+    """
+
+    from currency.models import Rate
+
+    return set(
+        Rate.objects
+        .filter(source=source, created__date__range=(days[0], days[-1]))
+        .dates('created', 'day')
+    )
+
+
+def write_days(source, rates_by_day, batch_size) -> int:
+
+    """
+        Save rates of the days in one transaction with chunked bulk_create
+
+        Rates of a day are dated with the start of the day, LatestRate and
+        candles of the source are updated in the same transaction
+    """
+
+    from currency.models import LatestRate, Rate, RateCandle
+
+    rates = [
+        Rate(
+            source=source,
+            currency_name=currency_name,
+            bid=bid,
+            ask=ask,
+            created=timezone.make_aware(datetime.combine(day, datetime.min.time())),
+        )
+        for day, day_rates in sorted(rates_by_day.items())
+        for currency_name, bid, ask in day_rates
+    ]
+
+    with transaction.atomic():
+        Rate.objects.bulk_create(rates, batch_size=batch_size)
+        RateCandle.objects.add_rates(
+            (source.id, rate.currency_name, rate.bid, rate.ask, rate.created) for rate in rates
+        )
+        # bulk_create не вызывает Rate.save, архив может оказаться новее последних курсов
+        for currency_name in {rate.currency_name for rate in rates}:
+            LatestRate.objects.refresh(source.id, currency_name)
+
+    return len(rates)
+
+
+def backfill(
+    start,
+    end,
+    base_url=PRIVATBANK_ARCHIVE_URL,
+    concurrency=4,
+    window=30,
+    batch_size=500,
+    retries=3,
+    checkpoint=None,
+    dry_run=False,
+    log=None,
+) -> dict:
+
+    """
+        Load PrivatBank archive rates from start to end day inclusive
+
+        Days are processed in windows: archives of the window are fetched
+        concurrently, then saved in one transaction and the last day of the
+        window is written to the checkpoint file. An interrupted run of the
+        same range and URL continues from the day after the checkpoint. Days,
+        that already have rates of the source, are not fetched again, so the
+        backfill could be repeated safely.
+        In dry run nothing is saved, only the throughput is measured.
+    """
+
+    stats = {'days': 0, 'requests': 0, 'bytes': 0, 'rates': 0, 'created': 0, 'resumed_from': None}
+    started = time.monotonic()
+
+    days = days_range(start, end)
+    if checkpoint and not dry_run:
+        last_day = load_checkpoint(checkpoint, start, end, base_url)
+        if last_day is not None:
+            days = days_range(last_day + timedelta(days=1), end)
+            stats['resumed_from'] = last_day + timedelta(days=1)
+
+    source = None if dry_run else get_archive_source()
+
+    for offset in range(0, len(days), window):
+        window_days = days[offset:offset + window]
+
+        to_fetch = window_days
+        if source is not None:
+            existing = saved_days(source, window_days)
+            to_fetch = [day for day in window_days if day not in existing]
+
+        responses = asyncio.run(fetch_days(to_fetch, base_url, concurrency, retries)) if to_fetch else []
+
+        rates_by_day = {}
+        for day, payload, size in responses:
+            rates_by_day[day] = parse_archive(payload)
+            stats['bytes'] += size
+
+        stats['days'] += len(window_days)
+        stats['requests'] += len(responses)
+        stats['rates'] += sum(len(day_rates) for day_rates in rates_by_day.values())
+
+        if not dry_run:
+            stats['created'] += write_days(source, rates_by_day, batch_size)
+            if checkpoint:
+                save_checkpoint(checkpoint, window_days[-1], start, end, base_url)
+
+        if log is not None:
+            log(f'{window_days[0]} - {window_days[-1]}: {len(responses)} requests, {stats["rates"]} rates so far')
+
+    stats['elapsed'] = time.monotonic() - started
+
+    return stats
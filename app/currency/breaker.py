@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+
+    """
+        Circuit breaker of a source, shared by all workers through the cache
+
+        After `threshold` failures in a row the breaker opens and the source is
+        not polled. When `cooldown` seconds have passed, one run is allowed to
+        probe the source (half open): success closes the breaker, failure opens
+        it again for the next cooldown.
+    """
+
+    def __init__(self, name, threshold=None, cooldown=None):
+        self.name = name
+        self.threshold = threshold or settings.PARSER_BREAKER_THRESHOLD
+        self.cooldown = cooldown or settings.PARSER_BREAKER_COOLDOWN
+
+    @property
+    def key(self):
+        return f'currency::breaker::{self.name}'
+
+    @property
+    def probe_key(self):
+        return f'currency::breaker::{self.name}::probe'
+
+    def get(self) -> dict:
+        return cache.get(self.key) or {'state': STATE_CLOSED, 'failures': 0, 'opened_at': None}
+
+    def state(self, now=None) -> str:
+        data = self.get()
+        now = now or time.time()
+
+        if data['state'] == STATE_OPEN and now >= data['opened_at'] + self.cooldown:
+            return STATE_HALF_OPEN
+        return data['state']
+
+    def allow(self, now=None) -> bool:
+
+        """
+            Check if the source could be polled now
+
+            In half open state only the first caller gets the probe
+        """
+
+        state = self.state(now)
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_HALF_OPEN:
+            return cache.add(self.probe_key, True, self.cooldown)
+        return False
+
+    def record(self, failed, now=None):
+        data = self.get()
+        now = now or time.time()
+
+        if failed:
+            data['failures'] += 1
+            if data['state'] == STATE_OPEN or data['failures'] >= self.threshold:
+                data['state'] = STATE_OPEN
+                data['opened_at'] = now
+        else:
+            data = {'state': STATE_CLOSED, 'failures': 0, 'opened_at': None}
+
+        cache.set(self.key, data, None)
+        cache.delete(self.probe_key)
+
+    def reset(self):
+        cache.delete_many([self.key, self.probe_key])
+
+
+def get_states(names) -> dict:
+    return {name: CircuitBreaker(name).state() for name in names}
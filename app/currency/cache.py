@@ -0,0 +1,282 @@
+import threading
+import time
+from collections import OrderedDict
+
+from currency.locks import CacheLock
+
+from django.conf import settings
+from django.core.cache import cache
+
+MISSING = object()
+
+# Все локальные кэши процесса по имени, для статистики
+_caches = {}
+
+
+class LocalCache:
+
+    """
+        Process-local LRU cache with TTL in front of the shared Django cache
+
+        Entries belong to a generation, that is kept in the shared cache under
+        version_key. Writers call invalidate() to bump it, and every process
+        reads the generation again not more often than once in check_interval
+        seconds, dropping its entries if it has changed. So a stale entry is
+        served not longer than check_interval after the invalidation, without
+        a network round trip on every read.
+
+        name(str): name of the cache in the statistics
+        version_key(str): shared cache key of the generation
+        maxsize(int): entries kept by the process, the least recently used are evicted
+        ttl(float): lifetime of an entry in seconds
+        check_interval(float): how often the generation is checked, seconds
+    """
+
+    def __init__(self, name, version_key, maxsize=None, ttl=None, check_interval=None):
+        self.name = name
+        self.version_key = version_key
+        self.maxsize = maxsize or settings.LOCAL_CACHE_MAXSIZE
+        self.ttl = ttl if ttl is not None else settings.LOCAL_CACHE_TTL
+        self.check_interval = check_interval if check_interval is not None else settings.LOCAL_CACHE_CHECK_INTERVAL
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # последние значения устаревших и инвалидированных ключей, для stale-while-revalidate
+        self.stale = OrderedDict()
+        self.version = None
+        self.checked_at = None
+        self.counters = {
+            'local_hits': 0,
+            'local_misses': 0,
+            'shared_hits': 0,
+            'shared_misses': 0,
+            'stale_served': 0,
+        }
+
+        _caches[name] = self
+
+    def check_version(self, now):
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+
+        version = cache.get(self.version_key)
+        if version != self.version:
+            self.retire_entries()
+            self.version = version
+        self.checked_at = now
+
+    def retire(self, key, value):
+        self.stale[key] = value
+        self.stale.move_to_end(key)
+        while len(self.stale) > self.maxsize:
+            self.stale.popitem(last=False)
+
+    def retire_entries(self):
+        for key, (_, value) in self.entries.items():
+            self.retire(key, value)
+        self.entries.clear()
+
+    def get(self, key):
+
+        """
+            Value of the key or MISSING
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            self.check_version(now)
+
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                    self.retire(key, entry[1])
+                self.counters['local_misses'] += 1
+                return MISSING
+
+            self.entries.move_to_end(key)
+            self.counters['local_hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self.lock:
+            self.check_version(now)
+
+            self.entries[key] = (now + self.ttl, value)
+            self.entries.move_to_end(key)
+            self.stale.pop(key, None)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_stale(self, key):
+
+        """
+            Last value of the key, that has expired or has been invalidated, or MISSING
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                return entry[1]
+            return self.stale.get(key, MISSING)
+
+    def record_shared(self, hit):
+
+        """
+            Count a read of the shared tier after a local miss
+        """
+
+        with self.lock:
+            self.counters['shared_hits' if hit else 'shared_misses'] += 1
+
+    def record_stale(self):
+        with self.lock:
+            self.counters['stale_served'] += 1
+
+    def invalidate(self):
+
+        """
+            Drop the entries in all processes: bump the shared generation
+
+            The dropped values are still available with get_stale
+        """
+
+        if not cache.add(self.version_key, 1, None):
+            try:
+                cache.incr(self.version_key)
+            except ValueError:
+                cache.set(self.version_key, 1, None)
+
+        with self.lock:
+            self.retire_entries()
+            self.checked_at = None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.stale.clear()
+            self.checked_at = None
+
+    def stats(self) -> dict:
+        with self.lock:
+            counters = dict(self.counters)
+            size = len(self.entries)
+
+        local_reads = counters['local_hits'] + counters['local_misses']
+        shared_reads = counters['shared_hits'] + counters['shared_misses']
+
+        return {
+            **counters,
+            'size': size,
+            'local_hit_ratio': round(counters['local_hits'] / local_reads, 4) if local_reads else None,
+            'shared_hit_ratio': round(counters['shared_hits'] / shared_reads, 4) if shared_reads else None,
+        }
+
+
+def get_stats() -> dict:
+
+    """
+        Statistics of all local caches of the process
+    """
+
+    return {name: local_cache.stats() for name, local_cache in _caches.items()}
+
+
+def single_flight(key, compute, stale=MISSING, ready=None, lease=None, wait=None, poll=0.05):
+
+    """
+        Recompute an expensive value by one caller at a time
+
+        The caller, that takes the lock of the key, computes the value. Other
+        callers return the stale value at once, if they have one; otherwise
+        they wait up to `wait` seconds for ready() to give the value, computed
+        by the lock holder, and compute it themselves, if it has not appeared.
+
+        key(str): cache key of the value, the lock is kept next to it
+        compute(callable): computes and stores the value, returns it
+        stale(object): previous value, MISSING if there is none
+        ready(callable): returns the value, if the lock holder has stored it, otherwise None
+        lease(float): lifetime of the lock, seconds
+    """
+
+    lock = CacheLock(f'{key}::lock', lease or settings.CACHE_RECOMPUTE_LEASE)
+    if lock.acquire():
+        try:
+            return compute()
+        finally:
+            lock.release()
+
+    if stale is not MISSING:
+        return stale
+
+    deadline = time.monotonic() + (settings.CACHE_RECOMPUTE_WAIT if wait is None else wait)
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        if ready is not None:
+            value = ready()
+            if value is not None:
+                return value
+        if not lock.is_locked():
+            break
+
+    return compute()
+
+
+def stale_while_revalidate(key, compute, timeout, stale_timeout, **options):
+
+    """
+        Value of the key in the shared cache, recomputed by one caller at a time
+
+        The value is fresh for `timeout` seconds and is served stale for
+        `stale_timeout` seconds more, while one caller recomputes it (see
+        single_flight). Calls of invalidate_stale() make the value stale, but
+        keep it for the other callers.
+
+        compute(callable): computes the value, should not return None
+    """
+
+    envelope = cache.get(key)
+    now = time.time()
+
+    if envelope is not None and now < envelope['fresh_until']:
+        return envelope['value']
+
+    def recompute():
+        value = compute()
+        now = time.time()
+        cache.set(
+            key,
+            {'value': value, 'fresh_until': now + timeout, 'expires_at': now + timeout + stale_timeout},
+            timeout + stale_timeout,
+        )
+        return value
+
+    def ready():
+        fresh = cache.get(key)
+        if fresh is not None and time.time() < fresh['fresh_until']:
+            return fresh['value']
+        return None
+
+    stale = MISSING if envelope is None else envelope['value']
+
+    return single_flight(key, recompute, stale=stale, ready=ready, **options)
+
+
+def invalidate_stale(key):
+
+    """
+        Make the value of stale_while_revalidate stale, callers get it until it is recomputed
+
+        The value keeps the expiry, it has been stored with.
+    """
+
+    envelope = cache.get(key)
+    if envelope is None:
+        return
+
+    # значения, сохраненные до появления expires_at, живут прежний срок
+    remaining = envelope.get('expires_at', time.time() + cache.default_timeout) - time.time()
+    if remaining > 0:
+        envelope['fresh_until'] = 0
+        cache.set(key, envelope, remaining)
@@ -6,3 +6,6 @@ CODE_NAME_VKURSE = 'CODE_NAME_VKURSE'
 CODE_NAME_MINFIN = 'CODE_NAME_MINFIN'
 
 CACHE_KEY_LATEST_RATES = 'currency::views::LatestRatesView::latest-rates'
+CACHE_KEY_PARSING_STATS = 'currency::parsers::stats'
+CACHE_KEY_PARSING_LOCK = 'currency::tasks::run_parsing::lock'
+CACHE_KEY_ANALYTICS = 'currency::analytics'
@@ -0,0 +1,3 @@
+"""
+    Database backends of Django with the connections counted and timed, see currency.db_connections
+"""
@@ -0,0 +1,7 @@
+from currency.db_connections import InstrumentedConnectionMixin
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(InstrumentedConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,168 @@
+import threading
+import time
+import weakref
+from collections import Counter
+
+from currency import metrics
+
+from django.conf import settings
+from django.db import connections
+
+# ключ метрик currency.metrics: соединения считаются по alias базы
+OPEN_LATENCY = 'db_connect_latency'
+OPENED = 'db_connections_opened'
+CLOSED = 'db_connections_closed'
+CLOSED_UNUSABLE = 'db_connections_closed_unusable'
+CLOSED_CAPPED = 'db_connections_closed_capped'
+
+_lock = threading.Lock()
+# DatabaseWrapper -> alias открытых соединений процесса, у каждого потока свои;
+# обертки завершившихся потоков выпадают сами
+_open = weakref.WeakKeyDictionary()
+
+
+class InstrumentedConnectionMixin:
+
+    """
+        Mixin for the database wrappers, that counts opened connections and times their opening
+
+        See currency.db_backends, ENGINE of DATABASES should point there.
+    """
+
+    def get_new_connection(self, conn_params):
+        start = time.monotonic()
+        connection = super().get_new_connection(conn_params)
+
+        metrics.observe(OPEN_LATENCY, self.alias, time.monotonic() - start)
+        metrics.incr(OPENED, self.alias)
+        with _lock:
+            _open[self] = self.alias
+        return connection
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            metrics.incr(CLOSED, self.alias)
+            with _lock:
+                _open.pop(self, None)
+
+
+def open_count(alias) -> int:
+
+    """
+        Connections to the database, that all threads of the process hold now
+    """
+
+    with _lock:
+        return sum(1 for open_alias in _open.values() if open_alias == alias)
+
+
+def idle_connections():
+
+    """
+        Open connections of the current thread, that are not inside a transaction
+
+        A connection inside a transaction, e.g. of a test, is never closed.
+    """
+
+    for connection in connections.all():
+        if connection.connection is not None and not connection.in_atomic_block:
+            yield connection
+
+
+def check(connection):
+
+    """
+        Close the connection before its reuse, if it is obsolete or broken
+
+        Besides CONN_MAX_AGE and errors, that Django checks, a persistent
+        connection is pinged (see is_usable): the database may have dropped it
+        while it was idle, then the next query opens a new one instead of failing.
+    """
+
+    connection.close_if_unusable_or_obsolete()
+    if connection.connection is not None and not connection.is_usable():
+        metrics.incr(CLOSED_UNUSABLE, connection.alias)
+        connection.close()
+
+
+def release(connection):
+
+    """
+        Close the connection after its use, if it should not be kept
+
+        Connections, that are older than CONN_MAX_AGE or broken, are closed,
+        and so are the connections over DATABASE_PROCESS_MAX_CONNECTIONS of
+        the process: every thread keeps its own connection, the cap keeps the
+        total of the workers within the limit of the database.
+    """
+
+    connection.close_if_unusable_or_obsolete()
+    if connection.connection is not None and \
+            open_count(connection.alias) > settings.DATABASE_PROCESS_MAX_CONNECTIONS:
+        metrics.incr(CLOSED_CAPPED, connection.alias)
+        connection.close()
+
+
+def check_connections(**kwargs):
+
+    """
+        Check the connections of the thread before a request or a task
+    """
+
+    for connection in idle_connections():
+        check(connection)
+
+
+def release_connections(**kwargs):
+
+    """
+        Release the connections of the thread after a request or a task
+    """
+
+    for connection in idle_connections():
+        release(connection)
+
+
+def get_stats() -> dict:
+
+    """
+        Connections of the process for every database: open now, opened and closed, latency of opening
+    """
+
+    snapshot = metrics.snapshot()
+    counters, timings = snapshot['counters'], snapshot['timings']
+    with _lock:
+        holding = Counter(_open.values())
+
+    return {
+        alias: {
+            'open': holding.get(alias, 0),
+            'opened': counters.get(OPENED, {}).get(alias, 0),
+            'closed': counters.get(CLOSED, {}).get(alias, 0),
+            'closed_unusable': counters.get(CLOSED_UNUSABLE, {}).get(alias, 0),
+            'closed_capped': counters.get(CLOSED_CAPPED, {}).get(alias, 0),
+            'connect_latency': timings.get(OPEN_LATENCY, {}).get(alias),
+        }
+        for alias in settings.DATABASES
+    }
+
+
+def setup():
+
+    """
+        Connect the checks to the boundaries of requests and Celery tasks
+
+        Django closes obsolete connections on request_started and
+        request_finished itself, these handlers run after it.
+    """
+
+    from celery.signals import task_postrun, task_prerun
+
+    from django.core.signals import request_finished, request_started
+
+    request_started.connect(check_connections, dispatch_uid='currency.db_connections.request_started')
+    request_finished.connect(release_connections, dispatch_uid='currency.db_connections.request_finished')
+    task_prerun.connect(check_connections, dispatch_uid='currency.db_connections.task_prerun', weak=False)
+    task_postrun.connect(release_connections, dispatch_uid='currency.db_connections.task_postrun', weak=False)
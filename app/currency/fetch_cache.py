@@ -0,0 +1,51 @@
+import hashlib
+
+# Валидаторы последнего ответа по url: {url: (etag, last_modified, digest)}
+_validators = {}
+
+
+def digest(body) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def conditional_headers(url) -> dict:
+
+    """
+        If-None-Match/If-Modified-Since headers for the url, if the source sent validators before
+    """
+
+    etag, last_modified, _ = _validators.get(url, (None, None, None))
+
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    return headers
+
+
+def is_unchanged(url, body) -> bool:
+
+    """
+        Check if the body is the same as the last processed body of the url
+    """
+
+    validators = _validators.get(url)
+    return validators is not None and validators[2] == digest(body)
+
+
+def remember(url, headers, body):
+    _validators[url] = (headers.get('ETag'), headers.get('Last-Modified'), digest(body))
+
+
+def reset():
+
+    """
+        Forget all payloads, so the next poll of every source is processed
+
+        Is used when the run could not save the rates, otherwise the same
+        payloads would be skipped and never saved
+    """
+
+    _validators.clear()
@@ -0,0 +1,183 @@
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+# Размер куска html, который отдается парсеру за раз
+CHUNK_SIZE = 16 * 1024
+
+
+class StopParsing(Exception):
+    pass
+
+
+class TargetedParser(HTMLParser):
+
+    """
+        Base class of streaming extractors
+
+        The document is fed by chunks and no tree is built: a subclass keeps
+        only the cells it looks for and raises StopParsing when it has them,
+        so the rest of the page is not even tokenized.
+    """
+
+    def extract(self, html):
+        try:
+            for position in range(0, len(html), CHUNK_SIZE):
+                self.feed(html[position:position + CHUNK_SIZE])
+            self.close()
+        except StopParsing:
+            pass
+
+        return self.result()
+
+    def result(self):
+        raise NotImplementedError
+
+
+class MinfinAverageParser(TargetedParser):
+
+    """
+        Text of <td data-title="Средний курс"> without the <span> elements
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.in_cell = False
+        self.span_depth = 0
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.in_cell:
+            if tag == 'span':
+                self.span_depth += 1
+        elif tag == 'td' and ('data-title', 'Средний курс') in attrs:
+            self.in_cell = True
+
+    def handle_endtag(self, tag):
+        if not self.in_cell:
+            return
+        if tag == 'span' and self.span_depth:
+            self.span_depth -= 1
+        elif tag == 'td':
+            raise StopParsing
+
+    def handle_data(self, data):
+        if self.in_cell and not self.span_depth:
+            self.parts.append(data)
+
+    def result(self):
+        if not self.in_cell:
+            return None
+        return ''.join(self.parts)
+
+
+class FirstTableParser(TargetedParser):
+
+    """
+        Rows of the first <table>, as lists of <td> texts
+
+        currency_names(iterable): names from the first cell of rows to keep,
+        parsing stops as soon as all of them are found
+    """
+
+    def __init__(self, currency_names):
+        super().__init__()
+        self.currency_names = set(currency_names)
+        self.in_table = False
+        self.row = None
+        self.cell = None
+        self.rows = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.in_table = True
+        elif not self.in_table:
+            return
+        elif tag == 'tr':
+            self.row = []
+        elif tag == 'td' and self.row is not None:
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if not self.in_table:
+            return
+
+        if tag == 'td' and self.cell is not None:
+            self.row.append(''.join(self.cell))
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            if self.row and self.row[0] in self.currency_names:
+                self.rows.append(self.row)
+                self.currency_names.discard(self.row[0])
+            self.row = None
+            if not self.currency_names:
+                raise StopParsing
+        elif tag == 'table':
+            raise StopParsing
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def result(self):
+        return self.rows
+
+
+def minfin_average(html):
+
+    """
+        Buy and sell values of the average rate on a minfin.com.ua page
+    """
+
+    text = MinfinAverageParser().extract(html)
+    if text is None:
+        raise ValueError('minfin page has no average rate cell')
+
+    # the first position is buy, second is sell
+    return text.split()[:2]
+
+
+def minfin_average_soup(html):
+
+    """
+        The same as minfin_average, but with the whole BeautifulSoup tree
+    """
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    for span in soup("span"):
+        span.decompose()
+
+    cell = soup.find('td', {'data-title': "Средний курс"})
+    if cell is None:
+        raise ValueError('minfin page has no average rate cell')
+
+    return cell.text.split()[:2]
+
+
+def first_table_rows(html, currency_names):
+    return FirstTableParser(currency_names).extract(html)
+
+
+def first_table_rows_soup(html, currency_names):
+
+    """
+        The same as first_table_rows, but with the whole BeautifulSoup tree
+    """
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    rows = []
+    for row in soup.find('table').find_all('tr'):
+        cells = [col.text for col in row.find_all('td')]
+        if cells and cells[0] in currency_names:
+            rows.append(cells)
+
+    return rows
+
+
+# Способы разбора html страниц, выбираются настройкой PARSER_HTML_EXTRACTION
+EXTRACTION_MODES = {
+    'stream': (minfin_average, first_table_rows),
+    'soup': (minfin_average_soup, first_table_rows_soup),
+}
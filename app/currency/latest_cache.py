@@ -0,0 +1,237 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from currency import const
+from currency import model_choices as mch
+from currency.cache import LocalCache, MISSING, single_flight
+
+from django.core.cache import cache
+
+LATEST_RATES_TIMEOUT = 60 * 60 * 24 * 14
+
+# Пары хранятся как LatestEntry, ключи отличаются от ключей прежних экземпляров Rate
+ENTRIES_KEY = f'{const.CACHE_KEY_LATEST_RATES}::entries'
+VERSION_KEY = f'{const.CACHE_KEY_LATEST_RATES}::version'
+INDEX_KEY = f'{ENTRIES_KEY}::index'
+# Поколение досок в локальных кэшах процессов, меняется при каждой записи курса
+GENERATION_KEY = f'{const.CACHE_KEY_LATEST_RATES}::generation'
+BOARD = 'board'
+
+board_cache = LocalCache('latest_rates', GENERATION_KEY)
+
+# Индекс доски, известный процессу: (version, keys)
+_index = None
+
+
+class LatestEntry(NamedTuple):
+
+    """
+        Latest rate of a pair as it is cached: a plain tuple without ORM state
+
+        It carries everything the board is rendered with, so templates and the
+        API do not touch the database. Prices are kept as strings, as they are
+        rendered.
+    """
+
+    id: int
+    source_id: int
+    currency_name: str
+    bid: str
+    ask: str
+    created: datetime
+    source_name: str
+    logo_url: Optional[str]
+
+
+def to_entry(rate) -> LatestEntry:
+
+    """
+        rate(Rate): with the source loaded
+    """
+
+    source = rate.source
+    return LatestEntry(
+        rate.id,
+        rate.source_id,
+        rate.currency_name,
+        str(rate.bid),
+        str(rate.ask),
+        rate.created,
+        source.name,
+        source.logo.url if source.logo else None,
+    )
+
+
+def pair_key(source_id, currency_name) -> str:
+    return f'{ENTRIES_KEY}::{source_id}::{currency_name}'
+
+
+def board_order(rate):
+    currencies = [currency_type for currency_type, _ in mch.RATE_TYPES]
+    return rate.source_id, currencies.index(rate.currency_name)
+
+
+def bump_version():
+
+    """
+        Mark the set of pairs as changed, readers will rebuild the index
+    """
+
+    cache.delete(INDEX_KEY)
+    if not cache.add(VERSION_KEY, 1, None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+
+def load_index():
+    global _index
+
+    data = cache.get_many([VERSION_KEY, INDEX_KEY])
+    index = data.get(INDEX_KEY)
+    if index is None or index['version'] != data.get(VERSION_KEY):
+        _index = None
+    else:
+        _index = (index['version'], index['keys'])
+
+    return _index
+
+
+def get_board():
+
+    """
+        Latest rates of all pairs, or None if the cache can not assemble the board
+
+        The board is kept by the process (see currency.cache.LocalCache), on a
+        local miss it is assembled from the shared cache
+    """
+
+    board = board_cache.get(BOARD)
+    if board is not MISSING:
+        return board
+
+    board = read_board()
+    board_cache.record_shared(board is not None)
+    if board is not None:
+        board_cache.set(BOARD, board)
+
+    return board
+
+
+def reload_board(load):
+
+    """
+        Reload the board after a miss of both tiers, by one caller at a time
+
+        While the lock holder reads the database, other callers get the last
+        board, known to their process, or wait for the holder to put the board
+        to the shared cache.
+
+        load(callable): reads the board from the database and loads it to the cache
+    """
+
+    stale = board_cache.get_stale(BOARD)
+
+    board = single_flight(const.CACHE_KEY_LATEST_RATES, load, stale=stale, ready=read_board)
+    if board is stale:
+        board_cache.record_stale()
+
+    return board
+
+
+def read_board():
+
+    """
+        Board from the shared cache
+
+        The process keeps the index of the pair keys, so the version and all
+        the pairs are read with one get_many. The index is read again only
+        when the version has changed, i.e. a pair has appeared or gone.
+    """
+
+    for _ in range(2):
+        index = _index or load_index()
+        if index is None:
+            return None
+
+        version, keys = index
+        values = cache.get_many([VERSION_KEY, *keys])
+        if values.get(VERSION_KEY) == version:
+            if len(values) != len(keys) + 1:
+                return None
+            return sorted((values[key] for key in keys), key=board_order)
+
+        load_index()
+
+    return None
+
+
+def load_board(rates) -> list:
+
+    """
+        Put the board, read from the database, to the cache and return it
+
+        Pairs are only added, a rate written through by a concurrent writer
+        is newer than the one read by this reader
+
+        rates(list): Rate objects with the source loaded
+    """
+
+    global _index
+
+    board = sorted(map(to_entry, rates), key=board_order)
+    for entry in board:
+        cache.add(pair_key(entry.source_id, entry.currency_name), entry, LATEST_RATES_TIMEOUT)
+
+    bump_version()
+    version = cache.get(VERSION_KEY)
+    keys = [pair_key(entry.source_id, entry.currency_name) for entry in board]
+    cache.set(INDEX_KEY, {'version': version, 'keys': keys}, LATEST_RATES_TIMEOUT)
+    _index = (version, keys)
+
+    board_cache.set(BOARD, board)
+
+    return board
+
+
+def store(rates):
+
+    """
+        Write through the latest rates of their pairs
+
+        rates(list): Rate objects with the source loaded
+    """
+
+    if not rates:
+        return
+
+    cache.set_many(
+        {pair_key(rate.source_id, rate.currency_name): to_entry(rate) for rate in rates},
+        LATEST_RATES_TIMEOUT,
+    )
+
+    index = cache.get(INDEX_KEY)
+    if index is not None:
+        keys = set(index['keys'])
+        if any(pair_key(rate.source_id, rate.currency_name) not in keys for rate in rates):
+            bump_version()
+
+    board_cache.invalidate()
+
+
+def drop(source_id, currency_name):
+
+    """
+        The pair has no rates anymore
+    """
+
+    cache.delete(pair_key(source_id, currency_name))
+    bump_version()
+    board_cache.invalidate()
+
+
+def reset():
+    global _index
+    _index = None
+    board_cache.clear()
@@ -0,0 +1,48 @@
+import uuid
+
+from django.core.cache import cache
+
+
+class CacheLock:
+
+    """
+        Distributed lock with a lease, based on the atomic cache.add
+
+        The lock expires by itself after `lease` seconds, so a crashed holder
+        can not block others forever. The holder should finish its work before
+        the lease ends, otherwise another process could take the lock.
+
+        key(str): cache key of the lock
+        lease(int): lifetime of the lock in seconds
+    """
+
+    def __init__(self, key, lease):
+        self.key = key
+        self.lease = lease
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+
+    def acquire(self) -> bool:
+        self.acquired = cache.add(self.key, self.token, self.lease)
+        return self.acquired
+
+    def release(self):
+
+        """
+            Remove the lock, if it still belongs to this holder
+
+            get and delete are not atomic, but the gap is negligible compared with the lease
+        """
+
+        if self.acquired and cache.get(self.key) == self.token:
+            cache.delete(self.key)
+        self.acquired = False
+
+    def is_locked(self) -> bool:
+        return cache.get(self.key) is not None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
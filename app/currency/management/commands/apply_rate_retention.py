@@ -0,0 +1,32 @@
+from currency.retention import apply_retention
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+
+    """
+        Command for downsampling old rates to hour and day candles
+    """
+
+    help = 'Downsample rates older than the retention period to candles and drop them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.RATE_RETENTION_DAYS,
+            help='raw rates are kept for, RATE_RETENTION_DAYS by default',
+        )
+
+    def handle(self, *args, **options):
+        if not options['days']:
+            raise CommandError('Set --days or RATE_RETENTION_DAYS')
+
+        stats = apply_retention(options['days'], log=self.stdout.write)
+        self.stdout.write(
+            f'Before {stats["cutoff"]:%Y-%m-%d}: {stats["days"]} days, {stats["rates"]} rates, '
+            f'{stats["candles"]} candles, {stats["deleted"]} deleted, '
+            f'{len(stats["dropped_partitions"])} partitions dropped'
+        )
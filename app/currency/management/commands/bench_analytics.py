@@ -0,0 +1,130 @@
+import time
+from datetime import timedelta
+
+from currency import analytics
+from currency import model_choices as mch
+from currency.management.commands.bench_latest_rates import Command as BenchLatestRatesCommand
+from currency.models import Rate, Source
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+def naive_rate_analytics(source_id, currency_name, start, end, resolution, window):
+
+    """
+        Previous way: a loop over the Rate queryset with Decimal prices
+    """
+
+    first = int(start.timestamp()) // resolution * resolution
+    buckets = {}
+    for rate in Rate.objects \
+            .filter(source_id=source_id, currency_name=currency_name, created__gte=start, created__lt=end) \
+            .order_by('created', 'id'):
+        bucket = (int(rate.created.timestamp()) - first) // resolution
+        buckets[bucket] = rate
+
+    points = []
+    last = None
+    for bucket in range((int(end.timestamp()) - first + resolution - 1) // resolution):
+        last = buckets.get(bucket, last)
+        if last is not None:
+            points.append((first + bucket * resolution, last.bid, last.ask, last.ask - last.bid))
+
+    means = []
+    for number in range(window - 1, len(points)):
+        means.append(sum(point[1] for point in points[number - window + 1:number + 1]) / window)
+    return points, means
+
+
+def naive_best_rates(currency_name, start, end, resolution):
+    first = int(start.timestamp()) // resolution * resolution
+    last_by_source = {}
+    best = {}
+    for rate in Rate.objects \
+            .filter(currency_name=currency_name, created__gte=start, created__lt=end) \
+            .order_by('created', 'id'):
+        last_by_source[rate.source_id] = rate
+        bucket = (int(rate.created.timestamp()) - first) // resolution
+        best[bucket] = (
+            max(rate.bid for rate in last_by_source.values()),
+            min(rate.ask for rate in last_by_source.values()),
+        )
+    return best
+
+
+class Command(BaseCommand):
+
+    """
+        Command for comparing the ORM loops with the NumPy analytics on big rate tables
+    """
+
+    help = 'Benchmark rate analytics: ORM loops against NumPy arrays, generated rates are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--sources', type=int, default=5, help='generated sources')
+        parser.add_argument('--resolution', type=int, default=60, help='bucket seconds')
+        parser.add_argument('--window', type=int, default=24)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"rows":>10}  {"analytics":<10}{"method":<8}{"best ms":>10}')
+        resolution, window = options['resolution'], options['window']
+
+        with transaction.atomic():
+            sources = [
+                Source.objects.create(code_name=f'BENCH_{number}', name=f'bench {number}')
+                for number in range(options['sources'])
+            ]
+            source_id, currency_name = sources[0].id, mch.RATE_TYPES[0][0]
+            # курсы генерируются раз в секунду, начиная с 3650 дней назад
+            start = timezone.now() - timedelta(days=3651)
+
+            inserted = 0
+            for rows in sorted(options['rows']):
+                BenchLatestRatesCommand.insert_rates(sources, inserted, rows - inserted)
+                inserted = rows
+                end = start + timedelta(days=1, seconds=rows)
+
+                for name, naive, vectorized in (
+                    (
+                        'rate',
+                        lambda: naive_rate_analytics(source_id, currency_name, start, end, resolution, window),
+                        lambda: self.rate_analytics(source_id, currency_name, start, end, resolution, window),
+                    ),
+                    (
+                        'best',
+                        lambda: naive_best_rates(currency_name, start, end, resolution),
+                        lambda: self.best_rates(sources, currency_name, start, end, resolution),
+                    ),
+                ):
+                    for method, compute in (('orm', naive), ('numpy', vectorized)):
+                        best = self.measure(compute, options['repeat'])
+                        self.stdout.write(f'{rows:>10}  {name:<10}{method:<8}{best * 1000:>10.2f}')
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def rate_analytics(source_id, currency_name, start, end, resolution, window):
+        grid = analytics.make_grid(start, end, resolution)
+        series = analytics.resample(analytics.load_series(source_id, currency_name, start, end), grid, resolution)
+        return series.spread(), analytics.rolling_mean(series.bid, window), analytics.volatility(series, window)
+
+    @staticmethod
+    def best_rates(sources, currency_name, start, end, resolution):
+        grid = analytics.make_grid(start, end, resolution)
+        return analytics.best_of_sources(
+            [analytics.load_series(source.id, currency_name, start, end) for source in sources], grid, resolution,
+        )
+
+    @staticmethod
+    def measure(compute, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compute()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
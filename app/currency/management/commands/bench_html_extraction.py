@@ -0,0 +1,68 @@
+import time
+import tracemalloc
+from pathlib import Path
+
+from currency import html_extract
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PUMB_CURRENCY_NAMES = ('USD', 'EUR')
+
+
+class Command(BaseCommand):
+
+    """
+        Command for comparing html extraction modes on saved pages
+    """
+
+    help = 'Benchmark stream and soup html extraction of minfin and PUMB pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures',
+            default=str(Path(settings.BASE_DIR) / 'tests' / 'fixtures' / 'html'),
+            help='directory with saved minfin_*.html and pumb.html pages',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        fixtures = Path(options['fixtures'])
+        pages = sorted(fixtures.glob('minfin_*.html')) + sorted(fixtures.glob('pumb*.html'))
+
+        self.stdout.write(f'{"page":<20}{"mode":<8}{"cpu ms/page":>14}{"peak KiB":>12}')
+
+        for page in pages:
+            html = page.read_text(encoding='utf-8')
+
+            for mode, (minfin_average, first_table_rows) in html_extract.EXTRACTION_MODES.items():
+                if page.name.startswith('minfin'):
+                    def extract():
+                        return minfin_average(html)
+                else:
+                    def extract():
+                        return first_table_rows(html, PUMB_CURRENCY_NAMES)
+
+                cpu_time = self.measure_cpu(extract, options['repeat'])
+                peak = self.measure_peak(extract)
+
+                self.stdout.write(
+                    f'{page.name:<20}{mode:<8}{cpu_time * 1000:>14.2f}{peak / 1024:>12.1f}'
+                )
+
+    @staticmethod
+    def measure_cpu(extract, repeat):
+        start = time.process_time()
+        for _ in range(repeat):
+            extract()
+        return (time.process_time() - start) / repeat
+
+    @staticmethod
+    def measure_peak(extract):
+        tracemalloc.start()
+        try:
+            extract()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
@@ -0,0 +1,142 @@
+import pickle
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from currency import latest_cache
+from currency import model_choices as mch
+from currency.models import Rate, Source
+from currency.services import compute_latest_rates
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+INSERT_CHUNK = 50000
+
+
+def per_pair_latest_rates():
+
+    """
+        Previous implementation of get_latest_rates: one query per source and currency
+    """
+
+    rates = []
+    for source in Source.objects.all():
+        for currency_type, _ in mch.RATE_TYPES:
+            rate = Rate.objects \
+                .filter(source=source, currency_name=currency_type) \
+                .order_by('-created').first()
+            if rate is not None:
+                rates.append(rate)
+    return rates
+
+
+class Command(BaseCommand):
+
+    """
+        Command for comparing latest rates computation on big rate tables
+    """
+
+    help = (
+        'Benchmark per-pair and single-query latest rates and the size of their cache payloads, '
+        'generated rates are rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+        parser.add_argument('--sources', type=int, default=10, help='generated sources')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"rows":>10}  {"method":<14}{"queries":>8}{"best ms":>10}')
+
+        with transaction.atomic():
+            sources = [
+                Source.objects.create(code_name=f'BENCH_{number}', name=f'bench {number}')
+                for number in range(options['sources'])
+            ]
+
+            inserted = 0
+            for rows in sorted(options['rows']):
+                self.insert_rates(sources, inserted, rows - inserted)
+                inserted = rows
+
+                for method, compute in (('per pair', per_pair_latest_rates), ('single query', compute_latest_rates)):
+                    queries, best = self.measure(compute, options['repeat'])
+                    self.stdout.write(f'{rows:>10}  {method:<14}{queries:>8}{best * 1000:>10.2f}')
+
+            self.report_payloads(compute_latest_rates(), options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def report_payloads(self, rates, repeat):
+
+        """
+            Compare the cached board of pickled Rate instances with the board of LatestEntry tuples
+        """
+
+        self.stdout.write(f'\n{"payload":<14}{"pairs":>8}{"bytes":>10}{"load us":>10}')
+        for payload, board in (('Rate', rates), ('LatestEntry', [latest_cache.to_entry(rate) for rate in rates])):
+            pickled = [pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for value in board]
+
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for value in pickled:
+                    pickle.loads(value)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            size = sum(map(len, pickled))
+            self.stdout.write(f'{payload:<14}{len(board):>8}{size:>10}{best * 1_000_000:>10.1f}')
+
+    @staticmethod
+    def insert_rates(sources, start, count):
+
+        """
+            Insert generated rates in chunks with executemany, bypassing model instances
+        """
+
+        currencies = [currency_type for currency_type, _ in mch.RATE_TYPES]
+        pairs = [(source.id, currency) for source in sources for currency in currencies]
+        ops = connection.ops
+        begin = timezone.now() - timedelta(days=3650)
+
+        sql = (
+            f'INSERT INTO {ops.quote_name(Rate._meta.db_table)} '
+            f'(source_id, currency_name, bid, ask, created, currency_type) VALUES (%s, %s, %s, %s, %s, %s)'
+        )
+
+        with connection.cursor() as cursor:
+            for chunk_start in range(start, start + count, INSERT_CHUNK):
+                chunk_end = min(chunk_start + INSERT_CHUNK, start + count)
+                params = []
+                for number in range(chunk_start, chunk_end):
+                    source_id, currency = pairs[number % len(pairs)]
+                    price = Decimal(25 + number % 2000 / 100).quantize(Decimal('.01'))
+                    params.append((
+                        source_id,
+                        currency,
+                        ops.adapt_decimalfield_value(price, 4, 2),
+                        ops.adapt_decimalfield_value(price + 1, 4, 2),
+                        ops.adapt_datetimefield_value(begin + timedelta(seconds=number)),
+                        '',
+                    ))
+                cursor.executemany(sql, params)
+
+    @staticmethod
+    def measure(compute, repeat):
+        with CaptureQueriesContext(connection) as captured:
+            compute()
+        queries = len(captured)
+
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compute()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        return queries, best
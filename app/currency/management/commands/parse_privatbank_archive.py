@@ -1,15 +1,73 @@
-from currency.models import Rate
+import asyncio
+from datetime import date, timedelta
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from currency import backfill
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import aiohttp
 
 
 class Command(BaseCommand):
 
     """
-        Command for initialize rate archive parsing
+        Command for backfilling rates from the Privatbank archive
     """
 
-    help_ = 'Parse Privatbank Rate archive'
+    help = 'Parse Privatbank Rate archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, required=True, help='first day, YYYY-MM-DD')
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            default=date.today() - timedelta(days=1),
+            help='last day, YYYY-MM-DD, yesterday by default',
+        )
+        parser.add_argument('--base-url', default=backfill.PRIVATBANK_ARCHIVE_URL)
+        parser.add_argument('--concurrency', type=int, default=4, help='archive requests at once')
+        parser.add_argument('--window', type=int, default=30, help='days saved in one transaction')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--retries', type=int, default=3)
+        parser.add_argument(
+            '--checkpoint',
+            default=str(Path(settings.BASE_DIR) / 'privatbank_archive.checkpoint.json'),
+            help='file with the last saved day, the run continues from it',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='fetch and parse, but do not save')
 
     def handle(self, *args, **options):
-        print('Count: ', Rate.objects.count())  # noqa
\ No newline at end of file
+        if options['start'] > options['end']:
+            raise CommandError('--start should not be after --end')
+
+        try:
+            stats = backfill.backfill(
+                options['start'],
+                options['end'],
+                base_url=options['base_url'],
+                concurrency=options['concurrency'],
+                window=options['window'],
+                batch_size=options['batch_size'],
+                retries=options['retries'],
+                checkpoint=options['checkpoint'],
+                dry_run=options['dry_run'],
+                log=self.stdout.write,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            # те же ошибки, что повторяет backfill.fetch_day, после последней попытки
+            raise CommandError(f'Archive request failed, rerun to continue from the checkpoint: {error!r}')
+
+        elapsed = max(stats['elapsed'], 1e-9)
+        if stats['resumed_from']:
+            self.stdout.write(f'Resumed from {stats["resumed_from"]}')
+        self.stdout.write(
+            f'Days: {stats["days"]}, requests: {stats["requests"]}, '
+            f'rates: {stats["rates"]}, created: {stats["created"]}, '
+            f'{stats["bytes"] / 1024:.1f} KiB in {stats["elapsed"]:.2f} s'
+        )
+        self.stdout.write(
+            f'Throughput: {stats["requests"] / elapsed:.1f} requests/s, '
+            f'{stats["rates"] / elapsed:.1f} rates/s, {stats["bytes"] / 1024 / elapsed:.1f} KiB/s'
+        )
@@ -0,0 +1,44 @@
+from currency import partitions
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+
+    """
+        Command for monthly partitions of the rates table on PostgreSQL
+    """
+
+    help = 'Convert the rates table to monthly partitions and create partitions of the next months'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='turn the rates table into a partitioned one, writers wait while the rates are copied',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.RATE_PARTITIONS_AHEAD,
+            help='months after the current one to create partitions for',
+        )
+        parser.add_argument('--list', action='store_true', help='list the monthly partitions')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError('Partitioned rates need PostgreSQL, on other databases apply_rate_retention only')
+
+        if options['convert']:
+            created = partitions.convert(options['ahead'])
+            self.stdout.write(f'Converted, {len(created)} partitions' if created else 'Already partitioned')
+        elif not partitions.is_partitioned():
+            raise CommandError('The rates table is not partitioned, run with --convert first')
+        else:
+            created = partitions.create_partitions(partitions.months_ahead(options['ahead']))
+            self.stdout.write(f'Created and attached: {", ".join(created) or "none"}')
+
+        if options['list']:
+            for name, month in partitions.list_partitions():
+                self.stdout.write(f'{month:%Y-%m}  {name}')
@@ -0,0 +1,18 @@
+from currency.services import rebuild_latest_rates
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+
+    """
+        Command for restoring latest rates from the rates history
+    """
+
+    help = 'Rebuild LatestRate table from Rate history'
+
+    def handle(self, *args, **options):
+        counts = rebuild_latest_rates()
+        self.stdout.write(
+            f'Created: {counts["created"]}, updated: {counts["updated"]}, deleted: {counts["deleted"]}'
+        )
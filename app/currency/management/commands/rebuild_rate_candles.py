@@ -0,0 +1,27 @@
+from datetime import date
+
+from currency.services import rebuild_candles
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+
+    """
+        Command for restoring hour and day candles from the rates history
+    """
+
+    help = 'Rebuild RateCandle table from Rate history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            default=None,
+            help='first day, YYYY-MM-DD, by default the first rate, but not before the retention cutoff',
+        )
+        parser.add_argument('--end', type=date.fromisoformat, default=None, help='last day, today by default')
+
+    def handle(self, *args, **options):
+        counts = rebuild_candles(options['start'], options['end'], log=self.stdout.write)
+        self.stdout.write(f'Days: {counts["days"]}, candles: {counts["candles"]}')
@@ -0,0 +1,86 @@
+import time
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+
+from currency import replay
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+
+class Command(BaseCommand):
+
+    """
+        Command for recording source responses and replaying them from a local stand-in server
+    """
+
+    help = 'Record responses of the sources, serve them locally or benchmark a full parsing run against them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures',
+            default=str(Path(settings.BASE_DIR) / 'tests' / 'fixtures' / 'replay'),
+            help='directory with recorded responses',
+        )
+        parser.add_argument('--record', action='store_true', help='record live responses of the sources')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0, help='delay of every response, seconds')
+        parser.add_argument('--jitter', type=float, default=0, help='random extra delay up to, seconds')
+        parser.add_argument('--error-rate', type=float, default=0, help='share of requests answered with 503')
+        parser.add_argument('--payload-scale', type=float, default=1, help='multiply body size with padding')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            default=0,
+            metavar='RUNS',
+            help='make RUNS full parsing runs against the stand-in and report, database writes are rolled back',
+        )
+
+    def handle(self, *args, **options):
+        if options['record']:
+            index = async_to_sync(replay.record)(replay.spec_urls(), options['fixtures'])
+            self.stdout.write(f'Recorded {len(index)} responses to {options["fixtures"]}')
+            return
+
+        server = replay.StandInServer(
+            options['fixtures'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            payload_scale=options['payload_scale'],
+            port=0 if options['benchmark'] else options['port'],
+            seed=options['seed'],
+        )
+
+        with server:
+            if options['benchmark']:
+                with override_settings(PARSER_REPLAY_URL=server.url):
+                    self.report(replay.benchmark(options['benchmark']))
+                return
+
+            self.stdout.write(f'Serving {len(server.index)} responses, set PARSER_REPLAY_URL={server.url}')
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+
+    def report(self, stats):
+        self.stdout.write(
+            f'Runs: {stats["runs"]}, created: {stats["created"]}, '
+            f'{stats["elapsed"]:.2f} s, {stats["rates_per_second"]:.1f} rates/s'
+        )
+        if stats['run_duration']:
+            duration = stats['run_duration']
+            self.stdout.write(f'Run duration: avg {duration["avg"]} s, p90 {duration["p90"]} s')
+
+        self.stdout.write(f'{"source":<24}{"count":>7}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"failed":>8}')
+        for source, latency in sorted(stats['fetch_latency'].items()):
+            self.stdout.write(
+                f'{source:<24}{latency["count"]:>7}'
+                f'{latency["p50"] * 1000:>9.1f}{latency["p90"] * 1000:>9.1f}{latency["p99"] * 1000:>9.1f}'
+                f'{stats["failed"].get(source, 0):>8}'
+            )
@@ -0,0 +1,135 @@
+import math
+from collections import defaultdict, deque
+
+from currency import const
+
+from django.core.cache import cache
+
+# Сколько последних замеров храним для каждого источника
+TIMINGS_WINDOW = 100
+
+_timings = defaultdict(lambda: defaultdict(lambda: deque(maxlen=TIMINGS_WINDOW)))
+_counters = defaultdict(lambda: defaultdict(int))
+
+# Счетчики, общие для всех процессов, хранятся прямо в кэше
+SHARED_COUNTERS = (
+    'runs_started',
+    'runs_skipped',
+    'runs_lease_exceeded',
+)
+
+
+def observe(name, source, value):
+
+    """
+        Save a timing (in seconds) of the metric for the source
+
+        name(str): metric name, e.g. fetch_latency
+        source(str): source code name
+        value(float): measured value in seconds
+    """
+
+    _timings[name][source].append(value)
+
+
+def incr(name, source, value=1):
+
+    """
+        Increase a counter of the metric for the source
+    """
+
+    _counters[name][source] += value
+
+
+def shared_key(name):
+    return f'{const.CACHE_KEY_PARSING_STATS}::{name}'
+
+
+def incr_shared(name, value=1):
+
+    """
+        Increase a counter, that is shared by all workers
+
+        name(str): one of SHARED_COUNTERS
+    """
+
+    key = shared_key(name)
+    if not cache.add(key, value, None):
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            # ключ успел истечь или быть вытесненным между add и incr
+            cache.set(key, value, None)
+
+
+def percentile(values, percent):
+
+    """
+        Nearest-rank percentile of the values
+    """
+
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def snapshot() -> dict:
+
+    """
+        Summary of the metrics collected by the current process
+    """
+
+    timings = {}
+    for name, sources in _timings.items():
+        timings[name] = {}
+        for source, values in sources.items():
+            if not values:
+                continue
+            timings[name][source] = {
+                'count': len(values),
+                'last': round(values[-1], 4),
+                'avg': round(sum(values) / len(values), 4),
+                'p50': round(percentile(values, 50), 4),
+                'p90': round(percentile(values, 90), 4),
+                'p99': round(percentile(values, 99), 4),
+            }
+
+    counters = {
+        name: dict(sources)
+        for name, sources in _counters.items()
+    }
+
+    return {'timings': timings, 'counters': counters}
+
+
+def publish() -> dict:
+
+    """
+        Put the snapshot to the shared cache, so web processes could show it
+    """
+
+    stats = snapshot()
+    cache.set(const.CACHE_KEY_PARSING_STATS, stats, 60 * 60 * 24)
+    return stats
+
+
+def get_published() -> dict:
+
+    """
+        Snapshot of the last parsing run with the shared counters
+    """
+
+    stats = cache.get(const.CACHE_KEY_PARSING_STATS) or {'timings': {}, 'counters': {}}
+
+    shared = cache.get_many([shared_key(name) for name in SHARED_COUNTERS])
+    stats['shared'] = {
+        name: shared.get(shared_key(name), 0)
+        for name in SHARED_COUNTERS
+    }
+
+    return stats
+
+
+def reset():
+    _timings.clear()
+    _counters.clear()
@@ -1,7 +1,10 @@
 import time
 
+from currency import routers
 from currency.models import ResponseLog
 
+from django.conf import settings
+
 
 class ResponseTimeMiddleware:
 
@@ -29,3 +32,33 @@ class ResponseTimeMiddleware:
         )
 
         return response
+
+
+class DatabaseRoutingMiddleware:
+
+    """
+        Middleware for sending the reads of safe requests to the database replicas
+
+        A request, that has written, sets a cookie, and the requests of the
+        client read from the primary for DATABASE_REPLICA_MAX_LAG seconds
+        after it, e.g. the page after the redirect of a form sees the saved
+        rate. See currency.routers.PrimaryReplicaRouter.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    COOKIE_NAME = 'read_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replica = request.method in self.SAFE_METHODS and self.COOKIE_NAME not in request.COOKIES
+
+        with routers.routing(replica_reads=replica):
+            response = self.get_response(request)
+            wrote = routers.has_written()
+
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(self.COOKIE_NAME, '1', max_age=settings.DATABASE_REPLICA_MAX_LAG, samesite='Lax')
+
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.7 on 2026-10-17 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='change_ratio',
+            field=models.FloatField(default=0, editable=False, help_text='share of polls with changed rates, moving average'),  # noqa
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='error_ratio',
+            field=models.FloatField(default=0, editable=False, help_text='share of failed polls, moving average'),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='failures',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='last_changed',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='next_poll',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='poll_interval',
+            field=models.PositiveIntegerField(default=60, editable=False, help_text='in seconds'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.7 on 2026-10-17 14:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_latest_rates(apps, schema_editor):
+    Rate = apps.get_model('currency', 'Rate')
+    LatestRate = apps.get_model('currency', 'LatestRate')
+
+    last_ids = Rate.objects \
+        .values('source_id', 'currency_name') \
+        .annotate(last_id=models.Max('id')) \
+        .values_list('last_id', flat=True)
+
+    LatestRate.objects.bulk_create([
+        LatestRate(
+            source_id=rate.source_id,
+            currency_name=rate.currency_name,
+            bid=rate.bid,
+            ask=rate.ask,
+            updated=rate.created,
+        )
+        for rate in Rate.objects.filter(id__in=list(last_ids))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0002_source_polling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_name', models.CharField(choices=[('USD', 'Dollar'), ('EUR', 'Euro')], max_length=3)),
+                ('ask', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('bid', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('updated', models.DateTimeField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_rates', to='currency.source')),  # noqa
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='latestrate',
+            constraint=models.UniqueConstraint(fields=('source', 'currency_name'), name='latest_rate_source_currency'),
+        ),
+        migrations.RunPython(fill_latest_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.7 on 2026-10-17 14:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0003_latest_rate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rate',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
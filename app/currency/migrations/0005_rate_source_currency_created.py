@@ -0,0 +1,17 @@
+# Generated by Django 3.2.7 on 2026-10-17 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0004_rate_created_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rate',
+            index=models.Index(fields=['source', 'currency_name', 'created'], name='rate_source_currency_created'),
+        ),
+    ]
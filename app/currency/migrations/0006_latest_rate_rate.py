@@ -0,0 +1,37 @@
+# Generated by Django 3.2.7 on 2026-10-17 14:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rebuild_latest_rates(apps, schema_editor):
+    Rate = apps.get_model('currency', 'Rate')
+    LatestRate = apps.get_model('currency', 'LatestRate')
+
+    pairs = Rate.objects.values_list('source_id', 'currency_name').distinct()
+    for source_id, currency_name in pairs:
+        rate = Rate.objects \
+            .filter(source_id=source_id, currency_name=currency_name) \
+            .order_by('-created', '-id') \
+            .first()
+        LatestRate.objects.update_or_create(
+            source_id=source_id,
+            currency_name=currency_name,
+            defaults={'rate': rate, 'bid': rate.bid, 'ask': rate.ask, 'updated': rate.created},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0005_rate_source_currency_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='latestrate',
+            name='rate',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='currency.rate'),  # noqa
+        ),
+        migrations.RunPython(rebuild_latest_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.7 on 2026-10-17 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0006_latest_rate_rate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rate',
+            index=models.Index(fields=['-created'], name='rate_created_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='responselog',
+            index=models.Index(fields=['-created'], name='response_log_created_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='responselog',
+            index=models.Index(fields=['path', '-created'], name='response_log_path_created'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.7 on 2026-10-17 15:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0007_rate_response_log_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='latestrate',
+            name='rate',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='currency.rate'),  # noqa
+        ),
+        migrations.CreateModel(
+            name='RateCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_name', models.CharField(choices=[('USD', 'Dollar'), ('EUR', 'Euro')], max_length=3)),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('bid_open', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('bid_high', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('bid_low', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('bid_close', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('ask_open', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('ask_high', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('ask_low', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('ask_close', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('open_time', models.DateTimeField()),
+                ('close_time', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='currency.source')),  # noqa
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ratecandle',
+            constraint=models.UniqueConstraint(fields=('source', 'currency_name', 'period', 'start'), name='rate_candle_bucket'),  # noqa
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.7 on 2026-10-17 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0008_rate_candle'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rate',
+            index=models.Index(fields=['-created', '-id'], name='rate_created_id_desc'),
+        ),
+        migrations.RemoveIndex(
+            model_name='rate',
+            name='rate_created_desc',
+        ),
+    ]
@@ -13,11 +13,20 @@ TYPE_VKURSE = 'vkurse_site'
 TYPE_MINFIN = 'minfin_site'
 
 
+PERIOD_HOUR = 'hour'
+PERIOD_DAY = 'day'
+
+
 RATE_TYPES = (
     (TYPE_USD, 'Dollar'),
     (TYPE_EUR, 'Euro'),
 )
 
+CANDLE_PERIODS = (
+    (PERIOD_HOUR, 'Hour'),
+    (PERIOD_DAY, 'Day'),
+)
+
 RESPONCE_LOG_TYPES = (
     (TYPE_GET, 'Get'),
     (TYPE_POST, 'Post'),
@@ -1,12 +1,83 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from currency import latest_cache
 from currency import model_choices as choices
 
-from django.db import models
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+
+# (source_id, currency_name) -> моменты удаленных курсов пары, пока идет удаление, см. deleting_rates
+_deleted_rates = ContextVar('deleted_rates', default=None)
 
 
 def upload_logo(instance, filename):
     return f'logos/{instance.id}/{filename}'
 
 
+@contextmanager
+def deleting_rates():
+
+    """
+        Recompute LatestRate and candles once per pair and day for the rates, deleted in the block
+
+        Django deletes the rates one by one for their post_delete signal, the
+        receiver only collects the pairs and the moments (see
+        defer_rate_refresh), so a delete of a day of rates or a cascade delete
+        of a source costs a few queries per pair and day instead of per rate.
+        Pairs of the deleted sources are skipped: their LatestRate and candles
+        are deleted by the cascade.
+    """
+
+    if _deleted_rates.get() is not None:
+        # вложенное удаление пересчитает внешнее
+        yield
+        return
+
+    deleted = {}
+    token = _deleted_rates.set(deleted)
+    try:
+        with transaction.atomic():
+            yield
+            existing = set(
+                Source.objects.filter(id__in={source_id for source_id, _ in deleted}).values_list('id', flat=True)
+            )
+            for (source_id, currency_name), moments in deleted.items():
+                if source_id not in existing:
+                    continue
+                LatestRate.objects.refresh(source_id, currency_name)
+                RateCandle.objects.rebuild(source_id, currency_name, moments)
+    finally:
+        _deleted_rates.reset(token)
+
+
+def defer_rate_refresh(rate) -> bool:
+
+    """
+        Put the deleted rate to the pairs of deleting_rates, False if there is no such block
+    """
+
+    deleted = _deleted_rates.get()
+    if deleted is None:
+        return False
+    deleted.setdefault((rate.source_id, rate.currency_name), set()).add(rate.created)
+    return True
+
+
+class DeletingRatesQuerySet(models.QuerySet):
+
+    """
+        QuerySet of the models, whose delete deletes rates, see deleting_rates
+    """
+
+    def delete(self):
+        with deleting_rates():
+            return super().delete()
+
+
 class Source(models.Model):
 
     """
@@ -23,6 +94,32 @@ class Source(models.Model):
         default=None,
     )
 
+    # Состояние адаптивного опроса источника, см. currency.scheduler
+    poll_interval = models.PositiveIntegerField(
+        default=60,
+        editable=False,
+        help_text='in seconds',
+    )
+    next_poll = models.DateTimeField(null=True, blank=True, editable=False)
+    last_changed = models.DateTimeField(null=True, blank=True, editable=False)
+    failures = models.PositiveSmallIntegerField(default=0, editable=False)
+    change_ratio = models.FloatField(
+        default=0,
+        editable=False,
+        help_text='share of polls with changed rates, moving average',
+    )
+    error_ratio = models.FloatField(
+        default=0,
+        editable=False,
+        help_text='share of failed polls, moving average',
+    )
+
+    objects = DeletingRatesQuerySet.as_manager()
+
+    def delete(self, *args, **kwargs):
+        with deleting_rates():
+            return super().delete(*args, **kwargs)
+
 
 class Rate(models.Model):
 
@@ -32,7 +129,8 @@ class Rate(models.Model):
 
     ask = models.DecimalField(max_digits=4, decimal_places=2)
     bid = models.DecimalField(max_digits=4, decimal_places=2)
-    created = models.DateTimeField(auto_now_add=True)
+    # не auto_now_add, чтобы архивные курсы сохранялись со своей датой
+    created = models.DateTimeField(default=timezone.now, editable=False)
     currency_name = models.CharField(
         max_length=3,
         choices=choices.RATE_TYPES,
@@ -50,6 +148,362 @@ class Rate(models.Model):
     # source = models.CharField(max_length=16, choices=choices.SOURCE_TYPES)
     # currency_name = models.CharField(max_length=3, choices=choices.RATE_TYPES)
 
+    class Meta:
+        indexes = [
+            # последний курс пары источник-валюта находится одним поиском по индексу
+            models.Index(fields=('source', 'currency_name', 'created'), name='rate_source_currency_created'),
+            # списки курсов отдаются от новых к старым; id - порядок курсов одного момента для курсорной пагинации
+            models.Index(fields=('-created', '-id'), name='rate_created_id_desc'),
+        ]
+
+    objects = DeletingRatesQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+
+        """
+            Save the rate and update LatestRate and candles of its pair in the same transaction
+
+            Covers forms, API and admin import, bulk inserts refresh LatestRate themselves
+        """
+
+        with transaction.atomic():
+            keys = {(self.source_id, self.currency_name)}
+            previous = None
+            if self.pk is not None:
+                # при изменении пары пересчитываем и прежнюю
+                previous = Rate.objects.filter(pk=self.pk).values_list('source_id', 'currency_name', 'created').first()
+                if previous is not None:
+                    keys.add(previous[:2])
+
+            super().save(*args, **kwargs)
+
+            for source_id, currency_name in keys:
+                LatestRate.objects.refresh(source_id, currency_name)
+
+            if previous is None:
+                RateCandle.objects.add_rates([(self.source_id, self.currency_name, self.bid, self.ask, self.created)])
+            else:
+                RateCandle.objects.rebuild(*previous[:2], [previous[2]])
+                RateCandle.objects.rebuild(self.source_id, self.currency_name, [self.created])
+
+    def delete(self, *args, **kwargs):
+        with deleting_rates():
+            return super().delete(*args, **kwargs)
+
+
+class LatestRateManager(models.Manager):
+
+    def refresh(self, source_id, currency_name):
+
+        """
+            Recompute LatestRate of the pair from the rates history
+
+            Should be called inside the transaction, that has changed the rates of the pair.
+            Returns the latest rate or None, if the pair has no rates anymore
+        """
+
+        # блокируем строку, чтобы параллельные записи одной пары шли по очереди
+        list(self.select_for_update().filter(source_id=source_id, currency_name=currency_name))
+
+        rate = Rate.objects \
+            .filter(source_id=source_id, currency_name=currency_name) \
+            .select_related('source') \
+            .order_by('-created', '-id') \
+            .first()
+
+        if rate is None:
+            self.filter(source_id=source_id, currency_name=currency_name).delete()
+            # кэш обновляем, только если транзакция зафиксирована
+            transaction.on_commit(lambda: latest_cache.drop(source_id, currency_name))
+            return None
+
+        transaction.on_commit(lambda: latest_cache.store([rate]))
+
+        self.update_or_create(
+            source_id=source_id,
+            currency_name=currency_name,
+            defaults={'rate': rate, 'bid': rate.bid, 'ask': rate.ask, 'updated': timezone.now()},
+        )
+        return rate
+
+
+class LatestRate(models.Model):
+
+    """
+        Model class for the last rate of every source and currency
+
+        Is kept up to date in the transaction, that writes the rates: by
+        Rate.save, on delete (see currency.receivers) and by the parsers
+        (see services.insert_changed_rates), where the unique pair makes
+        the "insert only if changed" check atomic.
+        rebuild_latest_rates command restores it from the history.
+    """
+
+    source = models.ForeignKey(
+        Source,
+        related_name='latest_rates',
+        on_delete=models.CASCADE,
+    )
+    # пустой только внутри транзакции записи парсеров, до вставки самого курса;
+    # без ограничения в базе: на секционированную таблицу курсов (id, created) внешний ключ по id не ссылается
+    rate = models.ForeignKey(
+        Rate,
+        related_name='+',
+        on_delete=models.CASCADE,
+        null=True,
+        db_constraint=False,
+    )
+    currency_name = models.CharField(max_length=3, choices=choices.RATE_TYPES)
+    ask = models.DecimalField(max_digits=4, decimal_places=2)
+    bid = models.DecimalField(max_digits=4, decimal_places=2)
+    updated = models.DateTimeField()
+
+    objects = LatestRateManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('source', 'currency_name'),
+                name='latest_rate_source_currency',
+            ),
+        ]
+
+
+class RateCandleManager(models.Manager):
+
+    def aggregate(self, rows) -> dict:
+
+        """
+            Hour and day candles of the rates: {(source_id, currency_name, period, start): RateCandle}
+
+            rows(iterable): (source_id, currency_name, bid, ask, created)
+        """
+
+        to_decimal = self.model._meta.get_field('bid_open').to_python
+        candles = {}
+        for source_id, currency_name, bid, ask, created in rows:
+            bid, ask = to_decimal(bid), to_decimal(ask)
+            for period in self.model.PERIODS:
+                key = (source_id, currency_name, period, self.model.bucket_start(created, period))
+                candle = candles.get(key)
+                if candle is None:
+                    candles[key] = self.model.open(source_id, currency_name, period, bid, ask, created)
+                else:
+                    candle.add(bid, ask, created)
+        return candles
+
+    def add_rates(self, rows):
+
+        """
+            Count new rates in their hour and day candles
+
+            One INSERT ... ON CONFLICT merges the candles of the rates into the
+            saved ones, so concurrent writers of a bucket do not lose counts.
+            Should be called inside the transaction, that writes the rates.
+
+            rows(iterable): (source_id, currency_name, bid, ask, created)
+        """
+
+        candles = self.aggregate(rows)
+        if not candles:
+            return
+
+        ops = connection.ops
+        table = ops.quote_name(self.model._meta.db_table)
+        greatest, least = ('GREATEST', 'LEAST') if connection.vendor == 'postgresql' else ('MAX', 'MIN')
+
+        columns = ('source_id', 'currency_name', 'period', 'start', *self.model.FIELDS)
+        updates = []
+        for side in ('bid', 'ask'):
+            updates.extend((
+                f'{side}_open = CASE WHEN excluded.open_time < {table}.open_time '
+                f'THEN excluded.{side}_open ELSE {table}.{side}_open END',
+                f'{side}_high = {greatest}({table}.{side}_high, excluded.{side}_high)',
+                f'{side}_low = {least}({table}.{side}_low, excluded.{side}_low)',
+                f'{side}_close = CASE WHEN excluded.close_time >= {table}.close_time '
+                f'THEN excluded.{side}_close ELSE {table}.{side}_close END',
+            ))
+        updates.extend((
+            f'open_time = {least}({table}.open_time, excluded.open_time)',
+            f'close_time = {greatest}({table}.close_time, excluded.close_time)',
+            f'count = {table}.count + excluded.count',
+        ))
+        row = f'({", ".join(["%s"] * len(columns))})'
+
+        candles = list(candles.values())
+        with connection.cursor() as cursor:
+            # не больше 500 свечей в команде, в пределах лимита параметров SQLite
+            for chunk_start in range(0, len(candles), 500):
+                chunk = candles[chunk_start:chunk_start + 500]
+                params = []
+                for candle in chunk:
+                    for column in columns:
+                        value = getattr(candle, column)
+                        if column in ('start', 'open_time', 'close_time'):
+                            value = ops.adapt_datetimefield_value(value)
+                        elif column.startswith(('bid_', 'ask_')):
+                            value = ops.adapt_decimalfield_value(value, 4, 2)
+                        params.append(value)
+
+                cursor.execute(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row] * len(chunk))} '
+                    f'ON CONFLICT (source_id, currency_name, period, start) DO UPDATE SET {", ".join(updates)}',
+                    params,
+                )
+
+    def rebuild_day(self, day, **pair) -> int:
+
+        """
+            Recompute the candles of the day from the rates, returns the number of candles
+
+            pair: source_id and currency_name to rebuild only one pair
+        """
+
+        end = day + timedelta(days=1)
+        rows = Rate.objects \
+            .filter(created__gte=day, created__lt=end, **pair) \
+            .order_by('created', 'id') \
+            .values_list('source_id', 'currency_name', 'bid', 'ask', 'created')
+        candles = self.aggregate(rows)
+
+        self.filter(start__gte=day, start__lt=end, **pair).delete()
+        self.bulk_create(candles.values(), batch_size=500)
+        return len(candles)
+
+    def rebuild(self, source_id, currency_name, moments):
+
+        """
+            Recompute the candles of the pair on the days of the moments
+
+            A changed or deleted rate can not be taken back from its candles,
+            so they are counted again from the rates of the day. Days before
+            the retention cutoff are skipped, their rates are dropped already.
+            Should be called inside the transaction, that changes the rates.
+        """
+
+        cutoff = None
+        if settings.RATE_RETENTION_DAYS:
+            cutoff = timezone.now() - timedelta(days=settings.RATE_RETENTION_DAYS)
+
+        for day in {self.model.bucket_start(moment, choices.PERIOD_DAY) for moment in moments}:
+            if cutoff is not None and day + timedelta(days=1) <= cutoff:
+                continue
+            self.rebuild_day(day, source_id=source_id, currency_name=currency_name)
+
+
+class RateCandle(models.Model):
+
+    """
+        Model class for open, high, low and close of bid and ask of a source and currency in an hour or a day
+
+        Is kept up to date in the transaction, that writes the rates (see
+        RateCandleManager.add_rates), and keeps the history of the rates,
+        that are dropped by the retention (see currency.retention).
+        open_time and close_time are the times of the first and the last rate
+        in the bucket, rates between them are already counted.
+        rebuild_rate_candles command restores it from the rates.
+    """
+
+    PERIODS = (choices.PERIOD_HOUR, choices.PERIOD_DAY)
+    FIELDS = (
+        'bid_open',
+        'bid_high',
+        'bid_low',
+        'bid_close',
+        'ask_open',
+        'ask_high',
+        'ask_low',
+        'ask_close',
+        'open_time',
+        'close_time',
+        'count',
+    )
+
+    source = models.ForeignKey(
+        Source,
+        related_name='candles',
+        on_delete=models.CASCADE,
+    )
+    currency_name = models.CharField(max_length=3, choices=choices.RATE_TYPES)
+    period = models.CharField(max_length=4, choices=choices.CANDLE_PERIODS)
+    start = models.DateTimeField()
+
+    bid_open = models.DecimalField(max_digits=4, decimal_places=2)
+    bid_high = models.DecimalField(max_digits=4, decimal_places=2)
+    bid_low = models.DecimalField(max_digits=4, decimal_places=2)
+    bid_close = models.DecimalField(max_digits=4, decimal_places=2)
+    ask_open = models.DecimalField(max_digits=4, decimal_places=2)
+    ask_high = models.DecimalField(max_digits=4, decimal_places=2)
+    ask_low = models.DecimalField(max_digits=4, decimal_places=2)
+    ask_close = models.DecimalField(max_digits=4, decimal_places=2)
+
+    open_time = models.DateTimeField()
+    close_time = models.DateTimeField()
+    count = models.PositiveIntegerField()
+
+    objects = RateCandleManager()
+
+    class Meta:
+        constraints = [
+            # свечи пары за период читаются одним поиском по диапазону start
+            models.UniqueConstraint(
+                fields=('source', 'currency_name', 'period', 'start'),
+                name='rate_candle_bucket',
+            ),
+        ]
+
+    @staticmethod
+    def bucket_start(created, period):
+
+        """
+            Start of the hour or the day of the rate, in UTC like the stored times
+        """
+
+        if period == choices.PERIOD_HOUR:
+            return created.replace(minute=0, second=0, microsecond=0)
+        return created.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def open(cls, source_id, currency_name, period, bid, ask, created):
+        return cls(
+            source_id=source_id,
+            currency_name=currency_name,
+            period=period,
+            start=cls.bucket_start(created, period),
+            bid_open=bid,
+            bid_high=bid,
+            bid_low=bid,
+            bid_close=bid,
+            ask_open=ask,
+            ask_high=ask,
+            ask_low=ask,
+            ask_close=ask,
+            open_time=created,
+            close_time=created,
+            count=1,
+        )
+
+    @property
+    def key(self) -> tuple:
+        return self.source_id, self.currency_name, self.period, self.start
+
+    def add(self, bid, ask, created):
+
+        """
+            Count the rate of the bucket, the rates may come in any order, open and close are taken by time
+        """
+
+        if created < self.open_time:
+            self.bid_open, self.ask_open, self.open_time = bid, ask, created
+        if created >= self.close_time:
+            self.bid_close, self.ask_close, self.close_time = bid, ask, created
+
+        self.bid_high = max(self.bid_high, bid)
+        self.bid_low = min(self.bid_low, bid)
+        self.ask_high = max(self.ask_high, ask)
+        self.ask_low = min(self.ask_low, ask)
+        self.count += 1
+
 
 class ContactUs(models.Model):
 
@@ -77,4 +531,11 @@ class ResponseLog(models.Model):
     )
     request_method = models.CharField(max_length=8, choices=choices.RESPONCE_LOG_TYPES)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=('-created',), name='response_log_created_desc'),
+            # журнал одного пути, от новых записей к старым
+            models.Index(fields=('path', '-created'), name='response_log_path_created'),
+        ]
+
 # оставшиеся симфолы заменяются пробелами
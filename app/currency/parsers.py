@@ -1,307 +1,645 @@
 import asyncio
+import json
+import time
+from collections import namedtuple
 from decimal import Decimal
+from urllib.parse import urlsplit
 
-import requests
-
-from bs4 import BeautifulSoup
-
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
 
+from currency import breaker
 from currency import const
+from currency import db_connections
+from currency import fetch_cache
+from currency import html_extract
+from currency import metrics
 from currency import model_choices as choices
-from currency.services import get_latest_rates
+from currency import rate_state
+from currency import scheduler
+from currency.services import insert_changed_rates
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
 import aiohttp
 
+# Нормализованный курс, который парсеры кладут в очередь для записи
+RateRecord = namedtuple('RateRecord', ('code_name', 'currency_name', 'bid', 'ask'))
+
+PAYLOAD_JSON = 'json'
+PAYLOAD_HTML = 'html'
+
+
+class ParserSpec:
+
+    """
+        Declaration of a rates source for the parsing engine
+
+        code_name(str): code name of the source
+        name(str): name of the source, is used when the source is created
+        urls(dict): urls of the source, key of the url is passed to the extractor
+        extractor(callable): extractor(payload, key, currencies), yields (currency, bid, ask)
+            as they are in the payload
+        currency_map(dict): currencies of the source to model_choices types
+        payload_format(str): json or html
+        concurrency(int): how many urls of the source could be fetched at once
+        timeout(float): total timeout of one request in seconds, by default the session timeouts
+        deadline(float): time for the whole source in a run, by default PARSER_SOURCE_DEADLINE
+        hedge_after(float): send a hedged GET if a request has not answered in these seconds,
+            by default PARSER_HEDGE_AFTER
+    """
+
+    def __init__(self, code_name, name, urls, extractor, currency_map,
+                 payload_format=PAYLOAD_JSON, concurrency=1, timeout=None,
+                 deadline=None, hedge_after=None):
+        self.code_name = code_name
+        self.name = name
+        self.urls = urls
+        self.extractor = extractor
+        self.currency_map = currency_map
+        self.payload_format = payload_format
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+
+    def get_deadline(self):
+        return self.deadline or settings.PARSER_SOURCE_DEADLINE
+
+    def get_hedge_after(self):
+        return self.hedge_after or settings.PARSER_HEDGE_AFTER
+
+    def __repr__(self):
+        return f'<ParserSpec {self.code_name}>'
+
+
+# Реестр парсеров: {code_name: ParserSpec}
+PARSERS = {}
+
+
+def register(spec):
+    PARSERS[spec.code_name] = spec
+    return spec
+
+
+# Метка метрик, которые относятся ко всему запуску, а не к источнику
+RUN_LABEL = 'run'
+
 
 def round_currency(num):
     return Decimal(num).quantize(Decimal('.01'))
 
 
-def make_tasks() -> list:
+def make_session() -> aiohttp.ClientSession:
 
-    tasks = []
+    """
+        Shared HTTP session for all parsers of one parsing run
 
-    parsers = [parse_privatbank, parse_monobank,
-               parse_vkurse, parse_minfin, parse_pumb]
+        Connections are kept alive and reused between sources and pages,
+        resolved hosts are cached, so every poll does not pay for new
+        TCP/TLS handshakes and DNS lookups.
+    """
 
-    for parser in parsers:
-        task = asyncio.ensure_future(parser)
-        tasks.append(task)
+    connector = aiohttp.TCPConnector(
+        limit=settings.PARSER_CONNECTIONS_LIMIT,
+        limit_per_host=settings.PARSER_CONNECTIONS_LIMIT_PER_HOST,
+        ttl_dns_cache=settings.PARSER_DNS_CACHE_TTL,
+        keepalive_timeout=settings.PARSER_KEEPALIVE_TIMEOUT,
+    )
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=settings.PARSER_CONNECT_TIMEOUT,
+        sock_read=settings.PARSER_READ_TIMEOUT,
+    )
 
-    return tasks
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        raise_for_status=True,
+    )
 
 
-async def parse_privatbank() -> None:
+def source_url(url) -> str:
 
     """
-        celery task for parsing rates from privatbank.ua
+        Url to request: the url of the source itself or its copy at the replay
+        stand-in server, if PARSER_REPLAY_URL is set (see currency.replay)
     """
 
-    from currency.models import Rate, Source
+    if not settings.PARSER_REPLAY_URL:
+        return url
 
-    url = 'https://api.privatbank.ua/p24api/pubinfo?json&exchange&coursid=5'
+    parts = urlsplit(url)
+    query = f'?{parts.query}' if parts.query else ''
+    return f'{settings.PARSER_REPLAY_URL.rstrip("/")}/{parts.netloc}{parts.path}{query}'
 
-    source = Source.objects.get_or_create(
-        code_name=const.CODE_NAME_PRIVATBANK,
-        defaults={'name': 'PrivatBank'},
-    )[0]
 
-    async with aiohttp.ClientSession(raise_for_status=True) as session:
-        async with session.get(url) as response:
-            rates = response.json()
+async def request(session, url, options):
 
-    available_currency_types = {'USD': choices.TYPE_USD,
-                                'EUR': choices.TYPE_EUR, }
+    """
+        One GET of the url: returns status, headers and body of the response
+    """
 
-    for rate in rates:
+    async with session.get(url, **options) as response:
+        if response.status == 304:
+            return response.status, response.headers, None, None
+        return response.status, response.headers, await response.read(), response.charset
 
-        currency_name = rate['ccy']
 
-        if currency_name in available_currency_types:
+async def hedged_request(session, source_code_name, url, options, hedge_after):
 
-            bid = round_currency(rate['buy'])
-            ask = round_currency(rate['sale'])
+    """
+        GET, that is sent once more if the first one has not answered in hedge_after seconds
+
+        The first successful answer wins, the other request is cancelled, as
+        well as both requests, if the hedged request itself is cancelled.
+        Is used only for idempotent GETs.
+    """
 
-            ct = available_currency_types[currency_name]
+    first = asyncio.ensure_future(request(session, url, options))
+    pending = {first}
 
-            last_rate = Rate.objects.filter(
-                currency_name=ct,
-                source=source,
-            ).order_by('created').last()
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
 
-            if (
-                last_rate is None or
-                last_rate.bid != bid or
-                last_rate.ask != ask
-            ):
+        metrics.incr('hedged_requests', source_code_name)
+        second = asyncio.ensure_future(request(session, url, options))
+        pending.add(second)
 
-                Rate.objects.create(
-                    ask=ask,
-                    bid=bid,
-                    currency_name=ct,
-                    source=source,
-                )
-                cache.delete(const.CACHE_KEY_LATEST_RATES)
-                get_latest_rates()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        metrics.incr('hedge_wins', source_code_name)
+                    return task.result()
+        # both requests have failed
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
 
 
-async def parse_monobank() -> None:
+async def fetch_payload(session, source_code_name, url, as_json=True, timeout=None, hedge_after=None) -> tuple:
 
     """
-        Celery task for parsing rates from monobank.ua
+        Get payload of the url and save the fetch latency of the source
+
+        Sends If-None-Match/If-Modified-Since if the source gave validators
+        before, and compares the body with the last processed one.
+        The validators of the response are not remembered here: the caller
+        remembers them (see fetch_cache.remember), once the payload has been
+        processed, so a payload, that could not be processed, is not skipped
+        by the next polls.
+
+        session(ClientSession): shared session from make_session
+        source_code_name(str): code name of the source, used as metrics label
+        url(str): url for request
+        as_json(bool): decode body as json, otherwise return text
+        timeout(float): total timeout of the request, by default the timeouts of the session
+        hedge_after(float): send a hedged request after these seconds, by default no hedging
+
+        Returns (payload, validators): payload is None if it has not changed
+        since the last poll, validators are (headers, body) of a new payload or None
     """
 
-    from currency.models import Rate, Source
+    options = {'headers': fetch_cache.conditional_headers(url)}
+    if timeout is not None:
+        options['timeout'] = aiohttp.ClientTimeout(total=timeout)
 
-    source = Source.objects.get_or_create(
-        code_name=const.CODE_NAME_MONOBANK,
-        defaults={'name': 'MonoBank'},
-    )[0]
+    start = time.monotonic()
 
-    url = 'https://api.monobank.ua/bank/currency'
+    if hedge_after is None:
+        status, headers, body, charset = await request(session, source_url(url), options)
+    else:
+        status, headers, body, charset = await hedged_request(
+            session, source_code_name, source_url(url), options, hedge_after,
+        )
 
-    async with aiohttp.ClientSession(raise_for_status=True) as session:
-        async with session.get(url) as response:
-            rates = response.json()
+    metrics.observe('fetch_latency', source_code_name, time.monotonic() - start)
 
-    available_currency_codes = {'840': choices.TYPE_USD,
-                                '978': choices.TYPE_EUR,
-                                '980': choices.TYPE_HRN}
+    payload = validators = None
+    if status == 304:
+        metrics.incr('polls_not_modified', source_code_name)
+    elif not fetch_cache.is_unchanged(url, body):
+        if as_json:
+            # vkurse отдает json с content-type text/html, поэтому разбираем тело сами
+            payload = json.loads(body)
+        else:
+            payload = body.decode(charset or 'utf-8', errors='replace')
+        validators = (headers, body)
 
-    for rate in rates:
-        first_currency_code = str(rate['currencyCodeA'])
-        second_currency_code = str(rate['currencyCodeB'])
-        grivna_code = '980'
+    metrics.incr('polls_skipped' if payload is None else 'polls_processed', source_code_name)
 
-        if first_currency_code in available_currency_codes and second_currency_code == grivna_code:
+    return payload, validators
 
-            bid = round_currency(rate['rateBuy'])
-            ask = round_currency(rate['rateSell'])
 
-            currency_name = available_currency_codes.get(first_currency_code)
+async def fetch(session, source_code_name, url, as_json=True, timeout=None, hedge_after=None):
 
-            last_rate = Rate.objects.filter(
-                currency_name=currency_name,
-                source=source,
-            ).order_by('created').last()
+    """
+        Payload of the url, None if it has not changed since the last poll
 
-            if (
-                last_rate is None or
-                last_rate.bid != bid or
-                last_rate.ask != ask
-            ):
+        The same as fetch_payload, but the decoded payload is remembered at once.
+    """
 
-                Rate.objects.create(
-                    ask=ask,
-                    bid=bid,
-                    currency_name=currency_name,
-                    source=source,
-                )
+    payload, validators = await fetch_payload(session, source_code_name, url, as_json, timeout, hedge_after)
+    if validators is not None:
+        fetch_cache.remember(url, *validators)
+    return payload
 
 
-async def parse_vkurse() -> None:
+def normalize(spec, key, payload) -> list:
 
     """
-        Celery task for parsing rates from vkurse.ua
+        Turn the payload of the source into rate records
+
+        Currencies are mapped with the currency map of the source, others are skipped
     """
 
-    from currency.models import Rate, Source
+    records = []
+    for raw_currency, bid, ask in spec.extractor(payload, key, spec.currency_map):
+        currency_name = spec.currency_map.get(raw_currency)
+        if currency_name is None:
+            continue
+        records.append(RateRecord(spec.code_name, currency_name, round_currency(bid), round_currency(ask)))
+
+    return records
+
 
-    source = Source.objects.get_or_create(
-        code_name=const.CODE_NAME_VKURSE,
-        defaults={'name': 'Vkurse.ua'},
-    )[0]
+async def produce(queue, spec, key, payload) -> int:
 
-    url = 'http://vkurse.dp.ua/course.json'
+    """
+        Normalize stage: put rate records of the payload to the writer queue
+
+        queue(asyncio.Queue): queue of the writer stage
+        spec(ParserSpec): source of the payload
+        key: key of the url in spec.urls
+        payload: payload from fetch, None if it has not changed
+
+        Returns count of produced records
+    """
 
-    async with aiohttp.ClientSession(raise_for_status=True) as session:
-        async with session.get(url) as response:
-            json_data = response.json()
+    if payload is None:
+        return 0
 
-    available_currency_names = {'Dollar': choices.TYPE_USD,
-                                'Euro': choices.TYPE_EUR, }
+    start = time.monotonic()
+    records = normalize(spec, key, payload)
+    metrics.observe('normalize_time', spec.code_name, time.monotonic() - start)
 
-    currency_names = json_data.keys()
+    for record in records:
+        await queue.put(record)
 
-    # currency_names is the dictionary, where the keys is a currency names
+    return len(records)
 
-    for name in currency_names:
 
-        if name in available_currency_names:
+async def parse_source(spec, session, queue) -> int:
 
-            currency_name = available_currency_names.get(name)
+    """
+        Fetch all urls of the source and put their rates to the writer queue
 
-            rate = json_data.get(name)
-            bid = round_currency(rate['buy'])
-            ask = round_currency(rate['sale'])
+        Not more than spec.concurrency urls of the source are fetched at once.
+        Returns count of produced records
+    """
 
-            last_rate = Rate.objects.filter(
-                currency_name=currency_name,
-                source=source,
-            ).order_by('created').last()
+    semaphore = asyncio.Semaphore(spec.concurrency)
+
+    async def parse_url(key, url):
+        async with semaphore:
+            payload, validators = await fetch_payload(
+                session,
+                spec.code_name,
+                url,
+                as_json=spec.payload_format == PAYLOAD_JSON,
+                timeout=spec.timeout,
+                hedge_after=spec.get_hedge_after(),
+            )
+        count = await produce(queue, spec, key, payload)
+        # только нормализованный и переданный писателю ответ пропускается в следующих опросах
+        if validators is not None:
+            fetch_cache.remember(url, *validators)
+        return count
 
-            if (
-                last_rate is None or
-                last_rate.bid != bid or
-                last_rate.ask != ask
-            ):
+    counts = await asyncio.gather(*(
+        parse_url(key, url)
+        for key, url in spec.urls.items()
+    ))
 
-                Rate.objects.create(
-                    ask=ask,
-                    bid=bid,
-                    currency_name=currency_name,
-                    source=source,
-                )
+    return sum(counts)
 
 
-async def parse_minfin() -> None:
+def save_rates(records) -> list:
 
     """
-        Celery task for parsing rates from minfin.ua
+        Write stage: persist changed rates of the run in one transaction
+
+        records(list): list of RateRecord, that differ from the last seen rates
+
+        The final check is done by the database (see insert_changed_rates),
+        so a rate, that another worker has already written, is not duplicated.
+        Returns list of saved records
     """
 
-    from currency.models import Rate, Source
+    from currency.models import Source
+
+    if not records:
+        return []
 
-    source = Source.objects.get_or_create(
-        code_name=const.CODE_NAME_MINFIN,
-        defaults={'name': 'MinFin'},
-    )[0]
+    code_names = {record.code_name for record in records}
 
-    urls = {choices.TYPE_USD: 'https://minfin.com.ua/currency/banks/usd/',
-            choices.TYPE_EUR: 'https://minfin.com.ua/currency/banks/eur/', }
+    # пока шла выборка источников, база могла закрыть простаивавшее соединение задачи
+    db_connections.check_connections()
 
-    for currency_name in urls:
+    with transaction.atomic():
+        sources = {
+            source.code_name: source
+            for source in Source.objects.filter(code_name__in=code_names)
+        }
+        for code_name in code_names - sources.keys():
+            sources[code_name] = Source.objects.create(
+                code_name=code_name,
+                name=PARSERS[code_name].name if code_name in PARSERS else code_name,
+            )
 
-        async with aiohttp.ClientSession(raise_for_status=True) as session:
-            async with session.get(urls.get(currency_name)) as response:
-                soup = BeautifulSoup(response.text, 'html.parser')
+        inserted = set(insert_changed_rates([
+            (sources[record.code_name].id, record.currency_name, record.bid, record.ask)
+            for record in records
+        ]))
 
-        for span in soup("span"):
-            span.decompose()
+    saved = [
+        record
+        for record in records
+        if (sources[record.code_name].id, record.currency_name) in inserted
+    ]
 
-        # get the list where the first position is buy, second is sell
-        result = soup.find('td', {'data-title': "Средний курс"}).text.split()
-        bid = round_currency(result[0])
-        ask = round_currency(result[1])
+    for record in records:
+        rate_state.remember(*record)
 
-        last_rate = Rate.objects.filter(
-            currency_name=currency_name,
-            source=source,
-        ).order_by('created').last()
+    return saved
 
-        if (
-            last_rate is None or
-            last_rate.bid != bid or
-            last_rate.ask != ask
-        ):
 
-            Rate.objects.create(
-                ask=ask,
-                bid=bid,
-                currency_name=currency_name,
-                source=source,
-            )
+async def write_rates(queue) -> list:
+
+    """
+        Writer stage: drain the queue until None and save changed rates
+
+        Change detection is done with last rates, that are reloaded once per run
+        (see rate_state), the write transaction is opened only if something changed.
+        Returns list of saved records
+    """
+
+    # другой воркер мог записать курсы после нашего прошлого запуска
+    await sync_to_async(rate_state.load)(force=True)
+
+    # если источник отдал пару дважды за запуск, пишем последнее значение
+    changed = {}
+
+    while True:
+        record = await queue.get()
+        if record is None:
+            break
+
+        key = (record.code_name, record.currency_name)
+        if rate_state.is_changed(*record):
+            changed[key] = record
+        else:
+            changed.pop(key, None)
+
+    records = list(changed.values())
+
+    start = time.monotonic()
+    saved = await sync_to_async(save_rates)(records)
+    metrics.observe('stage_write', RUN_LABEL, time.monotonic() - start)
+
+    return saved
+
+
+async def run_source(spec, session, queue) -> int:
+
+    """
+        Parse the source, but not longer than its deadline
+    """
+
+    try:
+        return await asyncio.wait_for(parse_source(spec, session, queue), spec.get_deadline())
+    except asyncio.TimeoutError:
+        metrics.incr('deadline_exceeded', spec.code_name)
+        raise
+
+
+def make_tasks(session, queue, specs=None) -> list:
+
+    """
+        Tasks of the registered parsers, that share one HTTP session and the writer queue
+
+        specs(iterable): specs to run, by default all registered specs
+    """
+
+    tasks = []
+
+    if specs is None:
+        specs = PARSERS.values()
+
+    for spec in specs:
+        task = asyncio.ensure_future(run_source(spec, session, queue))
+        tasks.append(task)
+
+    return tasks
+
+
+def allowed_specs(specs) -> list:
+
+    """
+        Specs, which circuit breakers let them be polled
+    """
+
+    allowed = []
+    for spec in specs:
+        if breaker.CircuitBreaker(spec.code_name).allow():
+            allowed.append(spec)
+        else:
+            metrics.incr('breaker_rejected', spec.code_name)
+
+    return allowed
+
+
+def record_run(specs, results, saved, started_at=None):
+
+    """
+        Save outcomes of the polls to the scheduler and circuit breakers
+
+        started_at(datetime): start of the run, the next polls are planned from it
+    """
+
+    changed_sources = {record.code_name for record in saved}
+    outcomes = {}
+
+    for spec, result in zip(specs, results):
+        failed = isinstance(result, Exception)
+        if failed:
+            metrics.incr('polls_failed', spec.code_name)
+        outcomes[spec.code_name] = (spec.code_name in changed_sources, failed)
+        breaker.CircuitBreaker(spec.code_name).record(failed)
+
+    scheduler.record_polls(outcomes, started_at)
+
+
+async def run_parsers(session=None, specs=None) -> dict:
+
+    """
+        Run parsers: fetch and normalize concurrently, then write with one writer
+
+        session(ClientSession): session to use, by default a new one from make_session
+        specs(list): specs to run, by default the sources which poll time has come (see scheduler).
+            Sources with open circuit breakers are skipped
+
+        Returns per-stage timings and counts of the run
+    """
+
+    started_at = timezone.now()
+    if specs is None:
+        specs = await sync_to_async(scheduler.due_specs)(list(PARSERS.values()), started_at)
+    specs = await sync_to_async(allowed_specs)(specs)
+
+    queue = asyncio.Queue()
+    writer = asyncio.ensure_future(write_rates(queue))
+
+    start = time.monotonic()
+    if session is None:
+        async with make_session() as session:
+            results = await asyncio.gather(*make_tasks(session, queue, specs), return_exceptions=True)
+    else:
+        results = await asyncio.gather(*make_tasks(session, queue, specs), return_exceptions=True)
+    fetched = time.monotonic()
+
+    await queue.put(None)
+    try:
+        saved = await writer
+    except Exception:
+        fetch_cache.reset()
+        raise
+    finished = time.monotonic()
+
+    await sync_to_async(record_run)(specs, results, saved, started_at)
+
+    metrics.observe('stage_fetch', RUN_LABEL, fetched - start)
+    metrics.observe('run_duration', RUN_LABEL, finished - start)
+    metrics.incr('rates_created', RUN_LABEL, len(saved))
+    metrics.publish()
+
+    return {
+        'fetch_time': fetched - start,
+        'write_time': finished - fetched,
+        'polled': [spec.code_name for spec in specs],
+        'created': len(saved),
+        'errors': [repr(result) for result in results if isinstance(result, Exception)],
+    }
+
+
+def extract_privatbank(rates, key, currencies):
+
+    for rate in rates:
+        if rate['ccy'] in currencies:
+            yield rate['ccy'], rate['buy'], rate['sale']
+
+
+def extract_monobank(rates, key, currencies):
+
+    grivna_code = '980'
+
+    for rate in rates:
+        first_currency_code = str(rate['currencyCodeA'])
+        second_currency_code = str(rate['currencyCodeB'])
+
+        if first_currency_code in currencies and second_currency_code == grivna_code:
+            yield first_currency_code, rate['rateBuy'], rate['rateSell']
+
+
+def extract_vkurse(json_data, key, currencies):
+
+    # json_data is the dictionary, where the keys is a currency names
+
+    for name, rate in json_data.items():
+        if name in currencies:
+            yield name, rate['buy'], rate['sale']
 
 
-async def parse_pumb() -> None:
+def extract_minfin(html, key, currencies):
 
     """
-        Celery task for parsing rates from pumb.ua
+        Every minfin page has the rates of one currency, it is the key of the url
     """
 
-    from currency.models import Rate, Source
+    minfin_average, _ = html_extract.EXTRACTION_MODES[settings.PARSER_HTML_EXTRACTION]
 
-    source = Source.objects.get_or_create(
-        code_name=const.CODE_NAME_PUMB,
-        defaults={'name': 'PUMB'},
-    )[0]
+    # get the list where the first position is buy, second is sell
+    result = minfin_average(html)
 
-    url = 'https://about.pumb.ua/ru/info/currency_converter'
+    yield key, result[0], result[1]
 
-    available_currency_names = {'USD': choices.TYPE_USD,
-                                'EUR': choices.TYPE_EUR, }
 
-    async with aiohttp.ClientSession(raise_for_status=True) as session:
-        async with session.get(urls.get(currency_name)) as response:
-            soup = BeautifulSoup(response.text, 'html.parser')
+def extract_pumb(html, key, currencies):
 
-    table = soup.find('table')
+    _, first_table_rows = html_extract.EXTRACTION_MODES[settings.PARSER_HTML_EXTRACTION]
 
-    for row in table.find_all('tr'):
+    for col in first_table_rows(html, currencies):
 
-        col = row.find_all('td')
-        # We get a childs' elements of a table row as a list, but since in one of them will not be <td> tag,
-        #  so the list would be empty and we can not get it by index
-        try:
-            name = col[0].text
-        except IndexError:
+        # A row could have less cells than we need, so we skip it
+        if len(col) < 3:
             continue
 
-        if name in available_currency_names:
-
-            currency_name = available_currency_names.get(name)
-
-            try:
-                bid = col[1].text
-                ask = col[2].text
-            except IndexError:
-                continue
-
-            last_rate = Rate.objects.filter(
-                currency_name=currency_name,
-                source=source,
-            ).order_by('created').last()
-
-            if (
-                last_rate is None or
-                last_rate.bid != bid or
-                last_rate.ask != ask
-            ):
-
-                Rate.objects.create(
-                    ask=ask,
-                    bid=bid,
-                    currency_name=currency_name,
-                    source=source,
-                )
+        yield col[0], col[1], col[2]
+
+
+register(ParserSpec(
+    code_name=const.CODE_NAME_PRIVATBANK,
+    name='PrivatBank',
+    urls={None: 'https://api.privatbank.ua/p24api/pubinfo?json&exchange&coursid=5'},
+    extractor=extract_privatbank,
+    hedge_after=2,
+    currency_map={'USD': choices.TYPE_USD,
+                  'EUR': choices.TYPE_EUR, },
+))
+
+register(ParserSpec(
+    code_name=const.CODE_NAME_MONOBANK,
+    name='MonoBank',
+    urls={None: 'https://api.monobank.ua/bank/currency'},
+    extractor=extract_monobank,
+    currency_map={'840': choices.TYPE_USD,
+                  '978': choices.TYPE_EUR,
+                  '980': choices.TYPE_HRN},
+))
+
+register(ParserSpec(
+    code_name=const.CODE_NAME_VKURSE,
+    name='Vkurse.ua',
+    urls={None: 'http://vkurse.dp.ua/course.json'},
+    extractor=extract_vkurse,
+    currency_map={'Dollar': choices.TYPE_USD,
+                  'Euro': choices.TYPE_EUR, },
+))
+
+register(ParserSpec(
+    code_name=const.CODE_NAME_MINFIN,
+    name='MinFin',
+    urls={'USD': 'https://minfin.com.ua/currency/banks/usd/',
+          'EUR': 'https://minfin.com.ua/currency/banks/eur/', },
+    payload_format=PAYLOAD_HTML,
+    extractor=extract_minfin,
+    currency_map={'USD': choices.TYPE_USD,
+                  'EUR': choices.TYPE_EUR, },
+    concurrency=2,
+    timeout=30,
+))
+
+register(ParserSpec(
+    code_name=const.CODE_NAME_PUMB,
+    name='PUMB',
+    urls={None: 'https://about.pumb.ua/ru/info/currency_converter'},
+    payload_format=PAYLOAD_HTML,
+    extractor=extract_pumb,
+    currency_map={'USD': choices.TYPE_USD,
+                  'EUR': choices.TYPE_EUR, },
+))
@@ -0,0 +1,234 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+from currency.models import Rate, Source
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARENT = Rate._meta.db_table
+DEFAULT_PARTITION = f'{PARENT}_default'
+
+
+def qn(name) -> str:
+    return connection.ops.quote_name(name)
+
+
+def month_start(moment) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def next_month(month) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months(start, end) -> list:
+
+    """
+        Months from the month of start to the month of end inclusive
+    """
+
+    month, last = month_start(start), month_start(end)
+    result = []
+    while month <= last:
+        result.append(month)
+        month = next_month(month)
+    return result
+
+
+def months_ahead(count) -> list:
+
+    """
+        The current month and `count` months after it
+    """
+
+    result = [month_start(timezone.now())]
+    for _ in range(count):
+        result.append(next_month(result[-1]))
+    return result
+
+
+def bounds(month) -> tuple:
+    lower = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    upper_month = next_month(month)
+    return lower, datetime(upper_month.year, upper_month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month) -> str:
+    return f'{PARENT}_p{month:%Y_%m}'
+
+
+def partition_month(name):
+    prefix = f'{PARENT}_p'
+    if not name.startswith(prefix):
+        return None
+    year, month = name[len(prefix):].split('_')
+    return date(int(year), int(month), 1)
+
+
+def is_supported() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned() -> bool:
+    if not is_supported():
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [PARENT])
+        return cursor.fetchone() is not None
+
+
+def list_partitions() -> list:
+
+    """
+        Monthly partitions of the rates table: (name, month), ordered by month
+
+        The default partition, that takes the rates of months without their
+        partition, is not listed.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [PARENT],
+        )
+        names = [name for name, in cursor.fetchall()]
+
+    return sorted(
+        ((name, partition_month(name)) for name in names if partition_month(name) is not None),
+        key=lambda partition: partition[1],
+    )
+
+
+def create_partitions(months_to_create) -> list:
+
+    """
+        Create the monthly partitions, that do not exist yet, and attach them
+
+        A partition is created as a plain table and then attached: ATTACH
+        PARTITION locks the parent weaker than CREATE TABLE ... PARTITION OF,
+        so the writers are not blocked. The check of the bounds, added before,
+        saves the scan of the new partition on attach. The month should not
+        have rates in the default partition, so the partitions are created
+        ahead of time (see maintain_rate_storage task).
+
+        Returns names of the created partitions
+    """
+
+    existing = {name for name, _ in list_partitions()}
+    created = []
+
+    for month in months_to_create:
+        name = partition_name(month)
+        if name in existing:
+            continue
+
+        lower, upper = bounds(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(PARENT)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'ALTER TABLE {qn(name)} ADD CONSTRAINT {qn(name + "_bounds")} '
+                f'CHECK (created IS NOT NULL AND created >= %s AND created < %s)',
+                [lower, upper],
+            )
+            cursor.execute(
+                f'ALTER TABLE {qn(PARENT)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper],
+            )
+            cursor.execute(f'ALTER TABLE {qn(name)} DROP CONSTRAINT {qn(name + "_bounds")}')
+        created.append(name)
+
+    return created
+
+
+def convert(ahead) -> list:
+
+    """
+        Turn the rates table into a table partitioned by month of created
+
+        The rates are copied in one transaction, writers wait for it, readers
+        do not. PostgreSQL requires the partition key in unique constraints,
+        so the primary key becomes (id, created), the ids still come from the
+        same sequence. Monthly partitions cover the history and `ahead`
+        months, later rates go to the default partition.
+
+        Returns names of the created partitions
+    """
+
+    if is_partitioned():
+        return []
+
+    new = f'{PARENT}_partitioned'
+    created = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # читатели продолжают работать, писатели ждут конца копирования
+        cursor.execute(f'LOCK TABLE {qn(PARENT)} IN EXCLUSIVE MODE')
+
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [PARENT, 'id'])
+        sequence = cursor.fetchone()[0]
+        # иначе последовательность удалится вместе со старой таблицей
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+
+        cursor.execute(f'CREATE TABLE {qn(new)} (LIKE {qn(PARENT)} INCLUDING DEFAULTS) PARTITION BY RANGE (created)')
+        cursor.execute(f'ALTER TABLE {qn(new)} ADD PRIMARY KEY (id, created)')
+
+        cursor.execute(f'SELECT min(created) FROM {qn(PARENT)}')
+        first = cursor.fetchone()[0] or timezone.now()
+        for month in months(first, months_ahead(ahead)[-1]):
+            lower, upper = bounds(month)
+            cursor.execute(
+                f'CREATE TABLE {qn(partition_name(month))} PARTITION OF {qn(new)} FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper],
+            )
+            created.append(partition_name(month))
+        cursor.execute(f'CREATE TABLE {qn(DEFAULT_PARTITION)} PARTITION OF {qn(new)} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {qn(new)} SELECT * FROM {qn(PARENT)}')
+        cursor.execute(f'DROP TABLE {qn(PARENT)}')
+        cursor.execute(f'ALTER TABLE {qn(new)} RENAME TO {qn(PARENT)}')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {qn(PARENT)}.id')
+
+        cursor.execute(
+            f'ALTER TABLE {qn(PARENT)} ADD CONSTRAINT {qn(PARENT + "_source_id_fk")} '
+            f'FOREIGN KEY (source_id) REFERENCES {qn(Source._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+        # индексы модели создаются на родительской таблице и наследуются секциями
+        with connection.schema_editor(atomic=False) as editor:
+            for statement in editor._model_indexes_sql(Rate):
+                editor.execute(statement)
+
+    return created
+
+
+def droppable_partitions(before, keep=()) -> list:
+
+    """
+        Monthly partitions, that end not later than `before`
+
+        keep(iterable): times of rates, that should stay, their partitions are not listed
+    """
+
+    result = []
+    for name, month in list_partitions():
+        lower, upper = bounds(month)
+        if upper <= before and not any(lower <= moment < upper for moment in keep):
+            result.append((name, month))
+    return result
+
+
+def drop_partitions(partitions) -> list:
+
+    """
+        Detach and drop the partitions, returns their names
+    """
+
+    dropped = []
+    for name, _ in partitions:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {qn(PARENT)} DETACH PARTITION {qn(name)}')
+            cursor.execute(f'DROP TABLE {qn(name)}')
+        dropped.append(name)
+    return dropped
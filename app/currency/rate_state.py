@@ -0,0 +1,51 @@
+# Последние известные курсы воркера: {(source code_name, currency_name): (bid, ask)}
+_last_rates = None
+
+
+def is_loaded() -> bool:
+    return _last_rates is not None
+
+
+def load(force=False) -> dict:
+
+    """
+        Load last rate of every (source, currency) pair from the database
+
+        The pairs are read from the small LatestRate table with one query,
+        the writer reloads them once per run, between the runs the state is kept
+        up to date by remember()
+    """
+
+    global _last_rates
+
+    if _last_rates is not None and not force:
+        return _last_rates
+
+    from currency.models import LatestRate
+
+    rates = LatestRate.objects.values_list('source__code_name', 'currency_name', 'bid', 'ask')
+
+    _last_rates = {
+        (code_name, currency_name): (bid, ask)
+        for code_name, currency_name, bid, ask in rates
+    }
+
+    return _last_rates
+
+
+def is_changed(code_name, currency_name, bid, ask) -> bool:
+
+    """
+        Check if the rate differs from the last seen rate of the source
+    """
+
+    return _last_rates.get((code_name, currency_name)) != (bid, ask)
+
+
+def remember(code_name, currency_name, bid, ask):
+    _last_rates[(code_name, currency_name)] = (bid, ask)
+
+
+def reset():
+    global _last_rates
+    _last_rates = None
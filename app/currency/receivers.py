@@ -0,0 +1,15 @@
+from currency.models import LatestRate, Rate, RateCandle, defer_rate_refresh
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_delete, sender=Rate)
+def refresh_latest_rate_and_candles(sender, instance, **kwargs):
+    # удаления через модели и их querysets пересчитываются одним проходом в конце, см. deleting_rates
+    if defer_rate_refresh(instance):
+        return
+
+    # вызывается и при удалении через queryset, внутри транзакции удаления
+    LatestRate.objects.refresh(instance.source_id, instance.currency_name)
+    RateCandle.objects.rebuild(instance.source_id, instance.currency_name, [instance.created])
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+
+from currency import breaker
+from currency import fetch_cache
+from currency import metrics
+from currency import rate_state
+from currency.parsers import PARSERS, make_session, run_parsers, source_url
+
+from django.db import transaction
+
+RECORDING_INDEX = 'index.json'
+
+
+def replay_path(url) -> str:
+
+    """
+        Path of the source url at the stand-in server: host, path and query of the url
+    """
+
+    parts = urlsplit(url)
+    query = f'?{parts.query}' if parts.query else ''
+    return f'{parts.netloc}{parts.path}{query}'
+
+
+def recording_name(url) -> str:
+    return re.sub(r'[^A-Za-z0-9.]+', '_', replay_path(url)).strip('_')
+
+
+def spec_urls(specs=None) -> list:
+    specs = PARSERS.values() if specs is None else specs
+    return [url for spec in specs for url in spec.urls.values()]
+
+
+async def record(urls, directory) -> dict:
+
+    """
+        Save responses of the urls to the directory, to be served by StandInServer
+
+        Every body is saved to its own file, the index maps the replay path of
+        the url to the file and the content type of the response. The file is
+        relative to the directory, so an index may point at a response, that is
+        kept elsewhere, e.g. at a fixture of another test.
+    """
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    async def get(session, url):
+        async with session.get(source_url(url)) as response:
+            return url, response.headers.get('Content-Type', 'application/octet-stream'), await response.read()
+
+    async with make_session() as session:
+        responses = await asyncio.gather(*[get(session, url) for url in urls])
+
+    index_path = directory / RECORDING_INDEX
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+
+    for url, content_type, body in responses:
+        name = recording_name(url)
+        (directory / name).write_bytes(body)
+        index[replay_path(url)] = {'file': name, 'content_type': content_type}
+
+    index_path.write_text(json.dumps(index, indent=2, sort_keys=True) + '\n')
+
+    return index
+
+
+class StandInServer:
+
+    """
+        Local HTTP server, that replays recorded responses of the sources
+
+        Parsers are pointed to it with PARSER_REPLAY_URL. Every response is
+        delayed by latency plus random jitter seconds, a share of requests
+        (error_rate) is answered with 503, and payload_scale pads the body with
+        whitespace, so JSON and HTML stay valid but get bigger. Responses have
+        an ETag and If-None-Match is answered with 304, like the real sources do.
+    """
+
+    def __init__(
+        self,
+        directory,
+        latency=0,
+        jitter=0,
+        error_rate=0,
+        payload_scale=1,
+        host='127.0.0.1',
+        port=0,
+        seed=None,
+    ):
+        self.directory = Path(directory)
+        self.index = json.loads((self.directory / RECORDING_INDEX).read_text())
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_scale = payload_scale
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def response(self, path):
+
+        """
+            Status, headers and body of the response for the path
+        """
+
+        self.requests += 1
+        time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        recording = self.index.get(path)
+        if recording is None:
+            return 404, {}, b''
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return 503, {}, b''
+
+        body = (self.directory / recording['file']).read_bytes()
+        if self.payload_scale > 1:
+            body += b' ' * int(len(body) * (self.payload_scale - 1))
+
+        headers = {
+            'Content-Type': recording['content_type'],
+            'ETag': f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        }
+        return 200, headers, body
+
+    def make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, headers, body = stand_in.response(self.path.lstrip('/'))
+                if status == 200 and self.headers.get('If-None-Match') == headers['ETag']:
+                    status, body = 304, b''
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def benchmark(runs, specs=None) -> dict:
+
+    """
+        Full parsing runs of all sources, every run starts from the cold state
+
+        Should be run with PARSER_REPLAY_URL pointing to a stand-in server.
+        Last rates, payload hashes and circuit breakers are reset before every
+        run and its database writes are rolled back, so each run fetches,
+        normalizes and writes every rate again.
+        Returns wall time, throughput and per-source latency of the runs
+    """
+
+    specs = list(PARSERS.values()) if specs is None else specs
+    metrics.reset()
+
+    created = 0
+    errors = []
+    started = time.monotonic()
+
+    for _ in range(runs):
+        rate_state.reset()
+        fetch_cache.reset()
+        for spec in specs:
+            breaker.CircuitBreaker(spec.code_name).reset()
+
+        with transaction.atomic():
+            result = async_to_sync(run_parsers)(specs=specs)
+            transaction.set_rollback(True)
+
+        created += result['created']
+        errors.extend(result['errors'])
+
+    elapsed = time.monotonic() - started
+    stats = metrics.snapshot()
+
+    return {
+        'runs': runs,
+        'elapsed': elapsed,
+        'created': created,
+        'rates_per_second': created / elapsed if elapsed else 0,
+        'run_duration': stats['timings'].get('run_duration', {}).get('run'),
+        'fetch_latency': stats['timings'].get('fetch_latency', {}),
+        'failed': stats['counters'].get('polls_failed', {}),
+        'errors': errors,
+    }
@@ -0,0 +1,149 @@
+from datetime import timedelta
+
+from currency import model_choices as choices
+from currency import partitions
+from currency.models import LatestRate, Rate, RateCandle
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+def retention_cutoff(days, now=None):
+
+    """
+        Start of the day, rates before which are downsampled
+    """
+
+    moment = (now or timezone.now()) - timedelta(days=days)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def downsample_day(day, delete=True) -> dict:
+
+    """
+        Count the rates of the day in their hour and day candles and delete them
+
+        Runs in one transaction, so a day is either downsampled completely or
+        not at all. Rates between open_time and close_time of a candle, saved
+        before, are already counted in it: the rates, counted on write (see
+        RateCandleManager.add_rates), and a day, that has been downsampled, but
+        not deleted, are not counted twice.
+
+        delete(bool): delete the rates, False if their partition is dropped later
+    """
+
+    end = day + timedelta(days=1)
+
+    with transaction.atomic():
+        rows = Rate.objects \
+            .filter(created__gte=day, created__lt=end) \
+            .order_by('created', 'id') \
+            .values_list('source_id', 'currency_name', 'bid', 'ask', 'created')
+
+        candles = {candle.key: candle for candle in RateCandle.objects.filter(start__gte=day, start__lt=end)}
+        spans = {key: (candle.open_time, candle.close_time) for key, candle in candles.items()}
+        changed = set()
+        count = 0
+
+        for source_id, currency_name, bid, ask, created in rows:
+            count += 1
+            for period in RateCandle.PERIODS:
+                key = (source_id, currency_name, period, RateCandle.bucket_start(created, period))
+                span = spans.get(key)
+                if span is not None and span[0] <= created <= span[1]:
+                    continue
+
+                candle = candles.get(key)
+                if candle is None:
+                    candles[key] = RateCandle.open(source_id, currency_name, period, bid, ask, created)
+                else:
+                    candle.add(bid, ask, created)
+                changed.add(key)
+
+        RateCandle.objects.bulk_create(
+            [candles[key] for key in changed if candles[key].pk is None],
+            batch_size=500,
+        )
+        RateCandle.objects.bulk_update(
+            [candles[key] for key in changed if candles[key].pk is not None],
+            RateCandle.FIELDS,
+            batch_size=500,
+        )
+
+        deleted = delete_rates(day, end) if delete else 0
+
+    return {'rates': count, 'candles': len(changed), 'deleted': deleted}
+
+
+def delete_rates(start, end) -> int:
+
+    """
+        Delete the rates of the time range, except the latest rates of their pairs
+
+        Raw DELETE: the rates are already in the candles, and neither LatestRate
+        nor the caches change, so the per-row delete signals are skipped.
+    """
+
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {ops.quote_name(Rate._meta.db_table)} '
+            f'WHERE created >= %s AND created < %s AND id NOT IN ('
+            f'SELECT rate_id FROM {ops.quote_name(LatestRate._meta.db_table)} WHERE rate_id IS NOT NULL)',
+            [ops.adapt_datetimefield_value(start), ops.adapt_datetimefield_value(end)],
+        )
+        return cursor.rowcount
+
+
+def apply_retention(days=None, now=None, log=None) -> dict:
+
+    """
+        Downsample the rates older than `days` days to candles and drop them
+
+        The latest rate of every pair stays, LatestRate refers to it. On
+        PostgreSQL with the partitioned rates table (see currency.partitions)
+        the monthly partitions before the cutoff are detached and dropped
+        instead of deleting their rows; elsewhere, e.g. on SQLite, the rows are
+        deleted day by day.
+
+        days(int): raw rates are kept for, RATE_RETENTION_DAYS by default
+        log(callable): gets a line about every downsampled day
+    """
+
+    days = days or settings.RATE_RETENTION_DAYS
+    cutoff = retention_cutoff(days, now)
+
+    latest = list(LatestRate.objects.filter(rate__isnull=False).values_list('rate_id', 'rate__created'))
+    keep_ids = [rate_id for rate_id, _ in latest]
+
+    droppable = []
+    if partitions.is_partitioned():
+        droppable = partitions.droppable_partitions(cutoff, keep=[created for _, created in latest])
+    dropped_months = [partitions.bounds(month) for _, month in droppable]
+
+    def next_day(after=None):
+        rates = Rate.objects.filter(created__lt=cutoff).exclude(id__in=keep_ids)
+        if after is not None:
+            rates = rates.filter(created__gte=after)
+        created = rates.order_by('created').values_list('created', flat=True).first()
+        return None if created is None else RateCandle.bucket_start(created, choices.PERIOD_DAY)
+
+    stats = {'cutoff': cutoff, 'days': 0, 'rates': 0, 'candles': 0, 'deleted': 0, 'dropped_partitions': []}
+
+    day = next_day()
+    while day is not None:
+        delete = not any(lower <= day < upper for lower, upper in dropped_months)
+        result = downsample_day(day, delete=delete)
+
+        stats['days'] += 1
+        for key in ('rates', 'candles', 'deleted'):
+            stats[key] += result[key]
+        if log is not None:
+            log(f'{day:%Y-%m-%d}: {result["rates"]} rates, {result["candles"]} candles, {result["deleted"]} deleted')
+
+        day = next_day(day + timedelta(days=1))
+
+    stats['dropped_partitions'] = partitions.drop_partitions(droppable)
+
+    return stats
@@ -0,0 +1,160 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+# состояние маршрутизации текущего запроса (потока или задачи asyncio)
+_state = ContextVar('database_routing', default=None)
+
+# alias -> (время проверки, отставание в секундах или None, если реплика недоступна)
+_lag_checks = {}
+
+
+class RoutingState:
+
+    """
+        Whether the reads of the current context may go to a replica
+
+        Once the context writes to the primary, its reads stay there.
+    """
+
+    __slots__ = ('replica_reads', 'wrote', 'atomic_depth')
+
+    def __init__(self, replica_reads):
+        self.replica_reads = replica_reads
+        self.wrote = False
+        # транзакции, открытые до начала контекста (например, тестом), не считаются
+        self.atomic_depth = atomic_depth()
+
+
+def atomic_depth() -> int:
+
+    """
+        Number of the atomic blocks of the primary connection, the current one is inside
+    """
+
+    connection = connections[PRIMARY]
+    # внешний блок - транзакция, вложенные - точки сохранения
+    return int(connection.in_atomic_block) + len(connection.savepoint_ids)
+
+
+@contextmanager
+def routing(replica_reads):
+    token = _state.set(RoutingState(replica_reads))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+def replica_reads():
+
+    """
+        Let the reads of the block go to a replica, unless it writes
+
+        Used by DatabaseRoutingMiddleware for safe requests; anywhere else,
+        e.g. in the Celery tasks and commands, reads go to the primary.
+    """
+
+    return routing(replica_reads=True)
+
+
+def primary_reads():
+    return routing(replica_reads=False)
+
+
+def has_written() -> bool:
+    state = _state.get()
+    return state is not None and state.wrote
+
+
+def replica_lag(alias):
+
+    """
+        Seconds the replica is behind the primary, None if it can not be queried
+
+        Only PostgreSQL reports the lag, other replicas are taken as up to date.
+        A replica, that has replayed everything it received, is not behind,
+        even if the primary has not written for a while.
+    """
+
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+            )
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        return None
+
+
+def available_replicas() -> list:
+
+    """
+        Replicas, that are behind the primary not more than DATABASE_REPLICA_MAX_LAG
+
+        The lag of a replica is checked at most once in DATABASE_REPLICA_CHECK_INTERVAL
+        seconds per process.
+    """
+
+    now = time.monotonic()
+    result = []
+    for alias in settings.DATABASE_REPLICAS:
+        checked = _lag_checks.get(alias)
+        if checked is None or now - checked[0] >= settings.DATABASE_REPLICA_CHECK_INTERVAL:
+            checked = _lag_checks[alias] = (now, replica_lag(alias))
+
+        lag = checked[1]
+        if lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG:
+            result.append(alias)
+    return result
+
+
+def reset():
+    _lag_checks.clear()
+
+
+class PrimaryReplicaRouter:
+
+    """
+        Router, that sends the safe reads to the replicas and everything else to the primary
+
+        Reads go to a random replica from DATABASE_REPLICAS only inside
+        replica_reads() (see DatabaseRoutingMiddleware) and only if the
+        context has not written yet and is not inside a transaction, opened
+        in it: a transaction should see its own writes. Without replicas
+        every query goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.wrote:
+            return PRIMARY
+        if atomic_depth() > state.atomic_depth:
+            return PRIMARY
+
+        replicas = available_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же данные, что и на основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Вес последнего опроса в скользящих средних change_ratio и error_ratio
+SMOOTHING = 0.2
+
+
+def next_interval(interval, changed, failures) -> int:
+
+    """
+        Poll interval of the source after a poll
+
+        interval(int): current interval in seconds
+        changed(bool): the poll has brought new rates
+        failures(int): failed polls in a row, including this one
+
+        Failed source backs off exponentially, a source with new rates is polled
+        more often, a source without changes is polled less often.
+    """
+
+    if failures:
+        # каждый следующий сбой подряд удваивает интервал
+        interval = interval * 2
+    elif changed:
+        interval = interval * settings.PARSER_POLL_SPEEDUP
+    else:
+        interval = interval * settings.PARSER_POLL_SLOWDOWN
+
+    return int(min(max(interval, settings.PARSER_MIN_POLL_INTERVAL), settings.PARSER_MAX_POLL_INTERVAL))
+
+
+def get_sources(specs) -> dict:
+
+    """
+        Sources of the specs by code name, missing sources are created
+    """
+
+    from currency.models import Source
+
+    specs = list(specs)
+    sources = {
+        source.code_name: source
+        for source in Source.objects.filter(code_name__in=[spec.code_name for spec in specs])
+    }
+    for spec in specs:
+        if spec.code_name not in sources:
+            sources[spec.code_name] = Source.objects.create(
+                code_name=spec.code_name,
+                name=spec.name,
+                poll_interval=settings.PARSER_MIN_POLL_INTERVAL,
+            )
+
+    return sources
+
+
+def due_specs(specs, now=None) -> list:
+
+    """
+        Specs of sources, which poll time has come
+    """
+
+    now = now or timezone.now()
+    sources = get_sources(specs)
+
+    return [
+        spec
+        for spec in specs
+        if sources[spec.code_name].next_poll is None or sources[spec.code_name].next_poll <= now
+    ]
+
+
+def record_polls(outcomes, now=None):
+
+    """
+        Save results of the polls and plan the next ones
+
+        outcomes(dict): {code_name: (changed, failed)}
+        now(datetime): start of the run; the next poll is planned from it, not
+            from the end of the run, so the beat at now + interval finds the
+            source due instead of skipping it to the beat after
+    """
+
+    from currency.models import Source
+
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        for source in Source.objects.select_for_update().filter(code_name__in=outcomes.keys()):
+            changed, failed = outcomes[source.code_name]
+
+            source.failures = source.failures + 1 if failed else 0
+            source.error_ratio += SMOOTHING * (failed - source.error_ratio)
+            if not failed:
+                source.change_ratio += SMOOTHING * (changed - source.change_ratio)
+            if changed:
+                source.last_changed = now
+
+            source.poll_interval = next_interval(source.poll_interval, changed, source.failures)
+            source.next_poll = now + timedelta(seconds=source.poll_interval)
+
+            source.save(update_fields=(
+                'failures',
+                'error_ratio',
+                'change_ratio',
+                'last_changed',
+                'poll_interval',
+                'next_poll',
+            ))
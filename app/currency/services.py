@@ -1,8 +1,45 @@
-from currency import const
+import sqlite3
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from currency import analytics
+from currency import latest_cache
 from currency import model_choices as mch
-from currency.models import Rate, Source
+from currency.models import LatestRate, Rate, RateCandle, Source
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Case, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+
+def compute_latest_rates() -> list:
+
+    """
+        Last rate of every source and currency, computed with one query
+
+        For every pair of a source and a rate type the subquery takes the id of
+        the newest rate, it is one seek of the (source, currency_name, created)
+        index, so the query does not depend on the size of the rates history.
+    """
+
+    currencies = [currency_type for currency_type, _ in mch.RATE_TYPES]
+    quote = connection.ops.quote_name
+
+    currencies_sql = ' UNION ALL '.join(['SELECT %s AS name'] * len(currencies))
+    latest_ids = RawSQL(
+        f'SELECT (SELECT latest.id FROM {quote(Rate._meta.db_table)} latest '
+        f'WHERE latest.source_id = pair_source.id AND latest.currency_name = pair_currency.name '
+        f'ORDER BY latest.created DESC, latest.id DESC LIMIT 1) '
+        f'FROM {quote(Source._meta.db_table)} pair_source CROSS JOIN ({currencies_sql}) pair_currency',
+        currencies,
+    )
+
+    rates = Rate.objects.filter(id__in=latest_ids).select_related('source')
 
-from django.core.cache import cache
+    return sorted(rates, key=lambda rate: (rate.source_id, currencies.index(rate.currency_name)))
 
 
 def get_latest_rates():
@@ -14,23 +51,306 @@ def get_latest_rates():
         privatbank - EUR
         monobank - USD
         monobank - EUR
+
+        Every pair is cached by its own key as a LatestEntry tuple and is
+        written through on every rate write (see currency.latest_cache). On a cache miss the rates are
+        read from LatestRate, one row per source and currency, by one process
+        at a time, others get the previous board meanwhile
     '''
 
-    latest_rates = cache.get(const.CACHE_KEY_LATEST_RATES)
+    latest_rates = latest_cache.get_board()
     if latest_rates is not None:
         return latest_rates
 
-    rates = []
-    for source in Source.objects.all():
-        for currency_type, _ in mch.RATE_TYPES:
+    return latest_cache.reload_board(load_latest_rates)
+
+
+def load_latest_rates() -> list:
+    rates = LatestRate.objects.select_related('rate__source').filter(rate__isnull=False)
+
+    return latest_cache.load_board([latest.rate for latest in rates])
+
+
+def rebuild_latest_rates() -> dict:
+
+    """
+        Restore LatestRate from the rates history
+
+        Returns counts of created, updated and deleted rows
+    """
+
+    counts = {'created': 0, 'updated': 0, 'deleted': 0}
+    now = timezone.now()
+
+    with transaction.atomic():
+        existing = {
+            (latest.source_id, latest.currency_name): latest
+            for latest in LatestRate.objects.select_for_update()
+        }
+
+        rates = compute_latest_rates()
+        for rate in rates:
+            latest = existing.pop((rate.source_id, rate.currency_name), None)
+            if latest is None:
+                LatestRate.objects.create(
+                    source_id=rate.source_id,
+                    currency_name=rate.currency_name,
+                    rate=rate,
+                    bid=rate.bid,
+                    ask=rate.ask,
+                    updated=now,
+                )
+                counts['created'] += 1
+            elif (latest.rate_id, latest.bid, latest.ask) != (rate.id, rate.bid, rate.ask):
+                latest.rate = rate
+                latest.bid = rate.bid
+                latest.ask = rate.ask
+                latest.updated = now
+                latest.save(update_fields=('rate', 'bid', 'ask', 'updated'))
+                counts['updated'] += 1
+
+        # пары, у которых больше нет курсов
+        if existing:
+            LatestRate.objects.filter(id__in=[latest.id for latest in existing.values()]).delete()
+            counts['deleted'] = len(existing)
+
+    latest_cache.store(rates)
+    # доска собирается заново из исправленной таблицы
+    latest_cache.bump_version()
+
+    return counts
+
+
+def rebuild_candles(start=None, end=None, log=None) -> dict:
+
+    """
+        Recompute hour and day candles of the days from start to end from the rates history
+
+        By default from the first rate, but not before the retention cutoff:
+        the rates of older days are dropped, their candles are the history.
+        Every day is rebuilt in its own transaction.
+
+        start(date), end(date): inclusive
+        log(callable): gets a line about every rebuilt day
+    """
+
+    if start is None:
+        first = Rate.objects.order_by('created').values_list('created', flat=True).first()
+        if first is None:
+            return {'days': 0, 'candles': 0}
+        start = first.date()
+        if settings.RATE_RETENTION_DAYS:
+            start = max(start, (timezone.now() - timedelta(days=settings.RATE_RETENTION_DAYS)).date())
+    end = end or timezone.now().date()
+
+    counts = {'days': 0, 'candles': 0}
+    day = datetime.combine(start, time.min, tzinfo=dt_timezone.utc)
+    while day.date() <= end:
+        with transaction.atomic():
+            candles = RateCandle.objects.rebuild_day(day)
+        counts['days'] += 1
+        counts['candles'] += candles
+        if log is not None and candles:
+            log(f'{day:%Y-%m-%d}: {candles} candles')
+        day += timedelta(days=1)
+
+    return counts
+
+
+@lru_cache(maxsize=None)
+def check_returning(vendor):
+
+    """
+        Fail clearly, if the database can not return rows from INSERT and UPDATE
+
+        insert_changed_rates relies on RETURNING, SQLite supports it since 3.35.
+        The version of the library is checked once per process.
+    """
+
+    if vendor == 'sqlite' and sqlite3.sqlite_version_info < (3, 35):
+        raise ImproperlyConfigured(
+            f'Saving rates requires SQLite 3.35 or later for RETURNING, found {sqlite3.sqlite_version}'
+        )
+
+
+def insert_changed_rates(rows, now=None) -> list:
+
+    """
+        Insert rates, that differ from the last rate of their source and currency
+
+        rows(list): list of (source_id, currency_name, bid, ask)
+
+        The last rates are kept in LatestRate: a conditional upsert updates only
+        changed pairs and returns them, so two concurrent writers can not both
+        insert the same rate. On PostgreSQL the upsert and the insert into the
+        history are one statement, other backends (SQLite 3.35+) run them one
+        after another, then LatestRate gets the ids of the new rates and the
+        rates are counted in their candles, all in one transaction.
+        Returns list of (source_id, currency_name) of inserted rates
+    """
+
+    # одна пара не может обновиться дважды за одну команду INSERT ... ON CONFLICT
+    values = {(source_id, currency_name): (bid, ask) for source_id, currency_name, bid, ask in rows}
+    if not values:
+        return []
+
+    check_returning(connection.vendor)
+
+    now = now or timezone.now()
+    ops = connection.ops
+    quote = ops.quote_name
+    latest_table = quote(LatestRate._meta.db_table)
+
+    upsert_values = []
+    params = []
+    for (source_id, currency_name), (bid, ask) in values.items():
+        upsert_values.append('(%s, %s, %s, %s, %s)')
+        params.extend((
+            source_id,
+            currency_name,
+            ops.adapt_decimalfield_value(bid, 4, 2),
+            ops.adapt_decimalfield_value(ask, 4, 2),
+            ops.adapt_datetimefield_value(now),
+        ))
+
+    upsert = (
+        f'INSERT INTO {latest_table} (source_id, currency_name, bid, ask, updated) '
+        f'VALUES {", ".join(upsert_values)} '
+        f'ON CONFLICT (source_id, currency_name) DO UPDATE '
+        f'SET bid = excluded.bid, ask = excluded.ask, updated = excluded.updated '
+        f'WHERE {latest_table}.bid <> excluded.bid OR {latest_table}.ask <> excluded.ask'
+    )
+
+    rate_table = quote(Rate._meta.db_table)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'WITH changed AS ({upsert} RETURNING source_id, currency_name, bid, ask, updated) '
+                    f'INSERT INTO {rate_table} (source_id, currency_name, bid, ask, created, currency_type) '
+                    f"SELECT source_id, currency_name, bid, ask, updated, '' FROM changed "
+                    f'RETURNING id, source_id, currency_name',
+                    params,
+                )
+                inserted = cursor.fetchall()
+            else:
+                cursor.execute(f'{upsert} RETURNING source_id, currency_name', params)
+                changed = cursor.fetchall()
+                inserted = []
+                if changed:
+                    rate_params = []
+                    for source_id, currency_name in changed:
+                        bid, ask = values[(source_id, currency_name)]
+                        rate_params.extend((
+                            source_id,
+                            currency_name,
+                            ops.adapt_decimalfield_value(bid, 4, 2),
+                            ops.adapt_decimalfield_value(ask, 4, 2),
+                            ops.adapt_datetimefield_value(now),
+                            '',
+                        ))
+                    cursor.execute(
+                        f'INSERT INTO {rate_table} (source_id, currency_name, bid, ask, created, currency_type) '
+                        f'VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(changed))} '
+                        f'RETURNING id, source_id, currency_name',
+                        rate_params,
+                    )
+                    inserted = cursor.fetchall()
+
+        if inserted:
+            rate_ids = [rate_id for rate_id, _, _ in inserted]
+            transaction.on_commit(lambda: latest_cache.store(
+                list(Rate.objects.select_related('source').filter(id__in=rate_ids))
+            ))
+
+            RateCandle.objects.add_rates(
+                (source_id, currency_name, *values[(source_id, currency_name)], now)
+                for _, source_id, currency_name in inserted
+            )
+
+            # курсы вставлены после upsert, поэтому ссылку на них проставляем отдельно
+            pairs = Q()
+            cases = []
+            for rate_id, source_id, currency_name in inserted:
+                pairs |= Q(source_id=source_id, currency_name=currency_name)
+                cases.append(When(source_id=source_id, currency_name=currency_name, then=Value(rate_id)))
+            LatestRate.objects.filter(pairs).update(rate_id=Case(*cases))
+
+    return [(source_id, currency_name) for _, source_id, currency_name in inserted]
+
+
+def padded(values, length) -> list:
+
+    """
+        Rolling values as a list of `length`, the first points without a full window are None
+    """
+
+    values = values.tolist()
+    return [None] * (length - len(values)) + values
+
+
+def get_rate_analytics(source_id, currency_name, start, end, resolution=3600, window=24) -> dict:
+
+    """
+        Prices, spread, moving average and volatility of the pair on a regular grid
+
+        The rates are read into arrays with one query and resampled to the last
+        rate of every `resolution` seconds long bucket, the rolling values are
+        computed over `window` buckets. The result is cached until a rate of
+        the pair is written (see analytics.cached).
+
+        Returns columns of equal length: times (seconds since the epoch), bid,
+        ask, spread, bid_mean, ask_mean, volatility
+    """
+
+    def compute():
+        grid = analytics.make_grid(start, end, resolution)
+        series = analytics.resample(
+            analytics.load_series(source_id, currency_name, start, end), grid, resolution,
+        )
+        length = len(series)
+
+        return {
+            'times': series.times.tolist(),
+            'bid': (series.bid / analytics.SCALE).tolist(),
+            'ask': (series.ask / analytics.SCALE).tolist(),
+            'spread': (series.spread() / analytics.SCALE).tolist(),
+            'bid_mean': padded(analytics.rolling_mean(series.bid, window) / analytics.SCALE, length),
+            'ask_mean': padded(analytics.rolling_mean(series.ask, window) / analytics.SCALE, length),
+            'volatility': padded(analytics.volatility(series, window), length),
+        }
+
+    return analytics.cached(
+        'rate', [(source_id, currency_name)], (source_id, currency_name, start, end, resolution, window), compute,
+    )
+
+
+def get_best_rates(currency_name, start, end, resolution=3600) -> dict:
+
+    """
+        The highest bid and the lowest ask among all sources on a regular grid
+
+        Returns columns of equal length: times, bid, bid_source, ask, ask_source
+    """
 
-            rate = Rate.objects \
-                .filter(source=source, currency_name=currency_type) \
-                .order_by('-created').first()
+    source_ids = list(Source.objects.order_by('id').values_list('id', flat=True))
+    pairs = [(source_id, currency_name) for source_id in source_ids]
 
-            if rate is not None:
-                rates.append(rate)
+    def compute():
+        grid = analytics.make_grid(start, end, resolution)
+        best = analytics.best_of_sources(
+            [analytics.load_series(source_id, currency_name, start, end) for source_id in source_ids],
+            grid,
+            resolution,
+        )
 
-    cache.set(const.CACHE_KEY_LATEST_RATES, rates, 60 * 60 * 24 * 14)
+        return {
+            'times': best['times'].tolist(),
+            'bid': (best['bid'] / analytics.SCALE).tolist(),
+            'bid_source': best['bid_source'].tolist(),
+            'ask': (best['ask'] / analytics.SCALE).tolist(),
+            'ask_source': best['ask_source'].tolist(),
+        }
 
-    return rates
+    return analytics.cached('best', pairs, (currency_name, start, end, resolution), compute)
@@ -1,4 +1,6 @@
-import asyncio
+import time
+
+from asgiref.sync import async_to_sync
 
 from celery import shared_task
 
@@ -6,7 +8,12 @@ from django.core.mail import send_mail
 
 from settings import settings
 
-from currency.parsers import make_tasks
+from currency import const
+from currency import metrics
+from currency import partitions
+from currency.locks import CacheLock
+from currency.parsers import run_parsers
+from currency.retention import apply_retention
 
 
 @shared_task
@@ -33,5 +40,49 @@ def send_email(subject, full_email, recipient_list):
 
 @shared_task
 def run_parsing():
-    tasks = make_tasks()
-    asyncio.run(asyncio.gather(*tasks, return_exceptions=True))
+
+    """
+        Celery task for parsing rates from all sources
+
+        Only one run at a time: a run, that finds the lock taken, is skipped,
+        otherwise slow runs pile up and race on the same rates.
+        async_to_sync keeps ORM calls of the parsers in the thread of the task,
+        so they use the same database connection.
+        Returns timings of the fetch and write stages
+    """
+
+    lock = CacheLock(const.CACHE_KEY_PARSING_LOCK, settings.PARSER_RUN_LEASE)
+
+    if not lock.acquire():
+        metrics.incr_shared('runs_skipped')
+        return {'skipped': True}
+
+    metrics.incr_shared('runs_started')
+    start = time.monotonic()
+    try:
+        return async_to_sync(run_parsers)()
+    finally:
+        if time.monotonic() - start > settings.PARSER_RUN_LEASE:
+            metrics.incr_shared('runs_lease_exceeded')
+        lock.release()
+
+
+@shared_task
+def maintain_rate_storage():
+
+    """
+        Celery task for the rates storage: partitions of the next months and retention
+
+        Partitions are created ahead, so the rates never go to the default
+        partition, that would block attaching their month.
+    """
+
+    result = {}
+    if partitions.is_partitioned():
+        result['partitions'] = partitions.create_partitions(partitions.months_ahead(settings.RATE_PARTITIONS_AHEAD))
+
+    if settings.RATE_RETENTION_DAYS:
+        stats = apply_retention(settings.RATE_RETENTION_DAYS)
+        result['retention'] = {**stats, 'cutoff': stats['cutoff'].isoformat()}
+
+    return result
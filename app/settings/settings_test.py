@@ -4,3 +4,18 @@ DEBUG = False
 # Когда селери находит эту настройку, то все таски будут выполняться как функции, игнорируя брокера.
 # Не должно идти в прод
 CELERY_TASK_ALWAYS_EAGER = True
+
+# Вторая база для проверки маршрутизации чтений на реплики (tests/routers.py),
+# в DATABASE_REPLICAS ее включают сами тесты
+DATABASES['replica'] = {  # noqa
+    'ENGINE': 'currency.db_backends.sqlite3',
+    'NAME': BASE_DIR / 'db_replica.sqlite3',  # noqa
+}
+
+# Тесты чистят кэш (tests/conftest.py), у каждого процесса тестов должен быть свой,
+# а не общий memcached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
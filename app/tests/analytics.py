@@ -0,0 +1,126 @@
+from datetime import datetime, timezone as dt_timezone
+
+from currency import analytics
+from currency import const
+from currency.models import Rate, Source
+from currency.services import get_best_rates, get_rate_analytics
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import numpy as np
+
+import pytest
+
+
+def at(hour, minute=0):
+    return datetime(2026, 10, 1, hour, minute, tzinfo=dt_timezone.utc)
+
+
+def test_series_operations():
+
+    """
+        Unit test for testing loading, resampling and rolling windows of a rate series
+    """
+
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    for created, bid, ask in (
+        (at(10, 30), '41.20', '41.80'),
+        (at(10, 50), '41.40', '41.90'),
+        (at(12, 10), '41.00', '41.60'),
+        (at(13, 0), '41.30', '41.85'),
+    ):
+        Rate.objects.create(source=privatbank, currency_name='USD', bid=bid, ask=ask, created=created)
+
+    series = analytics.load_series(privatbank.id, 'USD', at(10), at(13))
+    assert series.times.tolist() == [int(moment.timestamp()) for moment in (at(10, 30), at(10, 50), at(12, 10))]
+    assert series.bid.dtype == np.int64 and series.bid.tolist() == [4120, 4140, 4100]
+    assert series.spread().tolist() == [60, 50, 60]
+
+    # 11:00 has no rates and takes the last rate of 10:00
+    grid = analytics.make_grid(at(9), at(13), 3600)
+    hourly = analytics.resample(series, grid, 3600)
+    assert hourly.times.tolist() == [int(at(hour).timestamp()) for hour in (10, 11, 12)]
+    assert hourly.bid.tolist() == [4140, 4140, 4100]
+
+    assert analytics.rolling_mean(hourly.bid, 2).tolist() == [4140, 4120]
+    assert analytics.rolling_std(np.array([1, 3, 5, 5]), 2).tolist() == [1, 1, 0]
+    assert len(analytics.volatility(hourly, 2)) == 1
+    assert len(analytics.rolling_mean(hourly.bid, 4)) == 0
+
+    # the series of a later range starts with the rate in force at its start
+    series = analytics.load_series(privatbank.id, 'USD', at(11), at(13))
+    assert series.times.tolist() == [int(moment.timestamp()) for moment in (at(10, 50), at(12, 10))]
+    hourly = analytics.resample(series, analytics.make_grid(at(11), at(13), 3600), 3600)
+    assert hourly.bid.tolist() == [4140, 4100]
+
+
+def test_best_of_sources():
+
+    """
+        Unit test for testing the best bid and ask among sources on a grid
+    """
+
+    grid = analytics.make_grid(at(10), at(13), 3600)
+    first = analytics.Series(1, 'USD', np.array([int(at(10, 5).timestamp())]), np.array([4120]), np.array([4180]))
+    second = analytics.Series(
+        2, 'USD', np.array([int(at(11, 5).timestamp()), int(at(12, 5).timestamp())]),
+        np.array([4130, 4100]), np.array([4190, 4150]),
+    )
+    nothing = np.empty(0, dtype=np.int64)
+    empty = analytics.Series(3, 'USD', nothing, nothing, nothing)
+
+    best = analytics.best_of_sources([first, second, empty], grid, 3600)
+    assert best['bid'].tolist() == [4120, 4130, 4120]
+    assert best['bid_source'].tolist() == [1, 2, 1]
+    assert best['ask'].tolist() == [4180, 4180, 4150]
+    assert best['ask_source'].tolist() == [1, 1, 2]
+
+    # without sources there are no buckets
+    assert {name: column.tolist() for name, column in analytics.best_of_sources([], grid, 3600).items()} == {
+        'times': [], 'bid': [], 'bid_source': [], 'ask': [], 'ask_source': [],
+    }
+
+
+def test_analytics_services_are_cached_by_version():
+
+    """
+        Unit test for testing that analytics results are cached until the rates change
+    """
+
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    monobank = Source.objects.create(code_name=const.CODE_NAME_MONOBANK, name='MonoBank')
+    Rate.objects.create(source=privatbank, currency_name='USD', bid='41.20', ask='41.80', created=at(10, 30))
+    Rate.objects.create(source=monobank, currency_name='USD', bid='41.30', ask='41.70', created=at(11, 30))
+
+    result = get_rate_analytics(privatbank.id, 'USD', at(10), at(12), window=2)
+    assert result['bid'] == [41.2, 41.2]
+    assert result['spread'] == pytest.approx([0.6, 0.6])
+    assert result['bid_mean'] == [None, 41.2]
+    assert result['volatility'] == [None, None]
+
+    best = get_best_rates('USD', at(10), at(12))
+    assert (best['bid'], best['bid_source'], best['ask'], best['ask_source']) == (
+        [41.2, 41.3], [privatbank.id, monobank.id], [41.8, 41.7], [privatbank.id, monobank.id],
+    )
+
+    # a cached result costs the query of the version only
+    with CaptureQueriesContext(connection) as captured:
+        assert get_rate_analytics(privatbank.id, 'USD', at(10), at(12), window=2) == result
+    assert len([query for query in captured if not query['sql'].startswith('EXPLAIN')]) == 1
+
+    # a new rate of the pair changes the version
+    Rate.objects.create(source=privatbank, currency_name='USD', bid='41.50', ask='42.00', created=at(11, 45))
+    assert get_rate_analytics(privatbank.id, 'USD', at(10), at(12), window=2)['bid'] == [41.2, 41.5]
+
+
+def test_best_rates_without_sources():
+
+    """
+        Unit test for testing best rates when there are no sources
+    """
+
+    Source.objects.all().delete()
+    assert get_best_rates('USD', at(10), at(12)) == {
+        'times': [], 'bid': [], 'bid_source': [], 'ask': [], 'ask_source': [],
+    }
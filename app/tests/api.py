@@ -1,4 +1,7 @@
-from currency.models import Source
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from currency.models import Rate, Source
 
 # from rest_framework.test import APIClient
 
@@ -83,3 +86,83 @@ def test_delete_valid(api_client_auth):
     json_data = {}
     response = api_client_auth.delete(url, data=json_data)
     assert response.status_code == 405
+
+
+def test_latest_rates(api_client_auth, django_capture_on_commit_callbacks):
+
+    """
+        Unit test for latest rates, a rate created with API is there at once
+    """
+
+    url = '/api/latest-rates/'
+    assert api_client_auth.get(url).json() == []
+
+    source = Source.objects.first()
+    # the cache of latest rates is dropped, when the transaction of the rate is committed
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client_auth.post('/api/rates/', data={'ask': '26.90', 'bid': '26.50', 'source': source.id})
+    assert response.status_code == 201
+
+    response = api_client_auth.get(url)
+    assert response.status_code == 200
+    assert response.json() == [{
+        'ask': '26.90',
+        'bid': '26.50',
+        'currency_name': 'USD',
+        'source_obj': {'id': source.id, 'name': source.name, 'logo': None},
+        'created': response.json()[0]['created'],
+    }]
+
+
+def test_rates_cursor_pagination(api_client_auth):
+
+    """
+        Unit test for the cursor pagination of rates: pages follow (created, id), rates of one moment are not lost
+    """
+
+    source = Source.objects.first()
+    start = datetime(2026, 10, 1, tzinfo=dt_timezone.utc)
+    # по три курса на каждый момент: порядок внутри момента решает id; ask у каждого курса свой
+    Rate.objects.bulk_create([
+        Rate(source=source, currency_name='USD', bid=Decimal(40 + number % 7), ask=Decimal(50 + number),
+             created=start + timedelta(minutes=number // 3))
+        for number in range(12)
+    ])
+    rates = list(Rate.objects.filter(created__gte=start))
+    url = '/api/rates/'
+
+    def walk(response, link):
+        asks = []
+        while True:
+            assert response.status_code == 200
+            assert 'count' not in response.json()
+            asks.extend(Decimal(rate['ask']) for rate in response.json()['results'])
+            if response.json()[link] is None:
+                return asks
+            response = api_client_auth.get(response.json()[link])
+
+    newest_first = sorted(rates, key=lambda rate: (rate.created, rate.id), reverse=True)
+    first = api_client_auth.get(url, {'pagination': 'cursor', 'page_size': 5})
+    assert first.json()['previous'] is None
+    assert walk(first, 'next') == [rate.ask for rate in newest_first]
+
+    # обратно по ссылкам previous с последней страницы
+    last = api_client_auth.get(url, {'pagination': 'cursor', 'page_size': 5})
+    while last.json()['next'] is not None:
+        last = api_client_auth.get(last.json()['next'])
+    assert walk(last, 'previous') == [
+        rate.ask
+        for page in (newest_first[10:], newest_first[5:10], newest_first[:5])
+        for rate in page
+    ]
+
+    # ordering and filters work with the cursor
+    params = {'pagination': 'cursor', 'page_size': 4, 'ordering': 'bid', 'bid__gte': 42}
+    by_bid = walk(api_client_auth.get(url, params), 'next')
+    assert by_bid == [
+        rate.ask for rate in sorted(rates, key=lambda rate: (rate.bid, rate.created, rate.id)) if rate.bid >= 42
+    ]
+
+    response = api_client_auth.get(url, {'pagination': 'cursor', 'count': 'estimate'})
+    assert response.json()['estimated_count'] is None
+    assert api_client_auth.get(url, {'cursor': 'broken'}).status_code == 404
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import threading
+from datetime import date
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from currency import const
+from currency.backfill import load_checkpoint, parse_archive, save_checkpoint
+from currency.models import Rate
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+import pytest
+
+ARCHIVE_FIXTURES = Path(__file__).parent / 'fixtures' / 'privatbank_archive'
+
+
+@pytest.fixture
+def archive_server():
+
+    """
+        Local stand-in of the archive API, serves recorded responses by date
+
+        Days, added to the unavailable set, are answered with 503
+    """
+
+    requested = []
+    unavailable = set()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            day = parse_qs(urlparse(self.path).query)['date'][0]
+            requested.append(day)
+            if day in unavailable:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            recorded = ARCHIVE_FIXTURES / f'{day}.json'
+            if not recorded.exists():
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            body = recorded.read_bytes()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f'http://127.0.0.1:{server.server_port}/p24api/exchange_rates', requested, unavailable
+
+    server.shutdown()
+    server.server_close()
+
+
+def backfill(base_url, checkpoint, *args):
+    call_command(
+        'parse_privatbank_archive',
+        f'--base-url={base_url}',
+        f'--checkpoint={checkpoint}',
+        '--retries=0',
+        '--window=2',
+        *args,
+    )
+
+
+def archive_rates():
+    return Rate.objects \
+        .filter(source__code_name=const.CODE_NAME_PRIVATBANK) \
+        .order_by('created', 'currency_name') \
+        .values_list('created__date', 'currency_name', 'bid', 'ask')
+
+
+def test_parse_archive_skips_rates_without_bank_rate():
+
+    """
+        Unit test for testing that archive currencies without bank rates are skipped
+    """
+
+    payload = json.loads((ARCHIVE_FIXTURES / '01.12.2014.json').read_text())
+
+    assert parse_archive(payload) == [
+        ('EUR', Decimal('19.10'), Decimal('19.65')),
+        ('USD', Decimal('15.35'), Decimal('15.70')),
+    ]
+
+
+def test_backfill_is_repeatable(archive_server, tmp_path):
+
+    """
+        Unit test for testing that a repeated backfill does not duplicate rates
+    """
+
+    base_url, requested, _ = archive_server
+    checkpoint = tmp_path / 'checkpoint.json'
+
+    backfill(base_url, checkpoint, '--start=2014-12-01', '--end=2014-12-03')
+
+    assert sorted(requested) == ['01.12.2014', '02.12.2014', '03.12.2014']
+    assert list(archive_rates()) == [
+        (date(2014, 12, 1), 'EUR', Decimal('19.10'), Decimal('19.65')),
+        (date(2014, 12, 1), 'USD', Decimal('15.35'), Decimal('15.70')),
+        (date(2014, 12, 2), 'EUR', Decimal('19.15'), Decimal('19.70')),
+        (date(2014, 12, 2), 'USD', Decimal('15.40'), Decimal('15.75')),
+        (date(2014, 12, 3), 'EUR', Decimal('19.05'), Decimal('19.55')),
+        (date(2014, 12, 3), 'USD', Decimal('15.40'), Decimal('15.75')),
+    ]
+    assert load_checkpoint(checkpoint, date(2014, 12, 1), date(2014, 12, 3), base_url) == date(2014, 12, 3)
+
+    # without the checkpoint saved days are neither fetched nor duplicated
+    backfill(base_url, tmp_path / 'other.json', '--start=2014-12-01', '--end=2014-12-03')
+    assert len(requested) == 3
+    assert archive_rates().count() == 6
+
+
+def test_backfill_resumes_from_checkpoint(archive_server, tmp_path, capsys):
+
+    """
+        Unit test for testing that an interrupted backfill continues from its checkpoint
+    """
+
+    base_url, requested, unavailable = archive_server
+    checkpoint = tmp_path / 'checkpoint.json'
+
+    # 03.12.2014 is unavailable, the second window fails
+    unavailable.add('03.12.2014')
+    with pytest.raises(CommandError):
+        backfill(base_url, checkpoint, '--start=2014-12-01', '--end=2014-12-03')
+
+    assert load_checkpoint(checkpoint, date(2014, 12, 1), date(2014, 12, 3), base_url) == date(2014, 12, 2)
+    assert archive_rates().count() == 4
+
+    unavailable.clear()
+    requested.clear()
+    backfill(base_url, checkpoint, '--start=2014-12-01', '--end=2014-12-03')
+
+    assert requested == ['03.12.2014']
+    assert archive_rates().count() == 6
+    assert 'Resumed from 2014-12-03' in capsys.readouterr().out
+
+
+def test_checkpoint_of_another_run_is_ignored(archive_server, tmp_path, capsys):
+
+    """
+        Unit test for testing that a checkpoint of another range or url is not resumed from
+    """
+
+    base_url, requested, _ = archive_server
+    checkpoint = tmp_path / 'checkpoint.json'
+    start, end = date(2014, 12, 1), date(2014, 12, 3)
+
+    save_checkpoint(checkpoint, date(2014, 12, 2), start, end, base_url)
+    assert load_checkpoint(checkpoint, start, end, base_url) == date(2014, 12, 2)
+    assert load_checkpoint(checkpoint, start, date(2014, 12, 4), base_url) is None
+    assert load_checkpoint(checkpoint, start, end, 'https://example.com/archive') is None
+
+    # a last day outside of the range is not resumed from either
+    save_checkpoint(checkpoint, date(2014, 11, 30), start, end, base_url)
+    assert load_checkpoint(checkpoint, start, end, base_url) is None
+
+    # the checkpoint of 01.12 - 03.12 does not skip the days of 02.12 - 03.12
+    save_checkpoint(checkpoint, date(2014, 12, 3), start, end, base_url)
+    backfill(base_url, checkpoint, '--start=2014-12-02', '--end=2014-12-03')
+
+    assert sorted(requested) == ['02.12.2014', '03.12.2014']
+    assert 'Resumed from' not in capsys.readouterr().out
+    assert load_checkpoint(checkpoint, date(2014, 12, 2), end, base_url) == end
+
+
+@pytest.mark.parametrize('error', [asyncio.TimeoutError(), ValueError('Expecting value')])
+def test_backfill_failure_is_reported(archive_server, tmp_path, mocker, error):
+
+    """
+        Unit test for testing that timeouts and broken archives are reported as command errors
+    """
+
+    base_url, _, _ = archive_server
+    mocker.patch('currency.backfill.fetch_days', side_effect=error)
+
+    with pytest.raises(CommandError, match='rerun to continue from the checkpoint'):
+        backfill(base_url, tmp_path / 'checkpoint.json', '--start=2014-12-01', '--end=2014-12-03')
+
+
+def test_backfill_dry_run(archive_server, tmp_path, capsys):
+
+    """
+        Unit test for testing that a dry run fetches the archive, but saves nothing
+    """
+
+    base_url, requested, _ = archive_server
+    checkpoint = tmp_path / 'checkpoint.json'
+
+    backfill(base_url, checkpoint, '--start=2014-12-01', '--end=2014-12-03', '--dry-run')
+
+    assert len(requested) == 3
+    assert archive_rates().count() == 0
+    assert not checkpoint.exists()
+    assert 'requests: 3, rates: 6, created: 0' in capsys.readouterr().out
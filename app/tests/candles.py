@@ -0,0 +1,133 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from currency import const
+from currency import model_choices as choices
+from currency.models import LatestRate, Rate, RateCandle, Source
+from currency.services import insert_changed_rates
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def at(day, hour, minute=0):
+    return datetime(2026, 10, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+def candles(period=choices.PERIOD_HOUR):
+    return {
+        candle.start: (candle.bid_open, candle.bid_high, candle.bid_low, candle.bid_close, candle.count)
+        for candle in RateCandle.objects.filter(period=period)
+    }
+
+
+def test_candles_are_maintained_on_write():
+
+    """
+        Unit test for testing that candles follow creates, edits and deletes of rates
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+
+    Rate.objects.create(source=source, currency_name='USD', bid='41.20', ask='41.80', created=at(1, 10, 30))
+    low = Rate.objects.create(source=source, currency_name='USD', bid='41.00', ask='41.60', created=at(1, 10, 45))
+    # a rate may come late, open is taken by time
+    Rate.objects.create(source=source, currency_name='USD', bid='41.10', ask='41.70', created=at(1, 10, 5))
+    insert_changed_rates([(source.id, 'USD', Decimal('41.30'), Decimal('41.90'))], now=at(1, 11, 15))
+
+    assert candles() == {
+        at(1, 10): (Decimal('41.10'), Decimal('41.20'), Decimal('41.00'), Decimal('41.00'), 3),
+        at(1, 11): (Decimal('41.30'), Decimal('41.30'), Decimal('41.30'), Decimal('41.30'), 1),
+    }
+    day = RateCandle.objects.get(period=choices.PERIOD_DAY)
+    assert (day.start, day.ask_open, day.ask_high, day.ask_close, day.count) == (
+        at(1, 0), Decimal('41.70'), Decimal('41.90'), Decimal('41.90'), 4,
+    )
+
+    # a changed or deleted rate can not be taken back, its day is counted again
+    low.bid = '41.25'
+    low.save()
+    assert candles()[at(1, 10)] == (Decimal('41.10'), Decimal('41.25'), Decimal('41.10'), Decimal('41.25'), 3)
+
+    Rate.objects.filter(created__gte=at(1, 11)).delete()
+    assert list(candles()) == [at(1, 10)]
+
+    # the rebuild from the history gives the same candles
+    expected = candles(), candles(choices.PERIOD_DAY)
+    RateCandle.objects.all().delete()
+    call_command('rebuild_rate_candles', '--start=2026-10-01', '--end=2026-10-02')
+    assert (candles(), candles(choices.PERIOD_DAY)) == expected
+
+
+def test_candles_api(api_client):
+
+    """
+        Unit test for testing getting candles from API
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    for day, bid in ((1, '41.20'), (2, '41.30'), (3, '41.40')):
+        Rate.objects.create(source=source, currency_name='USD', bid=bid, ask='42.00', created=at(day, 9))
+
+    url = '/api/candles/'
+    response = api_client.get(url, {
+        'source': source.id,
+        'currency_name': 'USD',
+        'period': choices.PERIOD_DAY,
+        'date_from': '2026-10-02',
+        'date_to': '2026-10-03',
+    })
+    assert response.status_code == 200
+    assert [(candle['start'], candle['bid_close'], candle['count']) for candle in response.json()] == [
+        ('2026-10-02T00:00:00Z', '41.30', 1),
+        ('2026-10-03T00:00:00Z', '41.40', 1),
+    ]
+
+    # the pair and the period are required, the candles are read by the index only
+    assert api_client.get(url, {'source': source.id, 'period': choices.PERIOD_DAY}).status_code == 400
+
+    # so is a bounded date range
+    params = {'source': source.id, 'currency_name': 'USD', 'period': choices.PERIOD_HOUR}
+    for date_from, date_to, status_code in (
+        (None, '2026-10-03', 400),
+        ('2026-10-01', None, 400),
+        ('2026-10-03', '2026-10-01', 400),
+        ('2026-10-01', '2026-10-31', 200),
+        ('2026-10-01', '2026-11-01', 400),
+    ):
+        dates = {key: value for key, value in (('date_from', date_from), ('date_to', date_to)) if value}
+        assert api_client.get(url, {**params, **dates}).status_code == status_code
+    assert api_client.get(url, {
+        **params, 'period': choices.PERIOD_DAY, 'date_from': '2025-10-01', 'date_to': '2026-10-31',
+    }).status_code == 200
+
+
+def test_bulk_delete_recomputes_once_per_pair_and_day():
+
+    """
+        Unit test for testing that a bulk delete recomputes every pair and day once
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    Rate.objects.bulk_create([
+        Rate(source=source, currency_name='USD', bid='41.00', ask='41.50', created=at(1, minute // 60, minute % 60))
+        for minute in range(0, 24 * 60, 2)
+    ] + [Rate(source=source, currency_name='USD', bid='41.10', ask='41.60', created=at(2, 9))])
+    LatestRate.objects.refresh(source.id, 'USD')
+    call_command('rebuild_rate_candles', '--start=2026-10-01', '--end=2026-10-02')
+
+    # 720 rates of a day: the pair and the day are recomputed once, not per rate
+    with CaptureQueriesContext(connection) as captured:
+        assert Rate.objects.filter(created__lt=at(2, 0)).delete()[0] == 720
+    # the collector deletes the rows in batches of 100 ids, besides them the queries do not depend on the rows
+    assert len([query for query in captured if not query['sql'].startswith(('EXPLAIN', 'DELETE'))]) < 20
+
+    assert list(candles(choices.PERIOD_DAY)) == [at(2, 0)]
+    assert LatestRate.objects.get(source=source, currency_name='USD').rate.created == at(2, 9)
+
+    # a cascade delete of the source does not recompute its pairs, they are deleted with it
+    with CaptureQueriesContext(connection) as captured:
+        source.delete()
+    assert len([query for query in captured if not query['sql'].startswith(('EXPLAIN', 'DELETE'))]) < 20
+    assert not RateCandle.objects.exists() and not LatestRate.objects.exists()
@@ -1,4 +1,11 @@
 import pytest
+
+from currency import fetch_cache
+from currency import latest_cache
+from currency import rate_state
+from currency import routers
+
+from django.core.cache import cache
 from django.core.management import call_command  # noqa
 
 from rest_framework.test import APIClient
@@ -17,6 +24,24 @@ def load_fixtures(django_db_setup, django_db_blocker):
         call_command('loaddata', 'app/tests/fixtures/sources.json')
 
 
+@pytest.fixture(autouse=True, scope='function')
+def reset_parsers_state():
+    """
+    in-memory last rates and payloads of parsers and cached states must not outlive the test database
+    """
+    rate_state.reset()
+    fetch_cache.reset()
+    latest_cache.reset()
+    routers.reset()
+    cache.clear()
+    yield
+    rate_state.reset()
+    fetch_cache.reset()
+    latest_cache.reset()
+    routers.reset()
+    cache.clear()
+
+
 @pytest.fixture(scope='function')
 def api_client():
 
@@ -0,0 +1,85 @@
+from currency import db_connections
+from currency import metrics
+from currency.db_backends.sqlite3.base import DatabaseWrapper
+
+from django.db import connections
+
+import pytest
+
+
+@pytest.fixture
+def probe(tmp_path):
+
+    """
+        Connection to a file database: the in-memory test database is never closed
+    """
+
+    settings_dict = {**connections['default'].settings_dict, 'NAME': str(tmp_path / 'probe.sqlite3')}
+    wrapper = DatabaseWrapper(settings_dict, alias='probe')
+    metrics.reset()
+    yield wrapper
+    wrapper.close()
+    metrics.reset()
+
+
+def counter(name):
+    return metrics.snapshot()['counters'].get(name, {}).get('probe', 0)
+
+
+def test_connections_are_counted_and_capped(probe, settings):
+
+    """
+        Unit test for testing that open connections are counted and capped per process
+    """
+
+    settings.DATABASE_PROCESS_MAX_CONNECTIONS = 1
+
+    probe.ensure_connection()
+    assert db_connections.open_count('probe') == 1
+    assert counter(db_connections.OPENED) == 1
+    assert metrics.snapshot()['timings'][db_connections.OPEN_LATENCY]['probe']['count'] == 1
+
+    # постоянное соединение в пределах лимита остается открытым
+    db_connections.check(probe)
+    db_connections.release(probe)
+    assert probe.connection is not None
+
+    settings.DATABASE_PROCESS_MAX_CONNECTIONS = 0
+    db_connections.release(probe)
+    assert probe.connection is None
+    assert db_connections.open_count('probe') == 0
+    assert (counter(db_connections.CLOSED), counter(db_connections.CLOSED_CAPPED)) == (1, 1)
+
+
+def test_unusable_and_obsolete_connections_are_closed(probe, monkeypatch):
+
+    """
+        Unit test for testing that broken and old connections are closed before reuse
+    """
+
+    probe.ensure_connection()
+    monkeypatch.setattr(probe, 'is_usable', lambda: False)
+    db_connections.check(probe)
+    assert probe.connection is None
+    assert counter(db_connections.CLOSED_UNUSABLE) == 1
+
+    # запрос откроет новое соединение
+    monkeypatch.undo()
+    probe.settings_dict['CONN_MAX_AGE'] = 0
+    probe.ensure_connection()
+    assert counter(db_connections.OPENED) == 2
+    db_connections.check(probe)
+    assert probe.connection is None
+
+
+def test_db_stats(api_client):
+
+    """
+        Unit test for testing getting database connection stats from API
+    """
+
+    stats = api_client.get('/api/db-stats/').json()['databases']
+    assert set(stats) == {'default', 'replica'}
+    assert set(stats['default']) == {
+        'open', 'opened', 'closed', 'closed_unusable', 'closed_capped', 'connect_latency',
+    }
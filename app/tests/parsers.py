@@ -0,0 +1,714 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+
+from currency import breaker
+from currency import const
+from currency import fetch_cache
+from currency import html_extract
+from currency import metrics
+from currency import rate_state
+from currency import scheduler
+from currency.locks import CacheLock
+from currency.models import LatestRate, Rate, Source
+from currency.parsers import (
+    PARSERS,
+    ParserSpec,
+    RateRecord,
+    allowed_specs,
+    fetch,
+    make_session,
+    make_tasks,
+    normalize,
+    parse_source,
+    run_parsers,
+    save_rates,
+    write_rates,
+)
+from currency.services import check_returning, insert_changed_rates
+from currency.tasks import run_parsing
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import pytest
+
+PRIVATBANK_URL = 'https://api.privatbank.ua/p24api/pubinfo?json&exchange&coursid=5'
+
+HTML_FIXTURES = Path(__file__).parent / 'fixtures' / 'html'
+
+
+class FakeResponse:
+
+    def __init__(self, payload, status=200, headers=None):
+        self.payload = payload
+        self.status = status
+        self.headers = headers or {}
+        self.charset = 'utf-8'
+
+    async def read(self):
+        if isinstance(self.payload, str):
+            return self.payload.encode()
+        return json.dumps(self.payload).encode()
+
+    async def json(self, content_type=None):
+        return self.payload
+
+    async def text(self):
+        return self.payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeSession:
+
+    """
+        Session stand-in, that returns prepared payloads by url
+
+        If etag is set, it is sent with every response and 304 is returned
+        when the request has the same If-None-Match
+    """
+
+    def __init__(self, payloads, etag=None):
+        self.payloads = payloads
+        self.etag = etag
+        self.requested_urls = []
+        self.requested_headers = []
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requested_urls.append(url)
+        self.requested_headers.append(headers)
+
+        if self.etag is None:
+            return FakeResponse(self.payloads[url])
+        if headers.get('If-None-Match') == self.etag:
+            return FakeResponse(None, status=304, headers={'ETag': self.etag})
+        return FakeResponse(self.payloads[url], headers={'ETag': self.etag})
+
+
+@override_settings(
+    PARSER_CONNECT_TIMEOUT=1,
+    PARSER_READ_TIMEOUT=2,
+    PARSER_CONNECTIONS_LIMIT_PER_HOST=3,
+    PARSER_DNS_CACHE_TTL=60,
+)
+def test_make_session():
+
+    """
+        Unit test for testing that the HTTP session takes its limits from settings
+    """
+
+    async def check():
+        async with make_session() as session:
+            assert session.timeout.sock_connect == 1
+            assert session.timeout.sock_read == 2
+            assert session.connector.limit_per_host == 3
+
+    asyncio.run(check())
+
+
+def test_make_tasks_share_session():
+
+    """
+        Unit test for testing that parser tasks share one session
+    """
+
+    async def check():
+        session = FakeSession({})
+        tasks = make_tasks(session, asyncio.Queue())
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return session
+
+    session = async_to_sync(check)()
+    # every parser has made at least one request with the shared session
+    assert len(session.requested_urls) >= 5
+
+
+def test_run_parsers_privatbank():
+
+    """
+        Unit test for testing a parsing run of PrivatBank
+    """
+
+    metrics.reset()
+    session = FakeSession({PRIVATBANK_URL: [
+        {"ccy": "USD", "base_ccy": "UAH", "buy": "26.50000", "sale": "26.90000"},
+        {"ccy": "EUR", "base_ccy": "UAH", "buy": "30.95000", "sale": "31.55000"},
+    ]})
+    initial_count_rate = Rate.objects.count()
+
+    result = async_to_sync(run_parsers)(session)
+    assert Rate.objects.count() == initial_count_rate + 2
+    assert result['created'] == 2
+    # other sources are not in the fake session
+    assert len(result['errors']) == 4
+
+    # the sources are not due yet, the scheduler skips all of them
+    result = async_to_sync(run_parsers)(session)
+    assert result['polled'] == []
+
+    result = async_to_sync(run_parsers)(session, [PARSERS[const.CODE_NAME_PRIVATBANK]])
+    assert Rate.objects.count() == initial_count_rate + 2
+    assert result['created'] == 0
+
+    stats = metrics.snapshot()
+    assert stats['timings']['fetch_latency'][const.CODE_NAME_PRIVATBANK]['count'] == 2
+    # the second payload is the same, so it is not normalized again
+    assert stats['timings']['normalize_time'][const.CODE_NAME_PRIVATBANK]['count'] == 1
+    assert stats['timings']['stage_write']['run']['count'] == 3
+
+
+def test_write_rates_skips_unchanged_rates():
+
+    """
+        Unit test for testing that the writer saves only changed rates
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    insert_changed_rates([(source.id, 'USD', Decimal('26.50'), Decimal('26.90'))])
+    insert_changed_rates([(source.id, 'USD', Decimal('26.60'), Decimal('26.90'))])
+
+    state = rate_state.load()
+    assert state[(const.CODE_NAME_PRIVATBANK, 'USD')] == (Decimal('26.60'), Decimal('26.90'))
+
+    async def write(*records):
+        queue = asyncio.Queue()
+        for record in records:
+            queue.put_nowait(record)
+        queue.put_nowait(None)
+        return await write_rates(queue)
+
+    unchanged = RateRecord(const.CODE_NAME_PRIVATBANK, 'USD', Decimal('26.60'), Decimal('26.90'))
+    changed = RateRecord(const.CODE_NAME_PRIVATBANK, 'USD', Decimal('26.70'), Decimal('26.90'))
+
+    # unchanged rate costs only the reload of the last rates, nothing is written
+    with CaptureQueriesContext(connection) as queries:
+        assert async_to_sync(write)(unchanged) == []
+    assert [query['sql'].split()[0] for query in queries] in (['SELECT'], ['SELECT', 'EXPLAIN'])
+
+    initial_count_rate = Rate.objects.count()
+    assert async_to_sync(write)(changed, unchanged, changed) == [changed]
+    assert Rate.objects.count() == initial_count_rate + 1
+    assert not rate_state.is_changed(*changed)
+
+
+def test_insert_changed_rates():
+
+    """
+        Unit test for testing that only changed rates are inserted
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    initial_count_rate = Rate.objects.count()
+
+    rows = [
+        (source.id, 'USD', Decimal('26.50'), Decimal('26.90')),
+        (source.id, 'EUR', Decimal('30.95'), Decimal('31.55')),
+    ]
+    assert sorted(insert_changed_rates(rows)) == [(source.id, 'EUR'), (source.id, 'USD')]
+    assert Rate.objects.count() == initial_count_rate + 2
+
+    # the same rates are not inserted again, only the changed one is
+    rows[1] = (source.id, 'EUR', Decimal('30.95'), Decimal('31.60'))
+    assert insert_changed_rates(rows) == [(source.id, 'EUR')]
+    assert Rate.objects.count() == initial_count_rate + 3
+
+    latest = LatestRate.objects.get(source=source, currency_name='EUR')
+    assert (latest.bid, latest.ask) == (Decimal('30.95'), Decimal('31.60'))
+    assert latest.rate == Rate.objects.filter(source=source).latest('id')
+    assert latest.rate.ask == Decimal('31.60')
+
+
+def test_insert_changed_rates_requires_returning(mocker):
+
+    """
+        Unit test for testing that an old SQLite is reported clearly
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    mocker.patch('currency.services.sqlite3.sqlite_version_info', (3, 31, 1))
+    check_returning.cache_clear()
+
+    try:
+        with pytest.raises(ImproperlyConfigured, match='SQLite 3.35'):
+            insert_changed_rates([(source.id, 'USD', Decimal('26.50'), Decimal('26.90'))])
+        # other databases are not checked
+        check_returning('postgresql')
+    finally:
+        check_returning.cache_clear()
+
+
+def test_stale_worker_state_does_not_duplicate_rates():
+
+    """
+        Unit test for testing that a stale worker does not insert a rate twice
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    record = RateRecord(const.CODE_NAME_PRIVATBANK, 'USD', Decimal('26.50'), Decimal('26.90'))
+
+    # the state of this worker is loaded before another worker writes the rate
+    rate_state.load()
+    assert rate_state.is_changed(*record)
+    insert_changed_rates([(source.id, 'USD', record.bid, record.ask)])
+    initial_count_rate = Rate.objects.count()
+
+    assert save_rates([record]) == []
+    assert Rate.objects.count() == initial_count_rate
+
+
+def test_fetch_skips_unchanged_payloads():
+
+    """
+        Unit test for testing that unchanged payloads are skipped
+    """
+
+    metrics.reset()
+    payload = [{"ccy": "USD", "base_ccy": "UAH", "buy": "26.50000", "sale": "26.90000"}]
+
+    async def poll(session):
+        return await fetch(session, const.CODE_NAME_PRIVATBANK, PRIVATBANK_URL)
+
+    # the same body is skipped by its hash
+    session = FakeSession({PRIVATBANK_URL: payload})
+    assert async_to_sync(poll)(session) == payload
+    assert async_to_sync(poll)(session) is None
+    assert session.requested_headers == [{}, {}]
+
+    # a changed body is processed again
+    payload = [{"ccy": "USD", "base_ccy": "UAH", "buy": "26.60000", "sale": "26.90000"}]
+    session.payloads[PRIVATBANK_URL] = payload
+    assert async_to_sync(poll)(session) == payload
+
+    # the source supports etag, so it answers 304
+    fetch_cache.reset()
+    session = FakeSession({PRIVATBANK_URL: payload}, etag='"v1"')
+    assert async_to_sync(poll)(session) == payload
+    assert async_to_sync(poll)(session) is None
+    assert session.requested_headers[1] == {'If-None-Match': '"v1"'}
+
+    counters = metrics.snapshot()['counters']
+    assert counters['polls_processed'][const.CODE_NAME_PRIVATBANK] == 3
+    assert counters['polls_skipped'][const.CODE_NAME_PRIVATBANK] == 2
+    assert counters['polls_not_modified'][const.CODE_NAME_PRIVATBANK] == 1
+
+
+def test_unprocessed_payload_is_not_skipped():
+
+    """
+        Unit test for testing that a payload, that failed to process, is polled again
+    """
+
+    metrics.reset()
+    spec = ParserSpec(
+        code_name=const.CODE_NAME_PRIVATBANK,
+        name='PrivatBank',
+        urls={None: PRIVATBANK_URL},
+        extractor=lambda payload, key, currencies: [(rate['ccy'], rate['buy'], rate['sale']) for rate in payload],
+        currency_map={'USD': 'USD'},
+    )
+
+    # a broken 200 is not remembered, the next poll of the same body fails again instead of being skipped
+    session = FakeSession({PRIVATBANK_URL: 'not json'})
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            async_to_sync(parse_source)(spec, session, asyncio.Queue())
+
+    # so is a payload, that could not be normalized
+    session.payloads[PRIVATBANK_URL] = [{"ccy": "USD"}]
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            async_to_sync(parse_source)(spec, session, asyncio.Queue())
+
+    # a processed payload is skipped by the next poll
+    session.payloads[PRIVATBANK_URL] = [{"ccy": "USD", "buy": "26.50000", "sale": "26.90000"}]
+    assert async_to_sync(parse_source)(spec, session, asyncio.Queue()) == 1
+    assert async_to_sync(parse_source)(spec, session, asyncio.Queue()) == 0
+
+    counters = metrics.snapshot()['counters']
+    assert counters['polls_processed'][const.CODE_NAME_PRIVATBANK] == 3
+    assert counters['polls_skipped'][const.CODE_NAME_PRIVATBANK] == 1
+
+
+@pytest.mark.parametrize('mode', ['stream', 'soup'])
+def test_extract_html_pages(mode):
+
+    """
+        Unit test for testing extraction of rates from html pages
+    """
+
+    minfin_usd = (HTML_FIXTURES / 'minfin_usd.html').read_text(encoding='utf-8')
+    pumb = (HTML_FIXTURES / 'pumb.html').read_text(encoding='utf-8')
+
+    with override_settings(PARSER_HTML_EXTRACTION=mode):
+        assert normalize(PARSERS[const.CODE_NAME_MINFIN], 'USD', minfin_usd) == [
+            (const.CODE_NAME_MINFIN, 'USD', Decimal('41.31'), Decimal('41.74')),
+        ]
+        assert normalize(PARSERS[const.CODE_NAME_PUMB], None, pumb) == [
+            (const.CODE_NAME_PUMB, 'USD', Decimal('41.05'), Decimal('41.55')),
+            (const.CODE_NAME_PUMB, 'EUR', Decimal('47.10'), Decimal('47.90')),
+        ]
+
+
+def test_stream_extraction_stops_at_target():
+
+    """
+        Unit test for testing that stream extraction stops at the rates table
+    """
+
+    tail = '<table><tr><td>USD</td><td>1</td><td>2</td></tr></table>' * 10_000
+    html = (
+        '<p><span>skip</span></p><table><tr><td data-title="Средний курс">'
+        '41.10<span>+0.1</span>\n<br>41.50<span><span>-0.2</span></span></td></tr></table>'
+    )
+
+    parser = html_extract.MinfinAverageParser()
+    assert parser.extract(html + tail) == '41.10\n41.50'
+    # parsing has stopped at the end of the cell, not at the end of the page
+    line, offset = parser.getpos()
+    assert line == 2
+    assert offset < 100
+
+    with pytest.raises(ValueError):
+        html_extract.minfin_average('<table></table>')
+
+
+def test_parser_registry():
+
+    """
+        Unit test for testing the registry of parsers
+    """
+
+    assert set(PARSERS) == {
+        const.CODE_NAME_PRIVATBANK,
+        const.CODE_NAME_MONOBANK,
+        const.CODE_NAME_VKURSE,
+        const.CODE_NAME_MINFIN,
+        const.CODE_NAME_PUMB,
+    }
+
+    monobank = normalize(PARSERS[const.CODE_NAME_MONOBANK], None, [
+        {'currencyCodeA': 840, 'currencyCodeB': 980, 'rateBuy': 23.3, 'rateSell': 23.5},
+        {'currencyCodeA': 978, 'currencyCodeB': 840, 'rateBuy': 1.1, 'rateSell': 1.2},
+        {'currencyCodeA': 124, 'currencyCodeB': 980, 'rateCross': 21.4523},
+    ])
+    assert monobank == [(const.CODE_NAME_MONOBANK, 'USD', Decimal('23.30'), Decimal('23.50'))]
+
+
+def test_parse_source_concurrency_and_timeout():
+
+    """
+        Unit test for testing concurrency and timeout of the urls of a source
+    """
+
+    urls = {'USD': 'https://example.com/usd', 'EUR': 'https://example.com/eur', 'GBP': 'https://example.com/gbp'}
+    spec = ParserSpec(
+        code_name='CODE_NAME_EXAMPLE',
+        name='Example',
+        urls=urls,
+        extractor=lambda payload, key, currencies: [(key, payload['buy'], payload['sale'])],
+        currency_map={'USD': 'USD', 'EUR': 'EUR'},
+        concurrency=2,
+        timeout=3,
+    )
+
+    class SlowSession(FakeSession):
+
+        active = 0
+        max_active = 0
+
+        def get(self, url, **kwargs):
+            assert kwargs['timeout'].total == 3
+            response = super().get(url, **kwargs)
+            session = self
+
+            class SlowResponse(FakeResponse):
+
+                async def __aenter__(self):
+                    session.active += 1
+                    session.max_active = max(session.max_active, session.active)
+                    await asyncio.sleep(0.01)
+                    session.active -= 1
+                    return self
+
+            return SlowResponse(response.payload)
+
+    session = SlowSession({url: {'buy': '1', 'sale': '2'} for url in urls.values()})
+    queue = asyncio.Queue()
+
+    assert async_to_sync(parse_source)(spec, session, queue) == 2
+    assert session.max_active == 2
+    assert {queue.get_nowait().currency_name for _ in range(2)} == {'USD', 'EUR'}
+
+
+@override_settings(
+    PARSER_MIN_POLL_INTERVAL=60,
+    PARSER_MAX_POLL_INTERVAL=600,
+    PARSER_POLL_SPEEDUP=0.5,
+    PARSER_POLL_SLOWDOWN=1.5,
+)
+def test_scheduler_adapts_poll_interval():
+
+    """
+        Unit test for testing that poll intervals follow the changes of sources
+    """
+
+    now = timezone.now()
+    specs = [PARSERS[const.CODE_NAME_PRIVATBANK], PARSERS[const.CODE_NAME_PUMB]]
+    assert scheduler.due_specs(specs, now) == specs
+
+    # unchanged source is polled less often, failing one backs off exponentially
+    scheduler.record_polls({
+        const.CODE_NAME_PRIVATBANK: (False, False),
+        const.CODE_NAME_PUMB: (False, True),
+    }, now)
+    scheduler.record_polls({const.CODE_NAME_PUMB: (False, True)}, now)
+
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    pumb = Source.objects.get(code_name=const.CODE_NAME_PUMB)
+    assert privatbank.poll_interval == 90
+    assert pumb.poll_interval == 240
+    assert pumb.failures == 2
+    assert pumb.error_ratio > 0
+
+    assert scheduler.due_specs(specs, now) == []
+    assert scheduler.due_specs(specs, now + timedelta(seconds=90)) == specs[:1]
+
+    # changed source is polled more often, but not faster than the minimum
+    scheduler.record_polls({const.CODE_NAME_PRIVATBANK: (True, False)}, now)
+    scheduler.record_polls({const.CODE_NAME_PRIVATBANK: (True, False)}, now)
+    privatbank.refresh_from_db()
+    assert privatbank.poll_interval == 60
+    assert privatbank.last_changed == now
+
+    assert scheduler.next_interval(500, False, 0) == 600
+    assert scheduler.next_interval(400, False, 3) == 600
+
+
+def test_next_poll_is_planned_from_the_run_start():
+
+    """
+        Unit test for testing that the next poll is planned from the start of the run
+    """
+
+    class SlowSession(FakeSession):
+
+        def get(self, url, **kwargs):
+            response = super().get(url, **kwargs)
+            read = response.read
+
+            async def slow_read():
+                await asyncio.sleep(0.2)
+                return await read()
+
+            response.read = slow_read
+            return response
+
+    session = SlowSession({PRIVATBANK_URL: [
+        {"ccy": "USD", "base_ccy": "UAH", "buy": "26.50000", "sale": "26.90000"},
+    ]})
+    before = timezone.now()
+    async_to_sync(run_parsers)(session, [PARSERS[const.CODE_NAME_PRIVATBANK]])
+
+    # the next beat, that comes one interval after the start of the run, finds the source due
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    planned_from = privatbank.next_poll - timedelta(seconds=privatbank.poll_interval)
+    assert before <= planned_from < before + timedelta(seconds=0.1)
+    assert scheduler.due_specs([PARSERS[const.CODE_NAME_PRIVATBANK]], planned_from + timedelta(
+        seconds=privatbank.poll_interval,
+    ))
+
+
+@override_settings(PARSER_BREAKER_THRESHOLD=2, PARSER_BREAKER_COOLDOWN=60)
+def test_circuit_breaker():
+
+    """
+        Unit test for testing that failing sources are skipped for a cooldown
+    """
+
+    circuit = breaker.CircuitBreaker(const.CODE_NAME_PUMB)
+    now = time.time()
+
+    circuit.record(True, now)
+    assert circuit.state(now) == breaker.STATE_CLOSED
+    circuit.record(True, now)
+    assert circuit.state(now) == breaker.STATE_OPEN
+    assert not circuit.allow(now)
+    assert allowed_specs([PARSERS[const.CODE_NAME_PUMB]]) == []
+
+    # after the cooldown only one probe is allowed
+    assert circuit.state(now + 60) == breaker.STATE_HALF_OPEN
+    assert circuit.allow(now + 60)
+    assert not circuit.allow(now + 60)
+
+    # failed probe opens the breaker again
+    circuit.record(True, now + 61)
+    assert circuit.state(now + 100) == breaker.STATE_OPEN
+
+    circuit.record(False, now + 200)
+    assert circuit.state(now + 200) == breaker.STATE_CLOSED
+    assert breaker.get_states([const.CODE_NAME_PUMB]) == {const.CODE_NAME_PUMB: breaker.STATE_CLOSED}
+
+
+def test_hedged_fetch():
+
+    """
+        Unit test for testing hedged requests to slow sources
+    """
+
+    metrics.reset()
+    payload = [{"ccy": "USD", "base_ccy": "UAH", "buy": "26.50000", "sale": "26.90000"}]
+
+    class HangingSession(FakeSession):
+
+        """
+            The first request hangs, the next ones answer at once
+        """
+
+        def get(self, url, **kwargs):
+            response = super().get(url, **kwargs)
+            if len(self.requested_urls) > 1:
+                return response
+
+            class HangingResponse(FakeResponse):
+
+                async def __aenter__(self):
+                    await asyncio.sleep(10)
+
+            return HangingResponse(response.payload)
+
+    session = HangingSession({PRIVATBANK_URL: payload})
+
+    async def poll():
+        return await fetch(session, const.CODE_NAME_PRIVATBANK, PRIVATBANK_URL, hedge_after=0.01)
+
+    assert async_to_sync(poll)() == payload
+    assert len(session.requested_urls) == 2
+
+    counters = metrics.snapshot()['counters']
+    assert counters['hedged_requests'][const.CODE_NAME_PRIVATBANK] == 1
+    assert counters['hedge_wins'][const.CODE_NAME_PRIVATBANK] == 1
+
+    # a cancelled fetch cancels its requests, before the hedge as well as after it
+    cancelled = []
+
+    class CancelledSession(FakeSession):
+
+        def get(self, url, **kwargs):
+
+            class WaitingResponse(FakeResponse):
+
+                async def __aenter__(self):
+                    try:
+                        await asyncio.sleep(10)
+                    except asyncio.CancelledError:
+                        cancelled.append(url)
+                        raise
+
+            return WaitingResponse(None)
+
+    async def cancel(hedge_after, requests):
+        task = asyncio.ensure_future(fetch(CancelledSession({}), const.CODE_NAME_PRIVATBANK, PRIVATBANK_URL,
+                                           hedge_after=hedge_after))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        assert len(cancelled) == requests
+        cancelled.clear()
+
+    async_to_sync(cancel)(5, 1)
+    async_to_sync(cancel)(0.01, 2)
+
+
+def test_source_deadline():
+
+    """
+        Unit test for testing that a slow source is cut by its deadline
+    """
+
+    metrics.reset()
+    spec = ParserSpec(
+        code_name=const.CODE_NAME_PRIVATBANK,
+        name='PrivatBank',
+        urls={None: PRIVATBANK_URL},
+        extractor=lambda payload, key, currencies: [],
+        currency_map={},
+        deadline=0.01,
+    )
+
+    class HangingSession(FakeSession):
+
+        def get(self, url, **kwargs):
+
+            class HangingResponse(FakeResponse):
+
+                async def __aenter__(self):
+                    await asyncio.sleep(10)
+
+            return HangingResponse(None)
+
+    result = async_to_sync(run_parsers)(HangingSession({}), [spec])
+    assert result['errors'] == ['TimeoutError()']
+    assert metrics.snapshot()['counters']['deadline_exceeded'][const.CODE_NAME_PRIVATBANK] == 1
+    assert Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK).failures == 1
+    assert breaker.CircuitBreaker(const.CODE_NAME_PRIVATBANK).get()['failures'] == 1
+
+
+def test_latency_percentiles():
+
+    """
+        Unit test for testing latency percentiles of metrics
+    """
+
+    metrics.reset()
+    for value in range(1, 101):
+        metrics.observe('fetch_latency', const.CODE_NAME_MONOBANK, value / 100)
+
+    latency = metrics.snapshot()['timings']['fetch_latency'][const.CODE_NAME_MONOBANK]
+    assert (latency['p50'], latency['p90'], latency['p99']) == (0.5, 0.9, 0.99)
+
+
+def test_run_parsing_single_flight(mocker):
+
+    """
+        Unit test for testing that overlapping parsing runs are skipped
+    """
+
+    async def fake_run_parsers():
+        # the lock is held while the run is going
+        assert CacheLock(const.CACHE_KEY_PARSING_LOCK, 60).is_locked()
+        return {'created': 0}
+
+    mocker.patch('currency.tasks.run_parsers', fake_run_parsers)
+
+    lock = CacheLock(const.CACHE_KEY_PARSING_LOCK, 60)
+    assert lock.acquire()
+    assert not CacheLock(const.CACHE_KEY_PARSING_LOCK, 60).acquire()
+
+    # overlapping run is skipped
+    assert run_parsing() == {'skipped': True}
+
+    lock.release()
+    assert run_parsing() == {'created': 0}
+    assert not lock.is_locked()
+
+    assert metrics.get_published()['shared'] == {
+        'runs_started': 1,
+        'runs_skipped': 1,
+        'runs_lease_exceeded': 0,
+    }
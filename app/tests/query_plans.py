@@ -0,0 +1,117 @@
+import re
+from decimal import Decimal
+
+from currency import rate_state
+from currency.backfill import saved_days
+from currency.management.commands.bench_latest_rates import Command as BenchCommand
+from currency.models import Rate, Source
+from currency.services import compute_latest_rates, get_latest_rates, insert_changed_rates, rebuild_latest_rates
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import pytest
+
+SEEDED_RATES = 20_000
+
+# Большие таблицы, их полный просмотр недопустим
+LARGE_TABLES = ('currency_rate', 'currency_ratecandle', 'currency_responselog')
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?! USING)')
+READ = re.compile(r'^(?:SCAN|SEARCH) (?:TABLE )?(\w+)')
+SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+@pytest.fixture
+def seeded_rates():
+    sources = [Source.objects.create(code_name=f'SEED_{number}', name=f'seed {number}') for number in range(5)]
+    BenchCommand.insert_rates(sources, 0, SEEDED_RATES)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return sources
+
+
+def full_scans(captured) -> list:
+
+    """
+        Queries, that read a large table without an index, with their plans
+
+        A query is reported, if it scans a large table or sorts the rows of a
+        large table, i.e. reads all of them to return the first page
+    """
+
+    scans = []
+    for query in captured:
+        sql = query['sql']
+        # silk adds EXPLAIN of every query
+        if sql.startswith('EXPLAIN'):
+            continue
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        tables = {match.group(1) for match in map(READ.match, plan) if match}
+        if not tables & set(LARGE_TABLES):
+            continue
+
+        scanned = any(
+            match and match.group(1) in LARGE_TABLES
+            for match in map(FULL_SCAN.match, plan)
+        )
+        if scanned or SORT in plan:
+            scans.append((sql, plan))
+
+    return scans
+
+
+def test_hot_queries_use_indexes(seeded_rates, client, api_client):
+
+    """
+        Unit test for testing that hot queries do not scan whole tables
+    """
+
+    source = seeded_rates[0]
+
+    with CaptureQueriesContext(connection) as captured:
+        # parsers
+        rate_state.load(force=True)
+        insert_changed_rates([(source.id, 'USD', Decimal('99.10'), Decimal('99.90'))])
+        Rate.objects.create(source=source, currency_name='EUR', bid='98.10', ask='98.90')
+        today = timezone.now().date()
+        saved_days(source, [today, today])
+
+        # services
+        compute_latest_rates()
+        rebuild_latest_rates()
+        get_latest_rates()
+
+        # RateListView, RateViewSet and the candles
+        assert client.get(reverse('currency:rate-list')).status_code == 200
+        assert client.get(reverse('currency:rate-list'), {'page': 3}).status_code == 200
+        assert api_client.get('/api/rates/').status_code == 200
+        assert api_client.get('/api/rates/', {'ordering': 'created', 'page': 2}).status_code == 200
+        next_page = api_client.get('/api/rates/', {'pagination': 'cursor'}).json()['next']
+        assert api_client.get(next_page).status_code == 200
+        candles = {
+            'source': source.id, 'currency_name': 'USD', 'period': 'day',
+            'date_from': '2020-01-01', 'date_to': '2029-12-31',
+        }
+        assert api_client.get('/api/candles/', candles).status_code == 200
+
+    assert len(captured) > 10
+    assert full_scans(captured) == []
+
+
+def test_full_scan_is_detected(seeded_rates):
+
+    """
+        Unit test for testing that a full table scan is detected
+    """
+
+    with CaptureQueriesContext(connection) as captured:
+        list(Rate.objects.filter(bid__gt=30).order_by('ask')[:10])
+
+    assert len(full_scans(captured)) == 1
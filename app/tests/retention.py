@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from currency import const
+from currency import model_choices as choices
+from currency import partitions
+from currency.models import LatestRate, Rate, RateCandle, Source
+from currency.retention import apply_retention
+
+from django.core.management import CommandError, call_command
+
+import pytest
+
+NOW = datetime(2026, 10, 17, 12, tzinfo=dt_timezone.utc)
+
+
+def at(day, hour, minute=0):
+    return datetime(2026, 9, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+def test_apply_retention():
+
+    """
+        Unit test for testing that old rates are downsampled into candles
+    """
+
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    monobank = Source.objects.create(code_name=const.CODE_NAME_MONOBANK, name='MonoBank')
+
+    for created, bid, ask in (
+        (at(1, 10, 30), '41.20', '41.80'),
+        (at(1, 10, 5), '41.10', '41.70'),
+        (at(1, 10, 50), '41.40', '41.90'),
+        (at(1, 11, 15), '41.00', '41.60'),
+        (at(2, 9), '41.30', '41.85'),
+    ):
+        Rate.objects.create(source=privatbank, currency_name='USD', bid=bid, ask=ask, created=created)
+    recent = Rate.objects.create(source=privatbank, currency_name='USD', bid='41.50', ask='42.00', created=NOW)
+    # the only rate of the pair is older than the retention period, it stays for LatestRate
+    dead = Rate.objects.create(source=monobank, currency_name='EUR', bid='47.00', ask='48.00', created=at(1, 12))
+
+    # rates written before the candles were maintained on write
+    RateCandle.objects.all().delete()
+
+    stats = apply_retention(days=30, now=NOW)
+    assert stats['cutoff'] == datetime(2026, 9, 17, tzinfo=dt_timezone.utc)
+    assert (stats['days'], stats['rates'], stats['deleted']) == (2, 6, 5)
+
+    assert list(Rate.objects.order_by('id')) == [recent, dead]
+    assert LatestRate.objects.get(source=privatbank, currency_name='USD').rate == recent
+
+    hour = RateCandle.objects.get(source=privatbank, period=choices.PERIOD_HOUR, start=at(1, 10))
+    assert (hour.bid_open, hour.bid_high, hour.bid_low, hour.bid_close) == (
+        Decimal('41.10'), Decimal('41.40'), Decimal('41.10'), Decimal('41.40'),
+    )
+    assert (hour.open_time, hour.close_time, hour.count) == (at(1, 10, 5), at(1, 10, 50), 3)
+
+    day = RateCandle.objects.get(source=privatbank, period=choices.PERIOD_DAY, start=at(1, 0))
+    assert (day.ask_open, day.ask_high, day.ask_low, day.ask_close, day.count) == (
+        Decimal('41.70'), Decimal('41.90'), Decimal('41.60'), Decimal('41.60'), 4,
+    )
+    assert RateCandle.objects.filter(source=privatbank).count() == 5
+    assert RateCandle.objects.get(source=monobank, period=choices.PERIOD_DAY, start=at(1, 0)).count == 1
+
+    # a new rate of the pair: the dead rate is deleted, but it is not counted again
+    Rate.objects.create(source=monobank, currency_name='EUR', bid='47.10', ask='48.10', created=NOW)
+    stats = apply_retention(days=30, now=NOW)
+    assert (stats['days'], stats['rates'], stats['deleted']) == (1, 1, 1)
+    assert RateCandle.objects.get(source=monobank, period=choices.PERIOD_DAY, start=at(1, 0)).count == 1
+    assert RateCandle.objects.get(id=day.id).count == 4
+
+
+def test_partitions_need_postgresql():
+
+    """
+        Unit test for testing that partitioning is refused on other databases
+    """
+
+    assert partitions.months(date(2026, 11, 15), datetime(2027, 2, 1, tzinfo=dt_timezone.utc)) == [
+        date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1), date(2027, 2, 1),
+    ]
+    assert partitions.partition_name(date(2026, 12, 1)) == 'currency_rate_p2026_12'
+    assert partitions.partition_month('currency_rate_p2026_12') == date(2026, 12, 1)
+    assert partitions.bounds(date(2026, 12, 1))[1] - partitions.bounds(date(2026, 12, 1))[0] == timedelta(days=31)
+
+    # on SQLite the retention works without partitions
+    assert not partitions.is_partitioned()
+    with pytest.raises(CommandError):
+        call_command('partition_rates')
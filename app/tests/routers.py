@@ -0,0 +1,79 @@
+from datetime import datetime, timezone as dt_timezone
+
+from currency import const
+from currency.models import Rate, Source
+from currency.routers import PrimaryReplicaRouter, primary_reads, replica_reads
+
+from django.db import transaction
+
+import pytest
+
+REPLICA = 'replica'
+
+
+@pytest.fixture
+def replica(settings):
+    settings.DATABASE_REPLICAS = [REPLICA]
+
+    # на реплике другой курс, чтобы было видно, откуда прочитано
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    Source.objects.using(REPLICA).bulk_create([Source(id=source.id, code_name=source.code_name, name=source.name)])
+    Rate.objects.using(REPLICA).bulk_create([Rate(
+        source_id=source.id, currency_name='USD', bid='40.00', ask='40.50',
+        created=datetime(2026, 10, 1, tzinfo=dt_timezone.utc),
+    )])
+    return source
+
+
+@pytest.mark.django_db(databases=['default', REPLICA])
+def test_router(replica):
+
+    """
+        Unit test for testing routing of reads and writes between the databases
+    """
+
+    router = PrimaryReplicaRouter()
+
+    # вне запроса, например в задачах Celery, все идет в основную базу
+    assert router.db_for_read(Rate) == 'default'
+    with primary_reads():
+        assert router.db_for_read(Rate) == 'default'
+
+    with replica_reads():
+        assert router.db_for_read(Rate) == REPLICA
+        assert list(Rate.objects.values_list('bid', flat=True)) == [40]
+
+        # транзакция видит свои записи
+        with transaction.atomic():
+            assert router.db_for_read(Rate) == 'default'
+
+        assert router.db_for_write(Rate) == 'default'
+        assert router.db_for_read(Rate) == 'default'
+
+
+@pytest.mark.django_db(databases=['default', REPLICA])
+def test_requests_are_routed(replica, api_client, settings):
+
+    """
+        Unit test for testing that safe requests read from a replica
+    """
+
+    Rate.objects.create(source=replica, currency_name='USD', bid='41.00', ask='41.50')
+
+    # безопасный запрос читает реплику
+    response = api_client.get('/api/rates/')
+    assert [rate['bid'] for rate in response.json()['results']] == ['40.00']
+
+    # запрос с записью выставляет клиенту чтение с основной базы
+    response = api_client.post('/api/rates/', data={'ask': 42, 'bid': 41.5, 'source': replica.id})
+    assert response.status_code == 201
+    assert response.cookies['read_primary']['max-age'] == int(settings.DATABASE_REPLICA_MAX_LAG)
+
+    response = api_client.get('/api/rates/')
+    assert [rate['bid'] for rate in response.json()['results']] == ['41.50', '41.00']
+
+    # без реплик все идет в основную базу
+    settings.DATABASE_REPLICAS = []
+    api_client.cookies.clear()
+    response = api_client.get('/api/rates/')
+    assert len(response.json()['results']) == 2
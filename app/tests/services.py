@@ -0,0 +1,339 @@
+import pickle
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from currency import const
+from currency import latest_cache
+from currency.cache import LocalCache, MISSING, invalidate_stale, single_flight, stale_while_revalidate
+from currency.locks import CacheLock
+from currency.models import LatestRate, Rate, Source
+from currency.services import (
+    compute_latest_rates,
+    get_latest_rates,
+    insert_changed_rates,
+    rebuild_latest_rates,
+)
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+
+def db_queries(queries):
+    # silk adds EXPLAIN of every query
+    return [query for query in queries if not query['sql'].startswith('EXPLAIN')]
+
+
+def test_compute_latest_rates():
+
+    """
+        Unit test for testing computing the latest rates of sources
+    """
+
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    monobank = Source.objects.create(code_name=const.CODE_NAME_MONOBANK, name='MonoBank')
+    now = timezone.now()
+
+    Rate.objects.create(source=privatbank, currency_name='USD', bid='26.50', ask='26.90', created=now)
+    eur = Rate.objects.create(source=privatbank, currency_name='EUR', bid='30.95', ask='31.55', created=now)
+    usd = Rate.objects.create(source=privatbank, currency_name='USD', bid='26.60', ask='26.90', created=now)
+    # a backfilled rate has a bigger id, but it is older
+    Rate.objects.create(
+        source=privatbank,
+        currency_name='USD',
+        bid='15.35',
+        ask='15.70',
+        created=now - timedelta(days=3000),
+    )
+    mono_usd = Rate.objects.create(source=monobank, currency_name='USD', bid='26.55', ask='26.85')
+
+    with CaptureQueriesContext(connection) as queries:
+        rates = compute_latest_rates()
+        assert [rate.source.name for rate in rates] == [privatbank.name, privatbank.name, monobank.name]
+    assert len(db_queries(queries)) == 1
+
+    assert rates == [usd, eur, mono_usd]
+    assert rates[0].bid == Decimal('26.60')
+
+    assert [entry.id for entry in get_latest_rates()] == [usd.id, eur.id, mono_usd.id]
+
+
+def latest_rate(source, currency_name):
+    return LatestRate.objects \
+        .filter(source=source, currency_name=currency_name) \
+        .values_list('rate_id', flat=True) \
+        .first()
+
+
+def test_latest_rate_is_maintained_on_write():
+
+    """
+        Unit test for testing that LatestRate follows creates, edits and deletes of rates
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    now = timezone.now()
+
+    first = Rate.objects.create(source=source, currency_name='USD', bid='26.50', ask='26.90', created=now)
+    assert latest_rate(source, 'USD') == first.id
+
+    second = Rate.objects.create(source=source, currency_name='USD', bid='26.60', ask='26.90', created=now)
+    # an older rate does not replace the latest one
+    Rate.objects.create(source=source, currency_name='USD', bid='15.35', ask='15.70', created=now - timedelta(days=1))
+    assert latest_rate(source, 'USD') == second.id
+    assert LatestRate.objects.get(source=source, currency_name='USD').bid == Decimal('26.60')
+
+    # the rate moved to another pair, both pairs are recomputed
+    second.currency_name = 'EUR'
+    second.save()
+    assert latest_rate(source, 'USD') == first.id
+    assert latest_rate(source, 'EUR') == second.id
+
+    second.delete()
+    assert latest_rate(source, 'EUR') is None
+
+    Rate.objects.filter(source=source).delete()
+    assert not LatestRate.objects.filter(source=source).exists()
+
+
+def test_rebuild_latest_rates():
+
+    """
+        Unit test for testing rebuilding LatestRate from the rates
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    usd = Rate.objects.create(source=source, currency_name='USD', bid='26.50', ask='26.90')
+    eur = Rate.objects.create(source=source, currency_name='EUR', bid='30.95', ask='31.55')
+
+    assert rebuild_latest_rates() == {'created': 0, 'updated': 0, 'deleted': 0}
+
+    LatestRate.objects.filter(currency_name='USD').delete()
+    LatestRate.objects.filter(currency_name='EUR').update(bid='1.00')
+    LatestRate.objects.create(
+        source=Source.objects.create(code_name='EMPTY', name='empty'),
+        currency_name='USD',
+        bid='1.00',
+        ask='1.00',
+        updated=timezone.now(),
+    )
+
+    call_command('rebuild_latest_rates')
+    assert latest_rate(source, 'USD') == usd.id
+    assert LatestRate.objects.get(rate=eur).bid == Decimal('30.95')
+    assert LatestRate.objects.count() == 2
+
+
+def test_latest_rates_cache_is_written_through(django_capture_on_commit_callbacks):
+
+    """
+        Unit test for testing that saved rates are written to the cache
+    """
+
+    privatbank = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    monobank = Source.objects.create(code_name=const.CODE_NAME_MONOBANK, name='MonoBank')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Rate.objects.create(source=privatbank, currency_name='USD', bid='26.50', ask='26.90')
+        eur = Rate.objects.create(source=privatbank, currency_name='EUR', bid='30.95', ask='31.55')
+
+    assert [rate.bid for rate in get_latest_rates()] == ['26.50', '30.95']
+
+    # the new rate of a known pair is written through, the board is read from the cache only
+    with django_capture_on_commit_callbacks(execute=True):
+        usd = Rate.objects.create(source=privatbank, currency_name='USD', bid='26.60', ask='26.90')
+    with CaptureQueriesContext(connection) as queries:
+        assert [entry.id for entry in get_latest_rates()] == [usd.id, eur.id]
+    assert db_queries(queries) == []
+
+    # the parsers write through as well
+    with django_capture_on_commit_callbacks(execute=True):
+        insert_changed_rates([(privatbank.id, 'EUR', Decimal('31.00'), Decimal('31.55'))])
+    with CaptureQueriesContext(connection) as queries:
+        assert get_latest_rates()[1].bid == '31.00'
+    assert db_queries(queries) == []
+
+    # a new pair changes the version, the board is read from LatestRate once
+    with django_capture_on_commit_callbacks(execute=True):
+        mono = Rate.objects.create(source=monobank, currency_name='USD', bid='26.55', ask='26.85')
+    with CaptureQueriesContext(connection) as queries:
+        assert get_latest_rates()[-1].id == mono.id
+    assert len(db_queries(queries)) == 1
+
+    # the gone pair leaves the board
+    with django_capture_on_commit_callbacks(execute=True):
+        mono.delete()
+    assert [rate.source_id for rate in get_latest_rates()] == [privatbank.id, privatbank.id]
+
+
+def test_local_cache():
+
+    """
+        Unit test for testing the process-local cache
+    """
+
+    shared_key = 'tests::local-cache::generation'
+    first = LocalCache('first', shared_key, maxsize=2, ttl=60, check_interval=60)
+    second = LocalCache('second', shared_key, maxsize=2, ttl=60, check_interval=0)
+
+    first.set('a', 1)
+    first.set('b', 2)
+    assert first.get('a') == 1
+    # the least recently used key is evicted
+    first.set('c', 3)
+    assert first.get('b') is MISSING
+    assert first.get('c') == 3
+
+    second.set('a', 1)
+    first.invalidate()
+    # the other process drops its entries on the next check of the generation
+    assert second.get('a') is MISSING
+    assert first.get('a') is MISSING
+
+    expiring = LocalCache('expiring', shared_key, ttl=0)
+    expiring.set('a', 1)
+    assert expiring.get('a') is MISSING
+
+    assert first.stats()['local_hits'] == 2
+    assert first.stats()['local_hit_ratio'] == 0.5
+
+
+def test_latest_rates_two_tiers(mocker, django_capture_on_commit_callbacks, api_client):
+
+    """
+        Unit test for testing reads of the latest rates through both cache tiers
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    with django_capture_on_commit_callbacks(execute=True):
+        Rate.objects.create(source=source, currency_name='USD', bid='26.50', ask='26.90')
+
+    get_latest_rates()
+    get_many = mocker.spy(cache, 'get_many')
+    # the board is served by the process without the shared cache
+    assert get_latest_rates()[0].bid == '26.50'
+    assert get_many.call_count == 0
+
+    # a write drops the board, it is assembled again from the shared tier with one get_many
+    with django_capture_on_commit_callbacks(execute=True):
+        Rate.objects.create(source=source, currency_name='USD', bid='26.60', ask='26.90')
+    assert get_latest_rates()[0].bid == '26.60'
+    assert get_many.call_count == 1
+
+    stats = api_client.get('/api/cache-stats/').json()['caches']['latest_rates']
+    assert stats['local_hits'] >= 1
+    assert stats['shared_hits'] >= 1
+
+
+def test_single_flight():
+
+    """
+        Unit test for testing that one caller at a time recomputes a value
+    """
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        cache.set('tests::single-flight', 'fresh')
+        return 'fresh'
+
+    results = []
+
+    def call(stale):
+        results.append(single_flight(
+            'tests::single-flight', compute, stale=stale, ready=lambda: cache.get('tests::single-flight'), wait=5,
+        ))
+
+    threads = [threading.Thread(target=call, args=('stale',)) for _ in range(5)]
+    threads += [threading.Thread(target=call, args=(MISSING,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # only the lock holder computes, others get the stale value or wait for the fresh one
+    assert len(calls) == 1
+    assert sorted(results) == ['fresh'] * 6 + ['stale'] * 4
+
+
+def test_stale_while_revalidate(mocker):
+
+    """
+        Unit test for testing that a stale value is served while it is recomputed
+    """
+
+    values = iter([1, 2, 3])
+
+    def get():
+        return stale_while_revalidate('tests::swr', lambda: next(values), timeout=60, stale_timeout=60)
+
+    assert get() == 1
+    assert get() == 1
+
+    # the invalidated value keeps the rest of its fresh and stale time, not the default timeout
+    set_cache = mocker.spy(cache, 'set')
+    invalidate_stale('tests::swr')
+    assert 119 < set_cache.call_args.args[2] <= 120
+    with CacheLock('tests::swr::lock', 60):
+        # another caller recomputes, the stale value is served at once
+        assert get() == 1
+    assert get() == 2
+
+
+def test_latest_rates_stale_board(django_capture_on_commit_callbacks):
+
+    """
+        Unit test for testing that the previous board is served while it is reloaded
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    with django_capture_on_commit_callbacks(execute=True):
+        Rate.objects.create(source=source, currency_name='USD', bid='26.50', ask='26.90')
+    assert get_latest_rates()[0].bid == '26.50'
+
+    # both tiers miss while another process reloads the board: the previous board is served without queries
+    cache.clear()
+    latest_cache.board_cache.invalidate()
+    with CacheLock(f'{const.CACHE_KEY_LATEST_RATES}::lock', 60):
+        with CaptureQueriesContext(connection) as captured:
+            assert get_latest_rates()[0].bid == '26.50'
+        assert db_queries(captured) == []
+    assert latest_cache.board_cache.stats()['stale_served'] == 1
+
+    # the lock is free, the board is reloaded from the database
+    with CaptureQueriesContext(connection) as captured:
+        assert get_latest_rates()[0].bid == '26.50'
+    assert len(db_queries(captured)) == 1
+
+
+def test_latest_rates_are_cached_as_tuples(client, django_capture_on_commit_callbacks):
+
+    """
+        Unit test for testing that the latest rates are cached as plain tuples
+    """
+
+    source = Source.objects.get(code_name=const.CODE_NAME_PRIVATBANK)
+    source.logo = 'logos/1/privatbank.png'
+    source.save()
+    with django_capture_on_commit_callbacks(execute=True):
+        rate = Rate.objects.create(source=source, currency_name='USD', bid='26.50', ask='26.90')
+
+    entry = cache.get(latest_cache.pair_key(source.id, 'USD'))
+    assert entry == latest_cache.LatestEntry(
+        rate.id, source.id, 'USD', '26.50', '26.90', rate.created, source.name, '/media/logos/1/privatbank.png',
+    )
+    assert len(pickle.dumps(entry)) < len(pickle.dumps(Rate.objects.select_related('source').get(id=rate.id))) / 3
+
+    # the page is rendered from the cached tuples without queries of rates
+    get_latest_rates()
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(reverse('currency:rate-latest'))
+    assert b'/media/logos/1/privatbank.png' in response.content
+    assert not any('currency_rate' in query['sql'] for query in captured)
@@ -1,83 +1,108 @@
-from unittest.mock import MagicMock
+import json
+import urllib.request
+from decimal import Decimal
+from pathlib import Path
 
+from currency import const
+from currency import replay
 from currency.models import Rate
-from currency.tasks import parse_monobank, parse_privatbank, parse_vkurse
+from currency.parsers import PARSERS
+from currency.tasks import run_parsing
 
+from django.core.management import call_command
+from django.test import override_settings
 
-def test_parse_privatbank(mocker):
+import pytest
 
-    privatbank_response = [
-        {"ccy": "USD", "base_ccy": "UAH", "buy": "26.50000", "sale": "26.90000"},
-        {"ccy": "EUR", "base_ccy": "UAH", "buy": "30.95000", "sale": "31.55000"},
-        {"ccy": "RUR", "base_ccy": "UAH", "buy": "0.35000", "sale": "0.38000"},
-        {"ccy": "BTC", "base_ccy": "USD", "buy": "39310.2844", "sale": "43448.2090"},
-    ]
+REPLAY_FIXTURES = Path(__file__).parent / 'fixtures' / 'replay'
 
-    initial_count_rate = Rate.objects.count()
-    request_get_mock = mocker.patch('requests.get')
-    request_get_mock.return_value = MagicMock(json=lambda: privatbank_response)
 
-    parse_privatbank()
-    assert Rate.objects.count() == initial_count_rate + 2
+@pytest.fixture
+def stand_in():
 
-    parse_privatbank()
-    assert Rate.objects.count() == initial_count_rate + 2
+    """
+        Stand-in server with the recorded responses, the parsers are pointed to it
+    """
 
-    privatbank_response = [
-        {"ccy": "USD", "base_ccy": "UAH", "buy": "26.60000", "sale": "26.90000"},
-    ]
-    request_get_mock.return_value = MagicMock(json=lambda: privatbank_response)
+    with replay.StandInServer(REPLAY_FIXTURES, seed=1) as server:
+        with override_settings(PARSER_REPLAY_URL=server.url):
+            yield server
 
-    parse_privatbank()
-    assert Rate.objects.count() == initial_count_rate + 3
 
+def latest_rates():
+    return {
+        (rate.source.code_name, rate.currency_name): (rate.bid, rate.ask)
+        for rate in Rate.objects.select_related('source').order_by('id')
+    }
 
-def test_parse_monobank(mocker):
 
-    initial_value = Rate.objects.count()
-    request_get_mock = mocker.patch('requests.get')
+def test_run_parsing(stand_in):
 
-    monobank_response = [
-        {'currencyCodeA': '840', 'currencyCodeB': '980', 'date': '1634274811',  'rateBuy': '23.3', 'rateSell': '23.5', 'rateCross': '6.741'},  # noqa
-        {'currencyCodeA': '978', 'currencyCodeB': '980', 'date': '1634159406',  'rateBuy': '30.5', 'rateSell': '32', 'rateCross': '6.741'},  # noqa
-        {'currencyCodeA': '124', 'currencyCodeB': '980', 'date': '1634274811', 'rateCross': '21.4523'},
-        {'currencyCodeA': '976', 'currencyCodeB': '980', 'date': '1634159406', 'rateCross': '0.0134'},
-    ]
-    request_get_mock.return_value = MagicMock(json=lambda: monobank_response)
+    initial_count_rate = Rate.objects.count()
 
-    parse_monobank()
-    assert Rate.objects.count() == initial_value + 2
+    result = run_parsing()
+    assert result['errors'] == []
+    assert sorted(result['polled']) == sorted(PARSERS)
+    assert result['created'] == 10
+    assert Rate.objects.count() == initial_count_rate + 10
 
-    monobank_response = [
-        {'currencyCodeA': '840', 'currencyCodeB': '980', 'date': '1634274811',  'rateBuy': '23.6', 'rateSell': '23.9', 'rateCross': '6.741'},  # noqa
-        {'currencyCodeA': '675', 'currencyCodeB': '980', 'date': '1634159406',  'rateBuy': '30.5', 'rateSell': '32', 'rateCross': '6.741'},  # noqa
-    ]
-    request_get_mock.return_value = MagicMock(json=lambda: monobank_response)
+    rates = latest_rates()
+    assert rates[(const.CODE_NAME_PRIVATBANK, 'USD')] == (Decimal('41.20'), Decimal('41.80'))
+    assert rates[(const.CODE_NAME_MONOBANK, 'EUR')] == (Decimal('47.80'), Decimal('48.60'))
+    assert rates[(const.CODE_NAME_VKURSE, 'USD')] == (Decimal('41.30'), Decimal('41.65'))
+    assert rates[(const.CODE_NAME_MINFIN, 'EUR')] == (Decimal('47.55'), Decimal('48.21'))
+    assert rates[(const.CODE_NAME_PUMB, 'USD')] == (Decimal('41.05'), Decimal('41.55'))
 
-    parse_monobank()
-    assert Rate.objects.count() == initial_value + 3
+    # the sources are not due until their poll interval has passed
+    assert run_parsing()['polled'] == []
+    assert stand_in.requests == 6
 
 
-def test_parse_vkurse(mocker):
+def test_run_parsing_with_errors_and_big_payloads(stand_in):
 
-    initial_value = Rate.objects.count()
-    request_get_mock = mocker.patch('requests.get')
+    stand_in.error_rate = 1
+    result = run_parsing()
+    assert len(result['errors']) == len(PARSERS)
+    assert result['created'] == 0
 
-    vkurse_response = {
-        'Dollar': {'buy': '8', 'sale': '17'},
-        'Lira': {'buy': '65', 'sale': '69'},
-        'Rub': {'buy': '0.377', 'sale': '0.398'}
-    }
-    request_get_mock.return_value = MagicMock(json=lambda: vkurse_response)
+    stand_in.error_rate = 0
+    stand_in.payload_scale = 5
+    with urllib.request.urlopen(f'{stand_in.url}/vkurse.dp.ua/course.json') as response:
+        body = response.read()
+    assert len(body) == 5 * len((REPLAY_FIXTURES / 'vkurse.dp.ua_course.json').read_bytes())
+
+    # padding keeps the payloads valid, the failed sources are not due yet, so a cold run is made
+    result = replay.benchmark(1)
+    assert result['errors'] == []
+    assert result['created'] == 10
 
-    parse_vkurse()
-    assert Rate.objects.count() == initial_value + 1
 
-    vkurse_response = {'Aut': {'buy': '8', 'sale': '17'},
-                       'Lira': {'buy': '65', 'sale': '69'},
-                       'Rub': {'buy': '0.377', 'sale': '0.398'}}
+def test_record_and_replay(stand_in, tmp_path):
 
-    request_get_mock.return_value = MagicMock(json=lambda: vkurse_response)
+    call_command('replay_sources', '--record', f'--fixtures={tmp_path}')
 
-    parse_vkurse()
-    assert Rate.objects.count() == initial_value + 1
+    # the fixtures index points some urls at the html fixtures, the recording keeps its own copies
+    index = json.loads((tmp_path / replay.RECORDING_INDEX).read_text())
+    fixtures = json.loads((REPLAY_FIXTURES / replay.RECORDING_INDEX).read_text())
+    assert index.keys() == fixtures.keys()
+    for path, recording in index.items():
+        assert recording['content_type'] == fixtures[path]['content_type']
+        assert (tmp_path / recording['file']).read_bytes() == (REPLAY_FIXTURES / fixtures[path]['file']).read_bytes()
+
+
+def test_benchmark(stand_in, capsys):
+
+    initial_count_rate = Rate.objects.count()
+    stand_in.latency = 0.01
+
+    stats = replay.benchmark(2)
+    assert stats['created'] == 20
+    assert stats['fetch_latency'][const.CODE_NAME_MINFIN]['count'] == 4
+    assert stats['fetch_latency'][const.CODE_NAME_PRIVATBANK]['p50'] >= 0.01
+    # writes of the benchmark are rolled back
+    assert Rate.objects.count() == initial_count_rate
+
+    call_command('replay_sources', f'--fixtures={REPLAY_FIXTURES}', '--benchmark=1')
+    output = capsys.readouterr().out
+    assert 'Runs: 1, created: 10' in output
+    assert const.CODE_NAME_PUMB in output